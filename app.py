@@ -1,6 +1,15 @@
-from flask import Flask, flash, redirect, render_template, request, session
+from flask import Flask, Response, flash, jsonify, redirect, render_template, request, session, stream_with_context
 from flask_session import Session
-from cs50 import SQL
+import csv
+import io
+import json
+import sqlite3
+import threading
+from contextlib import closing
+
+from lazy_imports import lazy_import
+from migrations import migrate
+from search import match_query
 
 
 # Configure application
@@ -14,12 +23,188 @@ app.config["TEMPLATES_AUTO_RELOAD"] = True
 # app.config["SESSION_TYPE"] = "filesystem"
 Session(app)
 
-# Configure CS50 Library to use SQLite database
-db = SQL("sqlite:///data.db")
+# CS50 Library, imported by the first request that needs the database
+SQL = lazy_import("cs50", "SQL")
+db = None
+db_lock = threading.Lock()
+
+
+def get_db():
+    """Connect to the database on first use, bringing the schema and its indexes up to date first"""
+    global db
+    if db is None:
+        with db_lock:
+            if db is None:
+                with closing(sqlite3.connect("data.db", isolation_level=None)) as connection:
+                    migrate(connection)
+                db = SQL("sqlite:///data.db")
+    return db
+
+# Hyperparameters
+PAGE_SIZE = 50 # reviews per page
+MAX_PAGE_SIZE = 500
+EXPORT_BATCH_SIZE = 1000 # rows fetched from the cursor at a time when exporting
+
+REVIEW_COLUMNS = ["id", "comment", "stars", "product_id", "product_url", "category_id", "category_name"]
+REVIEWS_QUERY = (
+    "SELECT comments_stars.id, comments_stars.comment, comments_stars.stars, comments_stars.product_id, products.url AS product_url, "
+    "products.category_id, categories.name AS category_name "
+    "FROM comments_stars JOIN products ON products.id = comments_stars.product_id JOIN categories ON categories.id = products.category_id"
+)
+
+
+def page_size(args):
+    """Read ?limit=, between 1 and MAX_PAGE_SIZE rows, a negative LIMIT would return every row"""
+    return max(1, min(args.get("limit", PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+
+def review_filters(args):
+    """Build the WHERE clause of the category, product and stars filters of a request."""
+    conditions = []
+    parameters = []
+    filters = {}
+    for name, column in (("category", "products.category_id"), ("product", "comments_stars.product_id"), ("stars", "comments_stars.stars")):
+        value = args.get(name, type=int)
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            parameters.append(value)
+            filters[name] = value
+    return conditions, parameters, filters
+
+
+def rating_summary(row):
+    """Turn a row of rating_aggregates into the JSON of a summary endpoint."""
+    return {
+        "reviews": row["reviews"],
+        "average": row["stars_sum"] / row["reviews"] if row["reviews"] else None,
+        "distribution": {stars: row[f"stars_{stars}"] for stars in range(1, 6)},
+        "last_crawled": row["last_crawled"],
+    }
+
+
+def reviews_query(conditions, order="ASC"):
+    """Build the query of the reviews matching some conditions, ordered by id."""
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"{REVIEWS_QUERY}{where} ORDER BY comments_stars.id {order}"
 
 
 @app.route("/")
 def display():
-    """Show raw data scraped."""
-    rows = db.execute("SELECT * FROM comments_stars")
-    return render_template("display.html", rows=rows)
\ No newline at end of file
+    """Show raw data scraped, one page at a time.
+
+    Pages are keyset-paginated on the review id: ?after=<id> shows the reviews following a page and
+    ?before=<id> the ones preceding it, so a page costs the same wherever it is.
+    """
+    conditions, parameters, filters = review_filters(request.args)
+    limit = page_size(request.args)
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    if before is not None:
+        rows = get_db().execute(f"{reviews_query(conditions + ['comments_stars.id < ?'], order='DESC')} LIMIT ?", *parameters, before, limit + 1)
+        has_previous, has_next = len(rows) > limit, True
+        rows = rows[:limit][::-1]
+    else:
+        keyset = ["comments_stars.id > ?"] if after is not None else []
+        rows = get_db().execute(f"{reviews_query(conditions + keyset)} LIMIT ?", *parameters, *([after] if after is not None else []), limit + 1)
+        has_previous, has_next = after is not None, len(rows) > limit
+        rows = rows[:limit]
+    categories = get_db().execute("SELECT id, name FROM categories ORDER BY name")
+    return render_template("display.html", rows=rows, categories=categories, filters=filters, limit=limit,
+                           previous_id=rows[0]["id"] if rows and has_previous else None,
+                           next_id=rows[-1]["id"] if rows and has_next else None)
+
+
+@app.route("/export.<export_format>")
+def export(export_format):
+    """Stream the reviews matching the filters as CSV or NDJSON.
+
+    Rows are fetched from a cursor in batches and written as they come, the result set is never
+    held in memory.
+    """
+    if export_format not in ("csv", "ndjson"):
+        return "Unknown format, use csv or ndjson", 404
+    conditions, parameters, _ = review_filters(request.args)
+    get_db() # the schema is up to date before the cursor is opened
+
+    def generate():
+        with closing(sqlite3.connect("data.db")) as connection:
+            cursor = connection.execute(reviews_query(conditions), parameters)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if export_format == "csv":
+                writer.writerow(REVIEW_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == "csv":
+                    writer.writerows(rows)
+                else:
+                    buffer.writelines(json.dumps(dict(zip(REVIEW_COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell(): # the CSV header of an empty export
+                yield buffer.getvalue()
+
+    mimetype = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=comments_stars.{export_format}"})
+
+
+@app.route("/summary/categories")
+def category_summaries():
+    """Show the star distribution and average rating of every category, read from rating_aggregates."""
+    rows = get_db().execute("SELECT categories.id, categories.name, rating_aggregates.* FROM categories "
+                            "JOIN rating_aggregates ON rating_aggregates.kind = 'category' AND rating_aggregates.item_id = categories.id ORDER BY categories.name")
+    return jsonify([{"category_id": row["id"], "name": row["name"], **rating_summary(row)} for row in rows])
+
+
+@app.route("/summary/categories/<int:category_id>/products")
+def product_summaries(category_id):
+    """Show the star distribution and average rating of the products of a category, keyset-paginated on the product id."""
+    limit = page_size(request.args)
+    after = request.args.get("after", 0, type=int)
+    rows = get_db().execute("SELECT products.id, products.url, rating_aggregates.* FROM products "
+                            "JOIN rating_aggregates ON rating_aggregates.kind = 'product' AND rating_aggregates.item_id = products.id "
+                            "WHERE products.category_id = ? AND products.id > ? ORDER BY products.id LIMIT ?", category_id, after, limit)
+    return jsonify({
+        "products": [{"product_id": row["id"], "url": row["url"], **rating_summary(row)} for row in rows],
+        "next": rows[-1]["id"] if len(rows) == limit else None,
+    })
+
+
+@app.route("/summary/products/<int:product_id>")
+def product_summary(product_id):
+    """Show the star distribution and average rating of a product."""
+    rows = get_db().execute("SELECT * FROM rating_aggregates WHERE kind = 'product' AND item_id = ?", product_id)
+    if not rows:
+        return jsonify({"error": "No reviews of this product"}), 404
+    return jsonify({"product_id": product_id, **rating_summary(rows[0])})
+
+
+@app.route("/search")
+def search():
+    """Search the comments, best matches first.
+
+    Accents are ignored unless ?accents=exact, so "san pham dep" finds "Sản phẩm đẹp". Hits can be
+    filtered like the reviews and are paginated with ?page=.
+    """
+    expression = match_query(request.args.get("q", ""), accents=request.args.get("accents") == "exact")
+    if expression is None:
+        return jsonify({"error": "Missing search words, use ?q="}), 400
+    conditions, parameters, _ = review_filters(request.args)
+    limit = page_size(request.args)
+    page = max(request.args.get("page", 1, type=int), 1)
+    where = "".join(f" AND {condition}" for condition in conditions)
+    rows = get_db().execute("SELECT comments_stars.id, comments_stars.comment, comments_stars.stars, comments_stars.product_id, products.url AS product_url, "
+                            "products.category_id, categories.name AS category_name, comments_fts.rank "
+                            "FROM comments_fts JOIN comments_stars ON comments_stars.id = comments_fts.rowid "
+                            "JOIN products ON products.id = comments_stars.product_id JOIN categories ON categories.id = products.category_id "
+                            f"WHERE comments_fts MATCH ?{where} ORDER BY comments_fts.rank LIMIT ? OFFSET ?",
+                            expression, *parameters, limit + 1, (page - 1) * limit)
+    return jsonify({
+        "hits": rows[:limit],
+        "page": page,
+        "next": page + 1 if len(rows) > limit else None,
+    })
\ No newline at end of file
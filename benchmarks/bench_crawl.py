@@ -0,0 +1,190 @@
+"""
+    Running CategoryCrawler, ProductCrawler and CommentStarCrawler against the local mock site and
+    reporting pages/sec, rows/sec, peak RSS and database write latency of every stage, so changes to the
+    crawlers show up in numbers. Runs in a temporary directory, data.db is not touched.
+
+    Usage: python -m benchmarks.bench_crawl --categories 5 --products 20 --reviews 25 --latency 0.05 --workers 2
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+import psutil # RSS of the crawler and of the Chrome processes it starts
+
+from benchmarks.mock_site import start_mock_site, CATEGORIES, PRODUCTS, REVIEWS, LATENCY, FAILURE_RATE
+from browser_profile import BrowserProfile
+from crawlers import CategoryCrawler, ProductCrawler, CommentStarCrawler
+from driver_pool import DriverPool
+from frontier import Frontier
+from http_engine import HttpBackend
+from metrics import Metrics
+from storage import CrawlWriter
+from waits import LoadStats
+
+
+SAMPLE_INTERVAL = 0.1 # seconds between two RSS samples
+
+
+class PeakRss():
+    """
+        Sampling the RSS of the benchmark process and of its children (chromedriver, Chrome) in a
+        background thread, keeping the peaks.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL) -> None:
+        """
+            Initializing PeakRss.
+            Args:
+                interval (float): Seconds between two samples.
+        """
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0 # bytes, this process
+        self.peak_tree = 0 # bytes, this process and its children
+        self.__stop = threading.Event()
+        self.__thread = None
+
+    def __sample(self):
+        """
+            Measuring the RSS once.
+        """
+        rss = self.process.memory_info().rss
+        tree = rss
+        for child in self.process.children(recursive=True):
+            try:
+                tree += child.memory_info().rss
+            except psutil.Error:
+                pass # the child exited in between
+        self.peak = max(self.peak, rss)
+        self.peak_tree = max(self.peak_tree, tree)
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.__sample()
+
+    def start(self):
+        """
+            Starting the sampling thread.
+        """
+        self.__sample()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+            Stopping the sampling thread.
+        """
+        self.__stop.set()
+        self.__thread.join()
+        self.__sample()
+
+
+def run_stage(name, crawl, writer, metrics, server):
+    """
+        Running a crawler and measuring it.
+        Args:
+            name (str): Name of the stage.
+            crawl (function): Runs the crawler.
+            writer (CrawlWriter): Writer of the stage.
+            metrics (Metrics): Metrics of the stage.
+            server (ThreadingHTTPServer): The mock site.
+        Returns:
+            result (dict): Seconds, requests served, pages loaded in Chrome (next pages included), rows
+            written, their rates, database write latency and peak RSS of the stage.
+    """
+    requests = sum(server.stats.values())
+    rss = PeakRss()
+    rss.start()
+    start = time.perf_counter()
+    try:
+        crawl()
+        writer.flush()
+    finally:
+        seconds = time.perf_counter() - start
+        rss.stop()
+    summary = metrics.summary()
+    pages = sum(summary['counters'].get('pages', {}).values())
+    writes = summary['timings'].get('db_write', {}).get('all', {'count': 0, 'mean': 0.0, 'max': 0.0})
+    return {
+        'stage': name,
+        'seconds': seconds,
+        'requests': sum(server.stats.values()) - requests,
+        'pages': pages,
+        'pages_per_second': pages / seconds,
+        'rows': writer.rows,
+        'rows_per_second': writer.rows / seconds,
+        'db_writes': writes['count'],
+        'db_write_mean_ms': writes['mean'] * 1000,
+        'db_write_max_ms': writes['max'] * 1000,
+        'peak_rss_mb': rss.peak / 1024 ** 2,
+        'peak_rss_tree_mb': rss.peak_tree / 1024 ** 2,
+    }
+
+
+def main(args):
+    output = os.path.abspath(args.output) if args.output else None
+    server = start_mock_site(categories=args.categories, products=args.products, reviews=args.reviews, latency=args.latency,
+                             failure_rate=args.failure_rate, failure_mode=args.failure_mode)
+    cwd = os.getcwd()
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory) # the crawlers write data.db, url_files, data and logs in the working directory
+        for subdirectory in ('url_files', 'data', 'logs'):
+            os.makedirs(subdirectory)
+        driver_pool = DriverPool(size=max(args.drivers, args.workers), headless_option=True, profile=BrowserProfile())
+        frontier = Frontier()
+        backend = HttpBackend(base_url=server.base_url) if args.backend == 'http' else None
+        try:
+            driver_pool.warm() # starting Chrome is not part of any stage
+            for stage in ('category', 'product', 'comment'):
+                metrics = Metrics()
+                writer = CrawlWriter(metrics=metrics)
+                shared = dict(driver_pool=driver_pool, writer=writer, load_stats=LoadStats(), backend=backend, metrics=metrics)
+                if stage == 'category':
+                    crawl = CategoryCrawler(home_page=server.base_url, headless_option=True, **shared).get_categories
+                elif stage == 'product':
+                    crawl = lambda: ProductCrawler(headless_option=True, frontier=frontier, **shared).get_products(max_attempts=args.max_attempts)
+                else:
+                    crawl = lambda: CommentStarCrawler(headless_option=True, frontier=frontier, **shared).get_stars_comments(
+                        workers=args.workers, max_attempts=args.max_attempts)
+                try:
+                    results.append(run_stage(stage, crawl, writer, metrics, server))
+                finally:
+                    writer.close()
+        finally:
+            driver_pool.close()
+            frontier.close()
+            if backend is not None:
+                backend.close()
+            os.chdir(cwd)
+            server.shutdown()
+
+    print('mock site: {} categories x {} products x {} reviews, {:.0f} ms latency, {:.0%} failing ({}), backend {}, {} workers'.format(
+        args.categories, args.products, args.reviews, args.latency * 1000, args.failure_rate, args.failure_mode, args.backend, args.workers))
+    print('{:<10}{:>9}{:>10}{:>8}{:>9}{:>8}{:>9}{:>12}{:>12}{:>10}{:>12}'.format(
+        'stage', 'seconds', 'requests', 'pages', 'pages/s', 'rows', 'rows/s', 'db write ms', 'db max ms', 'RSS MB', 'RSS+Chrome'))
+    for result in results:
+        print('{stage:<10}{seconds:>9.2f}{requests:>10}{pages:>8}{pages_per_second:>9.2f}{rows:>8}{rows_per_second:>9.1f}'
+              '{db_write_mean_ms:>12.2f}{db_write_max_ms:>12.2f}{peak_rss_mb:>10.1f}{peak_rss_tree_mb:>12.1f}'.format(**result))
+    if output:
+        with open(output, 'w') as f:
+            f.write(json.dumps({'settings': vars(args), 'stages': results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--categories', type=int, default=CATEGORIES, help='categories on the home page, at most 26')
+    parser.add_argument('--products', type=int, default=PRODUCTS, help='products per category')
+    parser.add_argument('--reviews', type=int, default=REVIEWS, help='reviews per product')
+    parser.add_argument('--latency', type=float, default=LATENCY, help='seconds before every response of the mock site')
+    parser.add_argument('--failure-rate', type=float, default=FAILURE_RATE, help='fraction of category pages, product pages and API calls failing')
+    parser.add_argument('--failure-mode', choices=['error', 'stall'], default='error', help="answer failing pages with 503, or stall them past the page load timeout so they are retried")
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium')
+    parser.add_argument('--drivers', type=int, default=1, help='warm Chrome sessions')
+    parser.add_argument('--workers', type=int, default=1, help='product pages crawled in parallel')
+    parser.add_argument('--max-attempts', type=int, default=3, help='attempts per page before giving up on it')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,89 @@
+"""
+    Comparing WebDriver round trips and latency of the injected-script extraction with the
+    element-by-element path, on synthetic pages loaded from local files.
+
+    Usage: python -m benchmarks.bench_extraction --reviews 50 --products 60 --repeat 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from driver_pool import DriverPool
+from extraction import extract_reviews, extract_reviews_by_elements, extract_product_urls, extract_product_urls_by_elements
+from benchmarks.pages import product_page_html, search_page_html
+
+
+def count_round_trips(driver):
+    """
+        Wrapping driver.execute so every WebDriver command is counted. WebElements send their commands
+        through the same method.
+        Args:
+            driver (WebDriver): The driver to be instrumented.
+        Returns:
+            counter (dict): {'calls': int}, updated as commands are sent.
+    """
+    counter = {'calls': 0}
+    execute = driver.execute
+
+    def counting_execute(*args, **kwargs):
+        counter['calls'] += 1
+        return execute(*args, **kwargs)
+
+    driver.execute = counting_execute
+    return counter
+
+
+def measure(driver, counter, extract, repeat):
+    """
+        Running an extraction function several times.
+        Args:
+            driver (WebDriver): Driver with the page loaded.
+            counter (dict): Round trip counter of the driver.
+            extract (function): Extraction function taking the driver.
+            repeat (int): Number of runs.
+        Returns:
+            result (tuple): (round trips per run, milliseconds per run, extracted value)
+    """
+    counter['calls'] = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        value = extract(driver)
+    elapsed = time.perf_counter() - start
+    return counter['calls'] / repeat, elapsed / repeat * 1000, value
+
+
+def main(args):
+    pool = DriverPool(size=1, headless_option=True)
+    driver = pool.acquire()
+    counter = count_round_trips(driver)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            product_page = os.path.join(directory, 'product.html')
+            search_page = os.path.join(directory, 'search.html')
+            with open(product_page, 'w', encoding='utf-8') as f:
+                f.write(product_page_html(args.reviews))
+            with open(search_page, 'w', encoding='utf-8') as f:
+                f.write(search_page_html([f'https://shopee.vn/item-i.{i}.{i}' for i in range(args.products)]))
+
+            print('{:<26}{:>14}{:>14}'.format('path', 'round trips', 'ms per page'))
+            driver.get('file://' + product_page)
+            for name, extract in (('reviews, elements', extract_reviews_by_elements), ('reviews, script', extract_reviews)):
+                calls, ms, value = measure(driver, counter, extract, args.repeat)
+                print('{:<26}{:>14.0f}{:>14.1f}'.format(name, calls, ms))
+            driver.get('file://' + search_page)
+            for name, extract in (('products, elements', extract_product_urls_by_elements), ('products, script', extract_product_urls)):
+                calls, ms, value = measure(driver, counter, extract, args.repeat)
+                print('{:<26}{:>14.0f}{:>14.1f}'.format(name, calls, ms))
+    finally:
+        pool.release(driver, crashed=True) # don't keep the instrumented driver
+        pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reviews', type=int, default=50, help='reviews on the synthetic product page')
+    parser.add_argument('--products', type=int, default=60, help='products on the synthetic search page')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per extraction path')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,101 @@
+"""
+    Measuring the cost of the lookups made by the crawlers and the web app as the tables grow, on the
+    original schema (version 0, no indexes) and after the migrations. Runs on temporary databases, no
+    browser is needed.
+
+    Usage: python -m benchmarks.bench_lookups --sizes 1000 10000 100000 --lookups 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from migrations import migrate, _create_tables
+
+
+CATEGORIES = 20
+REVIEWS_PER_PRODUCT = 5
+
+
+def build(path, n_products):
+    """
+        Creating a database with the original schema and synthetic rows.
+        Args:
+            path (str): Path of the database.
+            n_products (int): Number of products.
+        Returns:
+            connection (sqlite3.Connection): Connection to the database.
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute("BEGIN")
+    _create_tables(connection)
+    connection.executemany("INSERT INTO categories (name, url) VALUES (?, ?)",
+                           ((f'Category {i}', f'https://shopee.vn/Category-{i}-cat.{i}') for i in range(CATEGORIES)))
+    connection.executemany("INSERT INTO products (url, category_id) VALUES (?, ?)",
+                           ((f'https://shopee.vn/Product-{i}-i.{i % 997}.{i}?sp_atk=x', i % CATEGORIES + 1) for i in range(n_products)))
+    connection.executemany("INSERT INTO comments_stars (comment, stars, product_id) VALUES (?, ?, ?)",
+                           ((f'Comment {i}', i % 5 + 1, i // REVIEWS_PER_PRODUCT + 1) for i in range(n_products * REVIEWS_PER_PRODUCT)))
+    connection.execute("COMMIT")
+    return connection
+
+
+def queries(migrated):
+    """
+        Listing the lookups to be measured.
+        Args:
+            migrated (bool): True for the migrated schema, which looks products up by item key.
+        Returns:
+            queries (list): (name, SQL, function building the parameter from a product number)
+    """
+    return [
+        ('product id by URL', "SELECT id FROM products WHERE url = ?",
+         lambda i: (f'https://shopee.vn/Product-{i}-i.{i % 997}.{i}?sp_atk=x', )),
+        ('product id by item key', "SELECT id FROM products WHERE item_key = ?" if migrated else "SELECT id FROM products WHERE url LIKE ?",
+         (lambda i: (f'i.{i % 997}.{i}', )) if migrated else (lambda i: (f'%-i.{i % 997}.{i}?%', ))),
+        ('category id by name', "SELECT id FROM categories WHERE name = ?", lambda i: (f'Category {i % CATEGORIES}', )),
+        ('reviews of a product', "SELECT comment, stars FROM comments_stars WHERE product_id = ?", lambda i: (i + 1, )),
+        ('average stars of a product', "SELECT AVG(stars) FROM comments_stars WHERE product_id = ?", lambda i: (i + 1, )),
+    ]
+
+
+def measure(connection, sql, parameters, lookups, n_products):
+    """
+        Running a lookup for random products.
+        Args:
+            connection (sqlite3.Connection): Connection to the database.
+            sql (str): The query.
+            parameters (function): Builds the parameters from a product number.
+            lookups (int): Number of lookups.
+            n_products (int): Number of products in the database.
+        Returns:
+            microseconds (float): Average time of a lookup.
+    """
+    numbers = [random.randrange(n_products) for _ in range(lookups)]
+    start = time.perf_counter()
+    for number in numbers:
+        connection.execute(sql, parameters(number)).fetchall()
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def main(args):
+    random.seed(0)
+    print('{:<30}{:>10}{:>16}{:>16}'.format('lookup', 'products', 'us, version 0', 'us, migrated'))
+    with tempfile.TemporaryDirectory() as directory:
+        for n_products in args.sizes:
+            connection = build(os.path.join(directory, f'{n_products}.db'), n_products)
+            before = [measure(connection, sql, parameters, args.lookups, n_products) for _, sql, parameters in queries(migrated=False)]
+            migrate(connection)
+            after = [measure(connection, sql, parameters, args.lookups, n_products) for _, sql, parameters in queries(migrated=True)]
+            for (name, _, _), cost_before, cost_after in zip(queries(migrated=True), before, after):
+                print('{:<30}{:>10}{:>16.1f}{:>16.1f}'.format(name, n_products, cost_before, cost_after))
+            connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='numbers of products')
+    parser.add_argument('--lookups', type=int, default=200, help='lookups per query and size')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,60 @@
+"""
+    Measuring bytes transferred and load time per page with a plain Chrome profile and with the lean
+    profile of browser_profile.py (resource blocking, DOMContentLoaded page load strategy).
+
+    Usage: python -m benchmarks.bench_profile https://shopee.vn/ https://shopee.vn/Thoi-Trang-Nam-cat.11035567
+"""
+import argparse
+
+from browser_profile import BrowserProfile
+from driver_pool import DriverPool
+
+
+def measure(profile, urls, repeat):
+    """
+        Loading every URL with a profile.
+        Args:
+            profile (BrowserProfile): Profile with measure=True.
+            urls (list): URLs of the pages.
+            repeat (int): Loads per URL, the costs are averaged.
+        Returns:
+            costs (list): Averaged cost of every URL, see BrowserProfile.measure_page.
+    """
+    pool = DriverPool(size=1, headless_option=True, profile=profile)
+    driver = pool.acquire()
+    costs = []
+    try:
+        for url in urls:
+            runs = [profile.measure_page(driver, url) for _ in range(repeat)]
+            costs.append({key: sum(run[key] for run in runs) / repeat for key in runs[0]})
+    finally:
+        pool.release(driver, crashed=True) # the performance log is not needed by anyone else
+        pool.close()
+    return costs
+
+
+def main(args):
+    profiles = (
+        ('plain', BrowserProfile(block=False, page_load_strategy='normal', measure=True)),
+        ('lean', BrowserProfile(measure=True)),
+    )
+    results = {name: measure(profile, args.urls, args.repeat) for name, profile in profiles}
+
+    print('{:<60}{:>8}{:>12}{:>10}{:>10}{:>10}'.format('page', 'profile', 'KB', 'requests', 'blocked', 'seconds'))
+    for index, url in enumerate(args.urls):
+        for name, _ in profiles:
+            cost = results[name][index]
+            print('{:<60}{:>8}{:>12.1f}{:>10.0f}{:>10.0f}{:>10.2f}'.format(
+                url[:59], name, cost['bytes'] / 1024, cost['requests'], cost['blocked'], cost['seconds']))
+    for name, _ in profiles:
+        total_kb = sum(cost['bytes'] for cost in results[name]) / 1024
+        total_seconds = sum(cost['seconds'] for cost in results[name])
+        print('{}: {:.1f} KB, {:.2f} seconds in total'.format(name, total_kb, total_seconds))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('urls', nargs='*', default=['https://shopee.vn/'], help='pages to be loaded')
+    parser.add_argument('--repeat', type=int, default=3, help='loads per page and profile')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,126 @@
+"""
+    Measuring the cold start of the command line tools: every target runs in a fresh interpreter, the
+    interpreter start alone is measured too so the import cost can be told apart. Also reports which
+    heavy dependencies a target loads and the modules taking the most time (python -X importtime), so a
+    top-level import that slows down every cron run shows up. No browser is needed.
+
+    Usage: python -m benchmarks.bench_startup --repeat 10 --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # the targets are imported from the repository
+TARGETS = {
+    'python': ['-c', 'pass'], # the interpreter alone
+    'import parsers': ['-c', 'import parsers'],
+    'import storage': ['-c', 'import storage'],
+    'import crawlers': ['-c', 'import crawlers'],
+    'import main': ['-c', 'import main'],
+    'import app': ['-c', 'import app'],
+    'main.py --help': ['main.py', '--help'],
+}
+HEAVY_MODULES = ['selenium.webdriver', 'bs4', 'prometheus_client', 'requests', 'multiprocessing', 'sqlite3', 'cs50', 'flask']
+TOP_MODULES = 8 # modules listed per target by -X importtime
+
+
+def run(arguments, importtime=False):
+    """
+        Running a target in a fresh interpreter.
+        Args:
+            arguments (list): Arguments of the interpreter.
+            importtime (bool): True to run it with -X importtime.
+        Returns:
+            seconds (float): Wall time of the run.
+            result (subprocess.CompletedProcess): Exit code and output of the run.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *(['-X', 'importtime'] if importtime else []), *arguments],
+                            cwd=ROOT, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def loaded_modules(arguments):
+    """
+        Finding the heavy dependencies loaded by an import target.
+        Args:
+            arguments (list): Arguments of the interpreter, ['-c', '<statement>'].
+        Returns:
+            modules (list): Modules of HEAVY_MODULES in sys.modules after the statement, None for a script.
+    """
+    if arguments[0] != '-c':
+        return None
+    check = f'{arguments[1]}; import sys; print(" ".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    _, result = run(['-c', check])
+    return result.stdout.split() if result.returncode == 0 else None
+
+
+def slowest_imports(arguments, top=TOP_MODULES):
+    """
+        Listing the modules taking the most time to import, their own time without their imports.
+        Args:
+            arguments (list): Arguments of the interpreter.
+            top (int): Number of modules listed.
+        Returns:
+            modules (list): (module, milliseconds) pairs, slowest first.
+    """
+    _, result = run(arguments, importtime=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        modules.append((module.strip(), int(self_us) / 1000))
+    return sorted(modules, key=lambda module: -module[1])[:top]
+
+
+def main(args):
+    output = os.path.abspath(args.output) if args.output else None
+    results = []
+    for name, arguments in TARGETS.items():
+        seconds = []
+        error = None
+        for _ in range(args.repeat):
+            elapsed, result = run(arguments)
+            if result.returncode != 0:
+                error = (result.stderr.strip().splitlines() or ['exit code {}'.format(result.returncode)])[-1]
+                break
+            seconds.append(elapsed)
+        if error:
+            print(f'{name}: failed, {error}')
+            results.append({'target': name, 'error': error})
+            continue
+        results.append({'target': name, 'median_ms': statistics.median(seconds) * 1000, 'min_ms': min(seconds) * 1000,
+                        'loaded': loaded_modules(arguments), 'slowest_imports': slowest_imports(arguments)})
+
+    interpreter = next((result['median_ms'] for result in results if result['target'] == 'python' and 'median_ms' in result), 0)
+    print('{} runs per target, {}'.format(args.repeat, sys.version.split()[0]))
+    print('{:<18}{:>11}{:>9}{:>13}  {}'.format('target', 'median ms', 'min ms', 'imports ms', 'heavy modules loaded'))
+    for result in results:
+        if 'error' in result:
+            continue
+        print('{:<18}{:>11.1f}{:>9.1f}{:>13.1f}  {}'.format(result['target'], result['median_ms'], result['min_ms'],
+                                                            result['median_ms'] - interpreter, ', '.join(result['loaded'] or []) or '-'))
+    if args.verbose:
+        for result in results:
+            if result.get('slowest_imports'):
+                print(f"\n{result['target']}, slowest imports (self ms):")
+                for module, milliseconds in result['slowest_imports']:
+                    print('    {:<40}{:>8.2f}'.format(module, milliseconds))
+    if output:
+        with open(output, 'w') as f:
+            f.write(json.dumps({'settings': vars(args), 'python': sys.version, 'targets': results}, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=10, help='runs per target, the median is reported')
+    parser.add_argument('--verbose', action='store_true', help='list the slowest imports of every target')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,225 @@
+"""
+    Local mock of Shopee generating synthetic pages with the XPaths and class names of the crawlers,
+    and the JSON endpoints of HttpBackend, with a configurable size, latency and failure rate. Restarted
+    with --updated and --new-reviews, it shows new reviews on some products, for incremental runs.
+
+    Usage: python -m benchmarks.mock_site --port 8000 --categories 5 --products 20 --reviews 25
+    then:  python main.py --category --base-url http://127.0.0.1:8000/
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urljoin, urlsplit
+
+from benchmarks.pages import home_page_html, paginated_page_html, review, review_html
+from parsers import category_url, product_url
+
+
+# Hyperparameters
+CATEGORIES = 5 # at most 26, the number of names CategoryCrawler knows
+PRODUCTS = 20 # products per category
+REVIEWS = 25 # reviews per product
+UPDATED = 0 # products per category showing NEW_REVIEWS more reviews, the first ones
+NEW_REVIEWS = 0 # reviews added to the updated products, listed first like the newest reviews of Shopee
+PRODUCTS_PAGE_SIZE = 10 # products per page of search results
+REVIEWS_PAGE_SIZE = 6 # reviews per page of the comment section
+LATENCY = 0.05 # seconds before every response
+FAILURE_RATE = 0.0 # fraction of the pages failing
+STALL = 15 # seconds a failing page stalls in 'stall' mode, longer than the page load timeouts of the crawlers
+
+CATEGORY_PATTERN = re.compile(r'-cat\.(\d+)$')
+PRODUCT_PATTERN = re.compile(r'-i\.(\d+)\.(\d+)$')
+FIRST_CATEGORY_ID = 100
+
+
+class MockSiteHandler(BaseHTTPRequestHandler):
+    """
+        Answering the pages of the mock site:
+            / -> home page with CATEGORIES category links
+            /<name>-cat.<id> -> search results of a category, PRODUCTS_PAGE_SIZE products per page
+            /<name>-i.<shop id>.<item id> -> product page, REVIEWS_PAGE_SIZE reviews per page, newest first
+            /api/v4/pages/get_category_tree, /api/v4/search/search_items (with the number of ratings),
+            /api/v2/item/get_ratings
+        Failing pages and API calls are answered with 503, or only after STALL seconds in 'stall' mode.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True # headers and body are written separately, Nagle would delay keep-alive responses by 40 ms
+    categories = CATEGORIES
+    products = PRODUCTS
+    reviews = REVIEWS
+    updated = UPDATED
+    new_reviews = NEW_REVIEWS
+    products_page_size = PRODUCTS_PAGE_SIZE
+    reviews_page_size = REVIEWS_PAGE_SIZE
+    latency = LATENCY
+    failure_rate = FAILURE_RATE
+    failure_mode = 'error'
+    stall = STALL
+    random = random.Random(0)
+    stats = None # kind -> requests served, shared by the handlers of a server
+    lock = threading.Lock()
+
+    def __count(self, kind):
+        """
+            Counting a request.
+            Args:
+                kind (str): 'home', 'category', 'product', 'api', 'failed' or 'missing'.
+        """
+        with self.lock:
+            self.stats[kind] = self.stats.get(kind, 0) + 1
+
+    def __send(self, status, body, content_type):
+        """
+            Sending a response.
+            Args:
+                status (int): Status code.
+                body (str): Body of the response.
+                content_type (str): Content type of the body.
+        """
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __base_url(self):
+        return f'http://{self.headers.get("Host")}/'
+
+    def __category_ids(self):
+        return range(FIRST_CATEGORY_ID, FIRST_CATEGORY_ID + self.categories)
+
+    def __product_urls(self, catid):
+        """
+            Listing the products of a category.
+            Args:
+                catid (int): Id of the category.
+            Returns:
+                products (list): (name, shop id, item id, URL) of the products.
+        """
+        return [(f'San pham {catid} {n}', catid, catid * 100000 + n, product_url(self.__base_url(), f'San pham {catid} {n}', catid, catid * 100000 + n))
+                for n in range(self.products)]
+
+    def __review_indexes(self, itemid):
+        """
+            Listing the indexes of the reviews of a product, unique across products, newest first.
+        """
+        new_reviews = self.new_reviews if itemid % 100000 < self.updated else 0
+        return [itemid * 1000 + self.reviews + n for n in reversed(range(new_reviews))] + list(range(itemid * 1000, itemid * 1000 + self.reviews))
+
+    def __home(self):
+        urls = [category_url(self.__base_url(), f'Danh Muc {catid}', catid) for catid in self.__category_ids()]
+        return home_page_html(urls)
+
+    def __category(self, catid):
+        urls = [url for _, _, _, url in self.__product_urls(catid)]
+        pages = [''.join(f'<div class="col-xs-2-4 shopee-search-item-result__item"><a href="{url}">item</a></div>' for url in urls[start:start + self.products_page_size])
+                 for start in range(0, len(urls), self.products_page_size)]
+        return paginated_page_html(f'Category {catid}', 'row shopee-search-item-result__items', pages)
+
+    def __product(self, itemid):
+        indexes = list(self.__review_indexes(itemid))
+        pages = [''.join(review_html(index) for index in indexes[start:start + self.reviews_page_size])
+                 for start in range(0, len(indexes), self.reviews_page_size)]
+        return paginated_page_html(f'Product {itemid}', 'shopee-product-comment-list', pages)
+
+    def __api(self, path, query):
+        """
+            Answering the JSON endpoints of HttpBackend.
+            Returns:
+                payload (dict): The payload, None for an unknown endpoint.
+        """
+        offset = int(query.get('newest', query.get('offset', 0)))
+        limit = int(query.get('limit', 60))
+        if path == '/api/v4/pages/get_category_tree':
+            return {'data': {'category_list': [{'catid': catid, 'display_name': f'Danh Muc {catid}'} for catid in self.__category_ids()]}}
+        if path == '/api/v4/search/search_items':
+            catid = int(query.get('match_id', 0))
+            products = self.__product_urls(catid) if catid in self.__category_ids() else []
+            return {'items': [{'item_basic': {'name': name, 'shopid': shopid, 'itemid': itemid, 'cmt_count': len(self.__review_indexes(itemid))}}
+                              for name, shopid, itemid, _ in products[offset:offset + limit]]}
+        if path == '/api/v2/item/get_ratings':
+            indexes = list(self.__review_indexes(int(query.get('itemid', 0))))[offset:offset + limit]
+            return {'data': {'ratings': [dict(zip(('comment', 'rating_star'), review(index))) for index in indexes]}}
+        return None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        time.sleep(self.latency)
+        category = CATEGORY_PATTERN.search(path)
+        product = PRODUCT_PATTERN.search(path)
+        if path.startswith('/api/'):
+            payload = self.__api(parts.path, {name: values[0] for name, values in parse_qs(parts.query).items()})
+            kind, page, content_type = 'api', lambda: json.dumps(payload, ensure_ascii=False), 'application/json; charset=utf-8'
+            if payload is None:
+                self.__count('missing')
+                return self.__send(404, '{"error": 404}', 'application/json')
+        elif path == '/':
+            kind, page, content_type = 'home', self.__home, 'text/html; charset=utf-8'
+        elif category and int(category.group(1)) in self.__category_ids():
+            kind, page, content_type = 'category', lambda: self.__category(int(category.group(1))), 'text/html; charset=utf-8'
+        elif product:
+            kind, page, content_type = 'product', lambda: self.__product(int(product.group(2))), 'text/html; charset=utf-8'
+        else:
+            self.__count('missing')
+            return self.__send(404, '<html><body>Not found</body></html>', 'text/html; charset=utf-8')
+
+        # the home page and the category tree always load, like the entry point of a real crawl
+        if kind != 'home' and parts.path != '/api/v4/pages/get_category_tree' and self.random.random() < self.failure_rate:
+            self.__count('failed')
+            if self.failure_mode == 'stall':
+                time.sleep(self.stall) # longer than the page load timeout, the crawler retries the page
+            else:
+                return self.__send(503, '<html><body>Service Unavailable</body></html>', 'text/html; charset=utf-8')
+        self.__count(kind)
+        self.__send(200, page(), content_type)
+
+    def log_message(self, format, *args):
+        pass # keep the crawler output readable
+
+
+def start_mock_site(port=0, **settings):
+    """
+        Starting the mock site in a background thread.
+        Args:
+            port (int): Port to listen on, 0 for any free port.
+            settings: Attributes of MockSiteHandler to override, e.g. products=50, latency=0.2.
+        Returns:
+            server (ThreadingHTTPServer): The running server, server.base_url is its home page and
+            server.stats the number of requests served per kind.
+    """
+    stats = {}
+    handler = type('Handler', (MockSiteHandler, ), dict(settings, stats=stats, random=random.Random(0), lock=threading.Lock()))
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True # stalled requests don't keep the benchmark alive
+    server.base_url = urljoin(f'http://127.0.0.1:{server.server_port}', '/')
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--categories', type=int, default=CATEGORIES, help='categories on the home page, at most 26')
+    parser.add_argument('--products', type=int, default=PRODUCTS, help='products per category')
+    parser.add_argument('--reviews', type=int, default=REVIEWS, help='reviews per product')
+    parser.add_argument('--updated', type=int, default=UPDATED, help='products per category showing --new-reviews more reviews')
+    parser.add_argument('--new-reviews', type=int, default=NEW_REVIEWS, help='reviews added to the updated products')
+    parser.add_argument('--latency', type=float, default=LATENCY, help='seconds before every response')
+    parser.add_argument('--failure-rate', type=float, default=FAILURE_RATE, help='fraction of category pages, product pages and API calls failing')
+    parser.add_argument('--failure-mode', choices=['error', 'stall'], default='error', help='answer failing pages with 503 or stall them')
+    args = parser.parse_args()
+    server = start_mock_site(args.port, categories=args.categories, products=args.products, reviews=args.reviews, updated=args.updated,
+                             new_reviews=args.new_reviews, latency=args.latency,
+                             failure_rate=args.failure_rate, failure_mode=args.failure_mode)
+    print(f'Serving the mock site on {server.base_url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,125 @@
+"""
+    Synthetic Shopee pages using the same XPaths and class names as the crawlers, so the crawlers can
+    be measured without hitting the live site.
+"""
+import html
+import json
+
+
+ACTIVE_STAR = '<svg class="shopee-svg-icon icon-rating-solid--active icon-rating-solid"></svg>'
+INACTIVE_STAR = '<svg class="shopee-svg-icon icon-rating-solid"></svg>'
+
+
+def review(index):
+    """
+        Building the comment and stars of one review.
+        Args:
+            index (int): Index of the review.
+        Returns:
+            comment (str): Text of the review.
+            stars (int): Stars of the review, 1 to 5.
+    """
+    return f"Sản phẩm đẹp, giao hàng nhanh #{index}", index % 5 + 1
+
+
+def review_html(index):
+    """
+        Building one review section.
+        Args:
+            index (int): Index of the review, decides its text and stars.
+        Returns:
+            html (str): The review section.
+    """
+    comment, stars = review(index)
+    return (
+        '<div class="shopee-product-rating">'
+        f'<div class="repeat-purchase-con"><div>{ACTIVE_STAR * stars}{INACTIVE_STAR * (5 - stars)}</div></div>'
+        f'<div class="EXI9SU">{html.escape(comment)}</div>'
+        '</div>'
+    )
+
+
+def product_page_html(n_reviews, offset=0):
+    """
+        Building a product page with its comment section.
+        Args:
+            n_reviews (int): Number of reviews on the page.
+            offset (int): Index of the first review.
+        Returns:
+            html (str): The product page.
+    """
+    reviews = ''.join(review_html(offset + i) for i in range(n_reviews))
+    return (
+        '<html><head><meta charset="utf-8"><title>Product</title></head><body>'
+        f'<div class="shopee-product-comment-list">{reviews}</div>'
+        '<button class="shopee-icon-button shopee-icon-button--right ">&gt;</button>'
+        '</body></html>'
+    )
+
+
+def search_page_html(product_urls):
+    """
+        Building a category (search result) page.
+        Args:
+            product_urls (list): URLs of the listed products.
+        Returns:
+            html (str): The search result page.
+    """
+    items = ''.join(f'<div class="col-xs-2-4 shopee-search-item-result__item"><a href="{html.escape(url)}">item</a></div>' for url in product_urls)
+    return (
+        '<html><head><meta charset="utf-8"><title>Category</title></head><body>'
+        f'<div class="row shopee-search-item-result__items">{items}</div>'
+        '<button class="shopee-icon-button shopee-icon-button--right ">&gt;</button>'
+        '</body></html>'
+    )
+
+
+def home_page_html(category_urls):
+    """
+        Building a home page with the category list at the XPath of CategoryCrawler and the
+        notification popover it waits for.
+        Args:
+            category_urls (list): URLs of the categories.
+        Returns:
+            html (str): The home page.
+    """
+    items = ''.join(f'<li><div><a href="{html.escape(url)}"><div>category</div></a></div></li>' for url in category_urls)
+    return (
+        '<html><head><meta charset="utf-8"><title>Home</title></head><body>'
+        '<div id="stardust-popover1"><div>Thông Báo</div></div>'
+        '<div id="main"><div><div><div class="xCao3k N2AB73"><div class="home-page"><div role="main"><div class="section-below-the-fold">'
+        '<div class="_3yZ4VM"><div class="home-category-list"><div class="shopee-header-section shopee-header-section--simple">'
+        '<div class="shopee-header-section__content"><div class="image-carousel"><div class="image-carousel__item-list-wrapper">'
+        f'<ul class="image-carousel__item-list">{items}</ul>'
+        '</div></div></div></div></div></div></div></div></div></div></div></div>'
+        '</body></html>'
+    )
+
+
+def paginated_page_html(title, list_class, pages):
+    """
+        Building a page whose list is replaced in place by the next button, like the search results and
+        the comment section of Shopee. The button is removed on the last page.
+        Args:
+            title (str): Title of the page.
+            list_class (str): Class attribute of the list, e.g. 'shopee-product-comment-list'.
+            pages (list): Inner HTML of the list on every page.
+        Returns:
+            html (str): The page.
+    """
+    button = '<button class="shopee-icon-button shopee-icon-button--right ">&gt;</button>' if len(pages) > 1 else ''
+    data = json.dumps(pages[1:]).replace('</', '<\\/') # the pages are shown by the script, not parsed as HTML
+    return (
+        f'<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head><body>'
+        f'<div class="{list_class}">{pages[0] if pages else ""}</div>{button}'
+        f'<script type="application/json" id="next-pages">{data}</script>'
+        '<script>'
+        'var pages = JSON.parse(document.getElementById("next-pages").textContent), page = 0;'
+        'var button = document.querySelector("button.shopee-icon-button--right");'
+        'if (button) button.addEventListener("click", function () {'
+        f'  document.querySelector("div[class=\'{list_class}\']").innerHTML = pages[page++];'
+        '  if (page >= pages.length) button.remove();'
+        '});'
+        '</script>'
+        '</body></html>'
+    )
@@ -0,0 +1,132 @@
+import json # decodes the performance log
+import time
+
+from lazy_imports import lazy_import
+Options = lazy_import('selenium.webdriver.chrome.options', 'Options') # options for chromedriver
+
+
+# Hyperparameters
+WINDOW_SIZE = '1920,1200'
+PAGE_LOAD_STRATEGY = 'eager' # driver.get returns at DOMContentLoaded, 'normal' waits for every image
+# Resource types the crawlers never read. Chrome can't block by type without intercepting every request,
+# so each type is blocked by the extensions of its files.
+BLOCKED_RESOURCE_TYPES = {
+    'image': ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.svg*', '*.ico*'],
+    'font': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*'],
+}
+# Tracking and advertising scripts loaded by Shopee pages
+BLOCKED_URL_PATTERNS = [
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+    '*facebook.com/tr*', '*connect.facebook.net*', '*hotjar.com*', '*clarity.ms*', '*tiktok.com*',
+]
+
+
+class BrowserProfile():
+    """
+        Lean Chrome profile applied to every session of the driver pool: blocks resource types and URL
+        patterns the crawlers never read, disables extensions and GPU, and can return from driver.get at
+        DOMContentLoaded. With measure=True the performance log is kept so page_cost can report bytes
+        transferred per page.
+    """
+    def __init__(self, block=True, blocked_resource_types=None, blocked_url_patterns=None, page_load_strategy=PAGE_LOAD_STRATEGY,
+                 window_size=WINDOW_SIZE, measure=False) -> None:
+        """
+            Initializing BrowserProfile.
+            Args:
+                block (bool): False to load every resource, like a plain Chrome session.
+                blocked_resource_types (list): Keys of BLOCKED_RESOURCE_TYPES to block, all of them if None.
+                blocked_url_patterns (list): URL patterns to block ('*' is a wildcard), BLOCKED_URL_PATTERNS if None.
+                page_load_strategy (str): 'normal', 'eager' or 'none'.
+                window_size (str): Width and height of the window.
+                measure (bool): True to record the network traffic of every page.
+        """
+        self.block = block
+        self.blocked_resource_types = list(BLOCKED_RESOURCE_TYPES) if blocked_resource_types is None else blocked_resource_types
+        self.blocked_url_patterns = BLOCKED_URL_PATTERNS if blocked_url_patterns is None else blocked_url_patterns
+        self.page_load_strategy = page_load_strategy
+        self.window_size = window_size
+        self.measure = measure
+
+    def blocked_urls(self):
+        """
+            Listing every blocked URL pattern.
+            Returns:
+                patterns (list): Patterns of the blocked resource types and URLs, empty if blocking is off.
+        """
+        if not self.block:
+            return []
+        patterns = [pattern for resource_type in self.blocked_resource_types for pattern in BLOCKED_RESOURCE_TYPES[resource_type]]
+        return patterns + list(self.blocked_url_patterns)
+
+    def options(self, headless_option=True):
+        """
+            Building the options for a new Chrome session.
+            Args:
+                headless_option (bool): True if you want to implicitly run chromedriver, otherwise the
+                chromedriver's GUI is displayed.
+            Returns:
+                options (Options): Options for chromedriver.
+        """
+        options = Options()
+        options.headless = headless_option
+        options.page_load_strategy = self.page_load_strategy
+        options.add_argument(f"--window-size={self.window_size}")
+        options.add_argument("--disable-extensions")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-first-run")
+        options.add_argument("--disable-background-networking") # no update checks or safe browsing downloads
+        if self.block and 'image' in self.blocked_resource_types:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        if self.measure:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        return options
+
+    def apply(self, driver):
+        """
+            Blocking the resource types and URL patterns in a started session.
+            Args:
+                driver (WebDriver): A new driver instance.
+        """
+        patterns = self.blocked_urls()
+        if patterns:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+
+    def page_cost(self, driver):
+        """
+            Summing up the network traffic recorded since the last call. Needs measure=True.
+            Args:
+                driver (WebDriver): The driver.
+            Returns:
+                cost (dict): Bytes transferred, number of requests and number of blocked requests.
+        """
+        cost = {'bytes': 0, 'requests': 0, 'blocked': 0}
+        for entry in driver.get_log('performance'): # reading the log empties it
+            message = json.loads(entry['message'])['message']
+            if message['method'] == 'Network.requestWillBeSent':
+                cost['requests'] += 1
+            elif message['method'] == 'Network.loadingFinished':
+                cost['bytes'] += message['params'].get('encodedDataLength', 0)
+            elif message['method'] == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+                cost['blocked'] += 1
+        return cost
+
+    def measure_page(self, driver, url):
+        """
+            Loading a page and measuring its cost. Needs measure=True.
+            Args:
+                driver (WebDriver): The driver.
+                url (str): URL of the page.
+            Returns:
+                cost (dict): Bytes transferred, number of requests, number of blocked requests and
+                seconds taken by driver.get.
+        """
+        self.page_cost(driver) # drop the traffic of the previous page
+        start = time.time()
+        driver.get(url)
+        seconds = time.time() - start
+        cost = self.page_cost(driver)
+        cost['seconds'] = seconds
+        return cost
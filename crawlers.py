@@ -1,28 +1,82 @@
-import selenium
-from selenium import webdriver # used to open chromedriver
-from webdriver_manager.chrome import ChromeDriverManager 
-from selenium.webdriver.chrome.options import Options # options for chromedriver
-from selenium.webdriver.common.by import By # used to find element/elements by XPATH, CLASS_NAME, TAG_NAME,...
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC # sets conditions on elements of a page
-from selenium.webdriver.common.keys import Keys
+import selenium.common.exceptions # TimeoutException and friends, without loading the webdriver
+from lazy_imports import lazy_import # selenium.webdriver is imported by the first page load
+By = lazy_import('selenium.webdriver.common.by', 'By') # used to find element/elements by XPATH, CLASS_NAME, TAG_NAME,...
+WebDriverWait = lazy_import('selenium.webdriver.support.ui', 'WebDriverWait')
+EC = lazy_import('selenium.webdriver.support.expected_conditions') # sets conditions on elements of a page
+Keys = lazy_import('selenium.webdriver.common.keys', 'Keys')
 
 import os # working with paths
 import time # calculates running time
+import threading # one worker crawler per thread
+from concurrent.futures import ThreadPoolExecutor # crawls category and product URLs in parallel
 import json # saving, loading
-import ast # converts string representation of lists to list
-import pandas as pd # processes tables
-from cs50 import SQL
+import csv # streams comments and stars to a file
+from collections import namedtuple
+
+from driver_pool import DriverPool, is_crash # warm Chrome sessions shared by the crawlers
+from storage import CrawlWriter, DONE, FAILED, IN_FLIGHT # batched, transactional writes to data.db
+from extraction import extract_product_urls, extract_reviews, PRODUCTS_XPATH, SECTIONS_XPATH # one injected script per page
+from waits import LoadStats, scroll_until, wait_for_network_idle # waits on DOM and network events instead of sleeping
+from retry import MAX_ATTEMPTS, RetryScheduler, run_with_retries # retries timed out pages with backoff
+from handoff import HandoffWriter, read_handoff # streams product URLs from ProductCrawler to CommentStarCrawler
+from frontier import Frontier, canonical_product_url, product_key # skips items already inserted or loaded
+from parsers import review_fingerprint # the newest review read, where the next incremental crawl of the product stops
+from metrics import Metrics # where the crawl time goes
+from rate_control import RateController # paces the page loads per host
 
 
 # Hyperparameters
 PRODUCTS_PER_CATEGORY = 10 # For example, 100
 COMMENTS_STARS_PER_PRODUCT = 10 # For example, 10
-DRIVER_PATH = './chromedriver' # for using local chromedriver
+WORKERS = 1 # number of product pages crawled at the same time by CommentStarCrawler
+PRODUCT_WORKERS = 1 # number of category pages crawled at the same time by ProductCrawler
+CATEGORY_TTL = 24 * 60 * 60 # seconds the saved categories are reused by an incremental run before the home page is loaded again
+
+# Result of crawling one product page, status is 'done', 'login' or 'timeout'. comments and stars are the
+# reviews found by this attempt, they were already handed to on_page page by page. fingerprint identifies
+# the newest review, None if there is none.
+ProductReviews = namedtuple('ProductReviews', ['url', 'status', 'comments', 'stars', 'fingerprint'])
 
-# Configure CS50 Library to use SQLite database
-db = SQL("sqlite:///data.db")
+
+def _in_flight(writer, stage, items, key=lambda item: item):
+    """
+        Marking items in-flight in the crawl state as they are taken by a crawler.
+        Args:
+            writer (CrawlWriter): Storage holding the crawl state.
+            stage (str): 'category' or 'product'.
+            items (iterable): Items to be crawled.
+            key (callable): Returns the name or URL of an item.
+        Returns:
+            items (iterator): The same items.
+    """
+    for item in items:
+        writer.set_state(stage, key(item), IN_FLIGHT)
+        yield item
+
+
+def _newer_reviews(comments, stars, fingerprint, known=None):
+    """
+        Keeping the reviews newer than the newest review stored by the last crawl of a product, reviews
+        are listed newest first.
+        Args:
+            comments (list): Comments of a page.
+            stars (list): Stars of the page, one per comment.
+            fingerprint (str): Fingerprint of the newest review stored, None for a product never crawled.
+            known (set): Fingerprints of every review stored, for a product whose newest review isn't
+            known (stored before the watermarks): the reviews stored are dropped wherever they are.
+        Returns:
+            comments (list): Comments before the stored review.
+            stars (list): Stars before the stored review.
+            reached (bool): True if the stored review is on the page, the next pages are stored already.
+    """
+    if known:
+        kept = [(comment, star) for comment, star in zip(comments, stars) if review_fingerprint(comment, star) not in known]
+        return [comment for comment, _ in kept], [star for _, star in kept], False
+    if fingerprint is not None:
+        for index, (comment, star) in enumerate(zip(comments, stars)):
+            if review_fingerprint(comment, star) == fingerprint:
+                return comments[:index], stars[:index], True
+    return comments, stars, False
 
 # class MasterCrawler():
 #     def __init__(self, headless) -> None:
@@ -54,18 +108,37 @@ class CategoryCrawler():
         Collecting URLs of categories from the Shopee homepage. Saving them for later uses.
     """
     MAX_WAITING_TIME = 30 # seconds
+    SCROLL_WAITING_TIME = 5 # seconds, deadline for the categories to appear after scrolling
+    CATEGORIES_URLS_XPATH = "//body/div[@id='main']/div/div/div[@class='xCao3k N2AB73']/div[@class='home-page']/div[@role='main']/div[@class='section-below-the-fold']/div[@class='_3yZ4VM']/div[@class='home-category-list']/div[@class='shopee-header-section shopee-header-section--simple']/div[@class='shopee-header-section__content']/div[@class='image-carousel']/div[@class='image-carousel__item-list-wrapper']/ul[@class='image-carousel__item-list']/li/div/a"
     categories_urls_dict = {} # contains URLs of categories
 
-    def __init__(self, home_page, headless_option=True) -> None:
+    def __init__(self, home_page, headless_option=True, driver_pool=None, writer=None, load_stats=None, backend=None, snapshots=None,
+                 metrics=None, rate_controller=None) -> None:
         """
             Initializing CategoryCrawler.
             Args:
                 home_page (str): Homepage URL.
                 headless_option (bool): True if you want to implicitly run chromedriver, otherwise the 
                 chromedriver's GUI is displayed.
+                driver_pool (DriverPool): Pool to borrow drivers from, a private one is created if None.
+                writer (CrawlWriter): Storage for the results, a private one is created if None.
+                load_stats (LoadStats): Per-page waiting times, a private one is created if None.
+                backend (HttpBackend): Fetches pages over plain HTTP first, Selenium is only used when it
+                fails. None to always use Selenium.
+                snapshots (SnapshotStore): Keeps the HTML of the pages loaded with Selenium, None to keep nothing.
+                metrics (Metrics): Timings and counts of the crawl, a private one is created if None.
+                rate_controller (RateController): Paces the page loads per host, a private one is created if None.
         """
         self.home_page = home_page
         self.headless_option = headless_option
+        self.driver_pool = driver_pool or DriverPool(size=1, headless_option=headless_option)
+        self.writer = writer or CrawlWriter()
+        self.load_stats = load_stats or LoadStats()
+        self.backend = backend
+        self.snapshots = snapshots
+        self.metrics = metrics or Metrics()
+        self.rate_controller = rate_controller or RateController(metrics=self.metrics)
+        self.driver = None
         self.__categories_real_names = [] # private attribute, can't be accessed outside the class
         self.succeeded = False # checks whether loading a page is succeeded
     
@@ -73,23 +146,34 @@ class CategoryCrawler():
     def categories_real_names(self):
         return self.__categories_real_names
 
-    def __load_page(self, driver_options):
+    def __load_page(self):
         """
             Loading the home page.
-            Args:
-                driver_options (Option): Options for chromedriver.
         """
-        self.driver = webdriver.Chrome(options=driver_options, executable_path=DRIVER_PATH) # initialize a driver controlling Chrome
-        # self.driver = webdriver.Chrome(options=driver_options, service=Service(ChromeDriverManager().install()))
+        self.driver = self.driver_pool.acquire() # borrow a warm driver controlling Chrome
         self.driver.set_page_load_timeout(CategoryCrawler.MAX_WAITING_TIME) # timeout for loading a page
-        self.driver.get(self.home_page) # opens the URL (home page)
+        with self.rate_controller.slot(self.home_page), self.metrics.timer('page_load', 'home'):
+            self.driver.get(self.home_page) # opens the URL (home page)
+        self.metrics.count('pages', 'home')
+
+    def __release_driver(self, crashed=False):
+        """
+            Giving the driver back to the pool.
+            Args:
+                crashed (bool): True if the driver raised an unrecoverable error.
+        """
+        if self.driver is not None:
+            self.driver_pool.release(self.driver, crashed=crashed)
+            self.driver = None
 
     def __scroll_down(self):
         """
-            Scrolling down one time (like pressing PAGE DOWN key once).
+            Scrolling down until the links of all categories are loaded, at most SCROLL_WAITING_TIME seconds.
         """
-        scroll_script = "window.scrollBy(0, 1000);"
-        self.driver.execute_script(scroll_script)
+        start = time.time()
+        scroll_until(self.driver, CategoryCrawler.CATEGORIES_URLS_XPATH, len(self.__categories_real_names), timeout=CategoryCrawler.SCROLL_WAITING_TIME)
+        self.load_stats.record(self.home_page, time.time() - start, fixed=5) # it used to sleep for 5 seconds
+        self.metrics.observe('wait', time.time() - start, 'home')
     
     def __close_popup(self):
         """
@@ -98,7 +182,8 @@ class CategoryCrawler():
         try:
             notification_xpath = '//*[@id="stardust-popover1"]/div'
             # Wait until the 'Thông Báo' button is loaded. It means that everything is successfully loaded.
-            WebDriverWait(self.driver, CategoryCrawler.MAX_WAITING_TIME).until(EC.element_to_be_clickable((By.XPATH, notification_xpath)))
+            with self.metrics.timer('wait', 'home'):
+                WebDriverWait(self.driver, CategoryCrawler.MAX_WAITING_TIME).until(EC.element_to_be_clickable((By.XPATH, notification_xpath)))
             
             # Run a JavaScript script to click on the close button on the banner
             close_button_script = 'return document.querySelector("#main shopee-banner-popup-stateful").shadowRoot.querySelector("div.home-popup__close-area div.shopee-popup__close-btn")'
@@ -148,19 +233,45 @@ class CategoryCrawler():
         """
             Finding URLs of categories, adding them to categories_urls_dict
         """
-        categories_urls_xpath = "//body/div[@id='main']/div/div/div[@class='xCao3k N2AB73']/div[@class='home-page']/div[@role='main']/div[@class='section-below-the-fold']/div[@class='_3yZ4VM']/div[@class='home-category-list']/div[@class='shopee-header-section shopee-header-section--simple']/div[@class='shopee-header-section__content']/div[@class='image-carousel']/div[@class='image-carousel__item-list-wrapper']/ul[@class='image-carousel__item-list']/li/div/a"
-        categories_urls = self.driver.find_elements(by=By.XPATH, value=categories_urls_xpath)
+        with self.metrics.timer('extraction', 'home'):
+            categories_urls = [element.get_attribute('href') for element in self.driver.find_elements(by=By.XPATH, value=CategoryCrawler.CATEGORIES_URLS_XPATH)]
+        self.metrics.count('items', 'category', min(len(categories_urls), len(self.__categories_real_names)))
         for category_name, category_url in zip(self.__categories_real_names, categories_urls):
-            CategoryCrawler.categories_urls_dict[category_name] = category_url.get_attribute('href')
+            CategoryCrawler.categories_urls_dict[category_name] = category_url
 
             # Add to database
             try:
                 # print(type(category_name), type(category_url))
-                db.execute("INSERT INTO categories (name, url) VALUES (?, ?)", category_name, category_url.get_attribute('href'))
+                self.writer.add_category(category_name, category_url)
                 print("Added category name and url to database successfully")
             except Exception as e:
                 print(f"{e} occured while inserting category name and url into database")
 
+    def __fetch_categories(self):
+        """
+            Getting names and URLs of categories with the HTTP backend, adding them to categories_urls_dict
+            Returns:
+                True if the categories were fetched, False if Selenium has to be used.
+        """
+        if self.backend is None:
+            return False
+        categories = self.backend.fetch_categories()
+        if not categories:
+            return False
+        self.__categories_real_names = [category_name for category_name, _ in categories]
+        self.metrics.count('pages', 'home')
+        self.metrics.count('items', 'category', len(categories))
+        for category_name, category_url in categories:
+            CategoryCrawler.categories_urls_dict[category_name] = category_url
+
+            # Add to database
+            try:
+                self.writer.add_category(category_name, category_url)
+                print("Added category name and url to database successfully")
+            except Exception as e:
+                print(f"{e} occured while inserting category name and url into database")
+        return True
+
     def __save(self, filename):
         """
             Saving categories_urls_dict to url_files directory.
@@ -170,31 +281,60 @@ class CategoryCrawler():
         saving_path = os.path.join(os.getcwd(), 'url_files', filename)
         with open(saving_path, 'w') as f:
             f.write(json.dumps(CategoryCrawler.categories_urls_dict))
-        
 
-    def get_categories(self):
+    def __load_saved(self, filename, max_age):
+        """
+            Reusing the categories saved by an earlier run, if they are recent enough, adding them to
+            categories_urls_dict.
+            Args:
+                filename (str): Name of the file in url_files directory.
+                max_age (float): Seconds the saved categories are reused.
+            Returns:
+                True if the saved categories were reused, False if they have to be fetched.
+        """
+        path = os.path.join(os.getcwd(), 'url_files', filename)
+        if not os.path.exists(path) or time.time() - os.path.getmtime(path) >= max_age:
+            return False
+        categories = self.load_urls(filename)
+        if not categories:
+            return False
+        self.__categories_real_names = list(categories)
+        for category_name, category_url in categories.items():
+            CategoryCrawler.categories_urls_dict[category_name] = category_url
+            self.writer.add_category(category_name, category_url) # the database may be new, e.g. the shard of a worker
+        print('Reusing {} categories saved {:.0f} minutes ago.'.format(len(categories), (time.time() - os.path.getmtime(path)) / 60))
+        return True
+
+    def get_categories(self, max_age=None):
         """
             Getting URLs of categories, then saving them to categories_urls_dict
+            Args:
+                max_age (float): Seconds the categories saved by an earlier run are reused instead of
+                loading the home page, e.g. CATEGORY_TTL. None to always load it.
         """
         print('CategoryCrawler IS GETTING CATEGORIES... ')
-        options = Options()
-        options.headless = self.headless_option # change that to True in production, the chrome driver will run implicitly and be less error-prone
-        options.add_argument("--window-size=1920,1200")
+        crashed = False
         try:
-            self.__load_page(driver_options=options)
-
-            # Try closing the popup
-            self.__close_popup()
-
-            # Scrolling down 
-            self.__scroll_down()
-            time.sleep(5) # sleeping for 5 seconds
-
-            # Find all names of categories
-            self.__find_categories_names()
-
-            # Find urls of all categories from the home page. Prepare for other crawlers
-            self.__find_categories_urls()
+            if max_age is not None and self.__load_saved('categories_urls.json', max_age):
+                print('CategoryCrawler DONE!')
+                self.succeeded = True
+                return
+            if not self.__fetch_categories(): # Selenium is the fallback of the HTTP backend
+                self.__load_page()
+
+                # Try closing the popup
+                self.__close_popup()
+
+                # Find all names of categories
+                self.__find_categories_names()
+
+                # Scrolling down until every category is loaded
+                self.__scroll_down()
+                if self.snapshots is not None:
+                    self.snapshots.save(self.home_page, 'home', self.driver.page_source, meta={'names': self.__categories_real_names})
+
+                # Find urls of all categories from the home page. Prepare for other crawlers
+                self.__find_categories_urls()
             
             self.__save(filename='categories_urls.json')
 
@@ -203,9 +343,13 @@ class CategoryCrawler():
 
         except Exception as e:
             print(f'Exception "{e}" occurs when getting categories.')
+            if isinstance(e, selenium.common.exceptions.TimeoutException):
+                self.metrics.count('timeouts', 'home')
+            crashed = is_crash(e)
             raise
         finally:
-            self.driver.quit() # Closing the Chrome window
+            self.__release_driver(crashed=crashed) # giving the Chrome window back to the pool
+            self.writer.flush()
 
     def load_urls(self, filename):
         """
@@ -223,16 +367,37 @@ class ProductCrawler():
         Grabbing URLs of products of each category due to the limit PRODUCTS_PER_CATEGORY
     """
     MAX_WAITING_TIME = 10 # seconds
+    SCROLL_WAITING_TIME = 5 # seconds, deadline for the products of a page to appear while scrolling
     
-    def __init__(self, headless_option=True) -> None:
+    def __init__(self, headless_option=True, driver_pool=None, writer=None, load_stats=None, backend=None, frontier=None, snapshots=None,
+                 metrics=None, rate_controller=None) -> None:
         """
             Initializing ProductCrawler.
             Args:
                 headless_option (bool): True if you want to implicitly run chromedriver, otherwise the 
                 chromedriver's GUI is displayed.
+                driver_pool (DriverPool): Pool to borrow drivers from, a private one is created if None.
+                writer (CrawlWriter): Storage for the results, a private one is created if None.
+                load_stats (LoadStats): Per-page waiting times, a private one is created if None.
+                backend (HttpBackend): Fetches pages over plain HTTP first, Selenium is only used when it
+                fails. None to always use Selenium.
+                frontier (Frontier): Seen-set of items, a private one is created if None.
+                snapshots (SnapshotStore): Keeps the HTML of the pages loaded with Selenium, None to keep nothing.
+                metrics (Metrics): Timings and counts of the crawl, a private one is created if None.
+                rate_controller (RateController): Paces the page loads per host, a private one is created if None.
         """
         self.headless_option = headless_option
+        self.driver_pool = driver_pool or DriverPool(size=1, headless_option=headless_option)
+        self.writer = writer or CrawlWriter()
+        self.load_stats = load_stats or LoadStats()
+        self.backend = backend
+        self.frontier = frontier or Frontier()
+        self.snapshots = snapshots
+        self.metrics = metrics or Metrics()
+        self.rate_controller = rate_controller or RateController(metrics=self.metrics)
+        self.driver = None
         self.product_urls = {} # contains URLs of products, saved to url_files directory
+        self.__local = threading.local() # holds the worker crawler of each thread
     
     def __load_urls_from_json(self, filename):
         """
@@ -244,194 +409,266 @@ class ProductCrawler():
         with open(path) as f:
             self.urls = json.load(f) # self.urls contains URLs of categories loaded from file
 
-    def __load_page(self, url, driver_options):
+    def __load_page(self, url):
         """
             Loading a URL of a product.
             Args:
                 url (str): URL of a product.
-                driver_options (Option): options setting for the driver instance.
         """
-        self.driver = webdriver.Chrome(options=driver_options, executable_path=DRIVER_PATH) # initialize a driver instance
+        self.driver = self.driver_pool.acquire() # borrow a warm driver instance
         self.driver.set_page_load_timeout(ProductCrawler.MAX_WAITING_TIME) # if timeout is exceeded, the page loading is failed.
-        self.driver.get(url) # opens a URL
-    
-            
+        with self.rate_controller.slot(url), self.metrics.timer('page_load', 'category'):
+            self.driver.get(url) # opens a URL
+        self.metrics.count('pages', 'category')
+
+    def __release_driver(self, crashed=False):
+        """
+            Giving the driver back to the pool.
+            Args:
+                crashed (bool): True if the driver raised an unrecoverable error.
+        """
+        if self.driver is not None:
+            self.driver_pool.release(self.driver, crashed=crashed)
+            self.driver = None
 
-    def __scroll_down(self, n_times=10):
+    def __scroll_down(self, target):
         """
-            Scrolling down to the bottom of a page.
+            Scrolling down only until target products are loaded, at most SCROLL_WAITING_TIME seconds.
             Args:
-                n_times (int): Number of times to scroll down.
+                target (int): Number of products needed from this page.
         """
-        for _ in range(n_times):
-            scroll_script = "window.scrollBy(0, 1000);"
-            self.driver.execute_script(scroll_script)
-            time.sleep(0.1) # wait some time to load elements
+        start = time.time()
+        scroll_until(self.driver, PRODUCTS_XPATH, target, timeout=ProductCrawler.SCROLL_WAITING_TIME)
+        self.load_stats.record(self.driver.current_url, time.time() - start, fixed=1) # it used to scroll 10 times, sleeping 0.1 second each
+        self.metrics.observe('wait', time.time() - start, 'category')
 
-    def __find_products_urls(self):
+    def __find_products_urls(self, category_name, url):
         """
             Finding URLs of products with the limit PRODUCTS_PER_CATEGORY.
+            Args:
+                category_name (str): Name of the category, kept with the snapshots of its pages.
+                url (str): URL of the category.
             Returns:
                 urls (list): URLs of products of each category.
         """
-        self.__scroll_down()
-
-        products_xpath = "//div[@class='row shopee-search-item-result__items']/div/a"
         urls = [] # consists of URLs of products from each category
+        page = 0
 
         while len(urls) < PRODUCTS_PER_CATEGORY:
-            products = self.driver.find_elements(by=By.XPATH, value=products_xpath)
-            for product in products:
-                urls.append(product.get_attribute('href'))
-                if len(urls) == PRODUCTS_PER_CATEGORY:
-                    break
-            self.__click_next_button()
-            self.__scroll_down()
+            self.__scroll_down(target=PRODUCTS_PER_CATEGORY - len(urls))
+            if self.snapshots is not None: # the next button doesn't always change the URL, the page number tells the pages apart
+                self.snapshots.save(f'{url}#page={page}', 'category', self.driver.page_source, meta={'category_name': category_name})
+            page += 1
+            with self.metrics.timer('extraction', 'category'):
+                found = extract_product_urls(self.driver, limit=PRODUCTS_PER_CATEGORY - len(urls)) # all links in one round trip
+            if not found:
+                break # no products on this page
+            urls.extend(found)
+            if len(urls) < PRODUCTS_PER_CATEGORY and not self.__click_next_button():
+                break # there is no next page
             
         return urls
 
 
+    def __crawl_category(self, category_name, url):
+        """
+            Getting URLs of products of a category, with the HTTP backend if there is one, otherwise
+            (or when it fails) by loading the category page.
+            Args:
+                category_name (str): Name of the category.
+                url (str): URL of the category.
+            Returns:
+                urls (list): URLs of products, None if loading the page timed out.
+        """
+        if self.backend is not None:
+            review_counts = {} # shown by the search API, the next incremental run compares them
+            urls = self.backend.fetch_product_urls(url, limit=PRODUCTS_PER_CATEGORY, review_counts=review_counts)
+            if urls:
+                self.metrics.count('pages', 'category')
+                self.writer.set_listed_reviews(review_counts)
+                return urls
+        try:
+            # Loading a url
+            self.__load_page(url)
+        except selenium.common.exceptions.TimeoutException:
+            print('Timeout Exception occurs.')
+            self.metrics.count('timeouts', 'category')
+            self.__release_driver() # gives the driver window back
+            return None
+        urls = self.__find_products_urls(category_name, url)
+        self.__release_driver()
+        return urls
+
     def __click_next_button(self):
         """
-            Clicking the next button of a products page.
+            Clicking the next button of a products page and waiting for the next page of products.
+            Returns:
+                True if the next page is loaded, False otherwise.
         """
         try:
+            first_product = extract_product_urls(self.driver, limit=1)
             next_button_xpath = "//button[@class='shopee-icon-button shopee-icon-button--right ']"
             next_button = self.driver.find_element(by=By.XPATH, value=next_button_xpath)
             next_button.click()
+            # the list is replaced in place, wait until it shows other products
+            with self.metrics.timer('wait', 'category'):
+                WebDriverWait(self.driver, ProductCrawler.MAX_WAITING_TIME, poll_frequency=0.1).until(
+                    lambda driver: extract_product_urls(driver, limit=1) != first_product)
+            self.metrics.count('pages', 'category')
+            return True
         except Exception as e:
             print(f'Exception "{e}" occurs while trying to click the next button.')
+            return False
 
 
-    def __save(self, df, filename):
-        """
-            Saving URLs of products per category to a file.
-            Args:
-                df (pd.DataFrame): Products per category, columns = ['category_name', 'products'].
-                filename (str): Name of a file.
-        """
-        saving_path = os.path.join(os.getcwd(), 'url_files', filename) # saved to url_files directory
-        df.to_csv(saving_path, index=False) # save file, take away the index of the dataframe
-
-    def __load_log_timeout(self, log_file):
-        """
-            Loading log_timeout.json file only if this file is not empty.
-            Args:
-                log_file (str): The JSON log file.
-            Returns:
-                logs (dict): A dictionary including failed-to-load URLs.
-        """
-        path = os.path.join(os.getcwd(), 'logs', log_file)
-        with open(path) as f:
-            logs = json.load(f)
-        return logs
-    
     def __save_log_timeout(self, logs, log_file):
         """
             Saving the log file named log_timeout.json
             Args:
-                logs (dict): A new logs including new failed-to-load URLs.
+                logs (dict): Categories given up on, category name -> URL.
                 log_file (str): Name of the log file.
         """
         saving_path = os.path.join(os.getcwd(), 'logs', log_file)
         with open(saving_path, 'w') as f:
             f.write(json.dumps(logs))
 
-    def __run_logs(self, driver_options):
+    def __worker(self):
         """
-            Running the log file after iterating over all URLs of products.
-            Args:
-                driver_options (Option): Options for setting up driver. 
+            Getting the worker crawler of the current thread, so every worker drives its own browser session.
+            Returns:
+                worker (ProductCrawler): The crawler owned by the current thread.
         """
-        logs = self.__load_log_timeout(log_file='log_timeout.json')
-        new_logs = {} # contains all URLs that failed to load when running the log file.
-        for category_name, url in logs.items():
-            try:
-                # Loading a url
-                self.__load_page(url, driver_options=driver_options)
-            except selenium.common.exceptions.TimeoutException:
-                print('Timeout Exception occurs.')
-                new_logs[category_name] = url
-                self.driver.quit() # closes the driver window
-                continue
-
-            # Get all urls of products
-            urls = self.__find_products_urls()
-            self.product_urls[category_name] = urls # Add found urls to dictionary product_urls
-
-            # Add URLs of products to database
-            try:
-                row = db.execute("SELECT * FROM categories WHERE name=?", category_name)
-                for url_found in urls:
-                    db.execute("INSERT INTO products (url, category_id) VALUES(?, ?)", url_found, row[0]["id"])
-                print("Added logs of products to database succesfully")
-            except Exception as e:
-                print("f{} occured while running logs of URLs of products")
-
-        self.__save_log_timeout(new_logs, log_file='log_timeout.json')
-        
-
+        worker = getattr(self.__local, 'crawler', None)
+        if worker is None:
+            worker = ProductCrawler(self.headless_option, driver_pool=self.driver_pool, writer=self.writer, load_stats=self.load_stats,
+                                    backend=self.backend, frontier=self.frontier, snapshots=self.snapshots, metrics=self.metrics,
+                                    rate_controller=self.rate_controller)
+            self.__local.crawler = worker
+        return worker
 
-    def get_products(self):
+    def __crawl_in_worker(self, category):
         """
-            Getting all URLs of products.
+            Crawling a category with the worker crawler of the current thread.
+            Args:
+                category (tuple): (name, URL) of the category.
+            Returns:
+                urls (list): URLs of products, None if loading the page timed out.
         """
-        options = Options()
-        options.headless = self.headless_option # change that to True in production, the chrome driver will run implicitly and be less error-prone
-        options.add_argument("--window-size=1920,1200") # modify window size of the driver
+        worker = self.__worker()
+        try:
+            return worker.__crawl_category(*category)
+        except Exception as e:
+            worker.__release_driver(crashed=is_crash(e)) # the thread keeps its worker for the next category
+            raise
 
+    def __pending_categories(self, categories, states, handoff, on_products):
+        """
+            Skipping the categories done by a previous run, their products are loaded from the database
+            and handed over again.
+            Args:
+                categories (iterable): (name, URL) of the categories.
+                states (dict): Category name -> status of the previous run.
+                handoff (HandoffWriter): The hand-off file.
+                on_products (function): Called with (category name, URLs of products), None if unused.
+            Returns:
+                categories (iterator): (name, URL) of the categories to be crawled.
+        """
+        done = 0
+        for category_name, url in categories:
+            if states.get(category_name) == DONE:
+                self.product_urls[category_name] = self.writer.category_products(category_name) # done by a previous run
+                handoff.write(category_name, self.product_urls[category_name])
+                if on_products is not None:
+                    on_products(category_name, self.product_urls[category_name])
+                done += 1
+            else:
+                yield category_name, url
+        if states:
+            print(f'Resuming, {done} categories already done.')
+
+    def get_products(self, max_attempts=MAX_ATTEMPTS, resume=False, workers=PRODUCT_WORKERS, categories=None, on_products=None,
+                     incremental=False):
+        """
+            Getting all URLs of products.
+            Args:
+                max_attempts (int): Number of times a category is loaded before giving up on it.
+                resume (bool): True to skip the categories done by a previous run, their products are
+                loaded from the database.
+                workers (int): Number of categories crawled at the same time. Each worker borrows its own
+                driver, so the driver pool should hold at least this many sessions.
+                categories (iterable): (name, URL) of the categories to crawl, read as they come. None to
+                load them from url_files/categories_urls.json.
+                on_products (function): Called with (category name, URLs of products) once the products
+                of a category are in the database, None if unused.
+                incremental (bool): True to list every category again, even with resume, so the stored
+                products showing new ratings are handed over again.
+        """
+        crashed = False
+        done = False
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        scheduler = RetryScheduler(max_attempts=max_attempts)
+        handoff = HandoffWriter() # url_files/products.csv, read by CommentStarCrawler
         try:
             print('ProductCrawler IS STARTING TO GET PRODUCTS...')
-            self.__load_urls_from_json(filename='categories_urls.json')
-            self.product_urls = self.urls # assign URLs of all categories (self.urls) to self.product_urls (to contain products URLs)
-            df = pd.DataFrame(self.product_urls.keys(), columns=['category_name']) # create a dataframe consisting of category_name column
-            logs = {} # create a new logs to save faied URLs when loading a page
-            for category_name, url in self.urls.items(): # categories URLs
-                try:
-                    # Loading a url
-                    self.__load_page(url, driver_options=options)
-                except selenium.common.exceptions.TimeoutException:
-                    print('Timeout Exception occurs.')
-                    logs[category_name] = url
-                    self.driver.quit()
-                    continue
-
-                # Get all urls of products
-                urls = self.__find_products_urls()
-                self.product_urls[category_name] = urls # override categories URLs to products URLs found above
+            if categories is None:
+                self.__load_urls_from_json(filename='categories_urls.json')
+                categories = self.urls.items()
+            self.product_urls = {} # category name -> URLs of its products
+            handed = set() # URLs handed over by this run, a product listed in two categories is crawled once
+
+            # Dealing with Timeout Exception: categories timing out are retried with backoff while the
+            # other categories are being crawled
+            states = self.writer.states('category') if resume and not incremental else {}
+            categories = self.__pending_categories(categories, states, handoff, on_products)
+            categories = _in_flight(self.writer, 'category', categories, key=lambda category: category[0])
+            crawl = self.__crawl_in_worker if executor is not None else lambda category: self.__crawl_category(*category)
+            for (category_name, _), urls in run_with_retries(crawl, categories, scheduler, failed=lambda urls: urls is None,
+                                                             executor=executor, window=2 * workers):
+                # items already inserted, from another category or a previous run, aren't inserted again
+                listed = list(dict.fromkeys(map(canonical_product_url, urls)))
+                new = [url for url in listed if self.frontier.add('product', product_key(url))]
+                self.metrics.count('items', 'product', len(new))
 
                 # Add URLs of products to database
                 try:
-                    row = db.execute("SELECT * FROM categories WHERE name=?", category_name)
-                    for url_found in urls:
-                        db.execute("INSERT INTO products (url, category_id) VALUES(?, ?)", url_found, row[0]["id"])
+                    self.writer.add_products(category_name, new)
+                    self.writer.flush() # products are in the database before CommentStarCrawler reads them
+                    self.frontier.flush()
                     print("Added products to database successfully")
                 except Exception as e:
-                    print("f{} occured while manipulating with URLs of products")
-                
-            self.__save_log_timeout(logs, log_file='log_timeout.json')
-            
-            # Dealing with Timeout Exception
-            while True:
-                logs = self.__load_log_timeout(log_file='log_timeout.json')
-                if logs: # if logs is not empty
-                    print('Running log file.')
-                    self.__run_logs(driver_options=options)
-                else:
-                    break
-
-
-            df['products'] = self.product_urls.values() # save products URLs
-            self.__save(df, filename='products_per_category.csv')
+                    print(f"{e} occured while manipulating with URLs of products")
+                    continue
+                # but every listed product is handed over, CommentStarCrawler skips those whose reviews are
+                # stored (and, when incremental, show no new ratings)
+                urls = [url for url in listed if url not in handed]
+                handed.update(urls)
+                print(f'{len(new)} new products, {len(urls)} handed over in "{category_name}".')
+                self.product_urls[category_name] = urls
+                handoff.write(category_name, urls)
+                if on_products is not None:
+                    on_products(category_name, urls)
+
+            # Categories given up on, kept for a later run
+            for (category_name, _), _ in scheduler.dead_letters:
+                self.writer.set_state('category', category_name, FAILED)
+            self.__save_log_timeout(dict(category for category, _ in scheduler.dead_letters), log_file='log_timeout.json')
+            scheduler.report()
+            done = True
 
             print('GETTING PRODUCTS, DONE!')
 
 
         except Exception as e:
             print(f'Exception "{e}" occurs during the products scraping process.')
+            crashed = is_crash(e)
             raise
         finally:
-            self.driver.quit() # closes the driver window
+            if executor is not None:
+                executor.shutdown(wait=True)
+            self.__release_driver(crashed=crashed) # gives the driver window back to the pool
+            self.writer.flush()
+            self.frontier.flush()
+            handoff.close(done=done)
 
 
 
@@ -441,39 +678,54 @@ class CommentStarCrawler():
         star that are both exist.
     """
     MAX_WAITING_TIME = 10
+    LOGIN_WAITING_TIME = 1 # seconds, deadline for the network to be idle before looking for the login button
+    SCROLL_WAITING_TIME = 10 # seconds, deadline for the reviews to appear while scrolling
 
-    def __init__(self, headless_option) -> None:
+    def __init__(self, headless_option, driver_pool=None, writer=None, load_stats=None, backend=None, frontier=None, snapshots=None,
+                 on_page=None, metrics=None, rate_controller=None) -> None:
         """
             Initializing CommentStarCrawler.
             Args:
                 headless_option (bool): True if you want the window to be hidden when the driver 
                 is running, otherwise the driver window will be opened.
+                driver_pool (DriverPool): Pool to borrow drivers from, a private one is created if None.
+                writer (CrawlWriter): Storage for the results, a private one is created if None.
+                load_stats (LoadStats): Per-page waiting times, a private one is created if None.
+                backend (HttpBackend): Fetches pages over plain HTTP first, Selenium is only used when it
+                fails. None to always use Selenium.
+                frontier (Frontier): Seen-set of items, a private one is created if None.
+                snapshots (SnapshotStore): Keeps the HTML of the pages loaded with Selenium, None to keep nothing.
+                on_page (function): Called with (url, comments, stars) for every page of reviews as soon
+                as it is extracted, None to only return them.
+                metrics (Metrics): Timings and counts of the crawl, a private one is created if None.
+                rate_controller (RateController): Paces the page loads per host, a private one is created if None.
         """
         self.headless_option = headless_option
-        self.comments = [] # a place for comments
-        self.stars = [] # a place for stars
+        self.driver_pool = driver_pool or DriverPool(size=1, headless_option=headless_option)
+        self.writer = writer or CrawlWriter()
+        self.load_stats = load_stats or LoadStats()
+        self.backend = backend
+        self.frontier = frontier or Frontier()
+        self.snapshots = snapshots
+        self.on_page = on_page
+        self.metrics = metrics or Metrics()
+        self.rate_controller = rate_controller or RateController(metrics=self.metrics)
+        self.driver = None
+        self.__waited = 0 # seconds spent waiting on the current page
+        self.__csv_file = None # comments_stars.csv, written page by page
+        self.__csv_writer = None
+        self.__csv_lock = threading.Lock() # workers write their pages to the same file
+        self.__local = threading.local() # holds the worker crawler of each thread
 
-    def __load_products_list_from_dataframe(self, filename):
-        """
-            Loading a list of products URLs from a dataframe.
-            Args:
-                filename (str): Name of a file.
-        """
-        path = os.path.join(os.getcwd(), 'url_files', filename)
-        df = pd.read_csv(path)
-        df['products_list'] = df['products'].apply(lambda x: ast.literal_eval(x)) # convert string representation of lists to list
-        return df
-    
-    def __scroll_down(self, n_times=10):
+    def __scroll_down(self):
         """
-            Scrolling down to the bottom of a page.
-            Args:
-                n_times (int): The number of times to scroll down.
+            Scrolling down only until COMMENTS_STARS_PER_PRODUCT reviews are loaded or the page ends,
+            at most SCROLL_WAITING_TIME seconds.
         """
-        for _ in range(n_times):
-            scroll_script = "window.scrollBy(0, 1000);"
-            self.driver.execute_script(scroll_script)
-            # time.sleep(0.1)
+        start = time.time()
+        scroll_until(self.driver, SECTIONS_XPATH, COMMENTS_STARS_PER_PRODUCT, timeout=CommentStarCrawler.SCROLL_WAITING_TIME)
+        self.__waited += time.time() - start
+        self.metrics.observe('wait', time.time() - start, 'product')
 
     def __find_login(self):
         """
@@ -487,44 +739,73 @@ class CommentStarCrawler():
         return login
 
 
-    def __load_page(self, url, driver_options):
+    def __load_page(self, url):
         """
             Loading a URL.
             Args:
                 url (str): The URL to be loaded.
-                driver_options (Option): Options for setting up the driver.
             Returns:
                 True if there is no login button, False otherwise
         """
-        self.driver = webdriver.Chrome(options=driver_options, executable_path=DRIVER_PATH) # initialize a driver
+        self.driver = self.driver_pool.acquire() # borrow a warm driver
         self.driver.set_page_load_timeout(CommentStarCrawler.MAX_WAITING_TIME) # timeout when loading a URL
+        self.__waited = 0
         try:
-            self.driver.get(url) # open the URL
-            time.sleep(1) # sleep for 1 second
+            with self.rate_controller.slot(url, report=False), self.metrics.timer('page_load', 'product'):
+                self.driver.get(url) # open the URL, reported once the login wall is ruled out
+            self.metrics.count('pages', 'product')
+            start = time.time()
+            wait_for_network_idle(self.driver, timeout=CommentStarCrawler.LOGIN_WAITING_TIME) # the login button is added by a script
+            self.__waited += time.time() - start
+            self.metrics.observe('wait', time.time() - start, 'product')
             login = self.__find_login()
             if login:
                 print('The URL needs to be logged in, skipping this URL.')
+                self.rate_controller.failure(url, 'login') # the site is telling us to slow down
                 return False
+            self.rate_controller.success(url)
         except selenium.common.exceptions.InvalidArgumentException:
             print(url)
             raise
             
         return True
 
+    def __release_driver(self, crashed=False):
+        """
+            Giving the driver back to the pool.
+            Args:
+                crashed (bool): True if the driver raised an unrecoverable error.
+        """
+        if self.driver is not None:
+            self.driver_pool.release(self.driver, crashed=crashed)
+            self.driver = None
+
     def __click_next_button(self):
         """
-            Clicking the next button.
+            Clicking the next button of the comment section and waiting for the next page of reviews,
+            the product page isn't reloaded.
+            Returns:
+                True if the next page is loaded, False if there is none or it didn't load.
         """
+        next_button_xpath = "//button[@class='shopee-icon-button shopee-icon-button--right ']"
+        next_buttons = self.driver.find_elements(by=By.XPATH, value=next_button_xpath)
+        if not next_buttons or not next_buttons[0].is_enabled():
+            return False # last page of reviews
         try:
-            next_button_xpath = "//button[@class='shopee-icon-button shopee-icon-button--right ']"
-            # Find the button
-            self.driver.execute_script("arguments[0].click();", WebDriverWait(self.driver, 20).until(EC.element_to_be_clickable((By.XPATH, next_button_xpath))))
-            # next_button = self.driver.find_element(by=By.XPATH, value=next_button_xpath)
-            # next_button.click()
+            first_review = extract_reviews(self.driver, limit=1)
+            self.driver.execute_script("arguments[0].click();", next_buttons[0])
+            # the list is replaced in place, wait until it shows other reviews
+            start = time.time()
+            WebDriverWait(self.driver, CommentStarCrawler.MAX_WAITING_TIME, poll_frequency=0.1).until(
+                lambda driver: extract_reviews(driver, limit=1) != first_review)
+            self.__waited += time.time() - start
+            self.metrics.observe('wait', time.time() - start, 'product')
+            self.metrics.count('pages', 'product')
+            return True
         except Exception as e:
             print(f'Exception "{e}" occurs while trying to click the next button.')
             # print('URL causes this Exception:', self.driver.current_url)
-            self.log_urls.append(self.driver.current_url) # add error URLs to log
+            return False
 
     def __has_comment_section(self):
         """
@@ -541,172 +822,276 @@ class CommentStarCrawler():
             # print('There are ratings in this page.')
             return True
 
-    def __is_comment_existed(self, section):
+    def __hand_over(self, url, comments, stars, skip):
         """
-            Check if there exists a comment or not
+            Handing a page of reviews to on_page, without the reviews stored by an earlier attempt.
             Args:
-                True if a comment exists, False otherwise.
+                url (str): URL of the product.
+                comments (list): Comments of the page.
+                stars (list): Stars of the page, one per comment.
+                skip (int): Number of reviews of the page already stored.
+            Returns:
+                comments (list): Comments handed over.
+                stars (list): Stars handed over.
         """
-        try:
-            section.find_element(by=By.CLASS_NAME, value="EXI9SU")
-            return True
-        except:
-            return False
+        comments, stars = comments[skip:], stars[skip:]
+        if comments and self.on_page is not None:
+            self.on_page(url, comments, stars)
+        return comments, stars
 
-    def __find_comments_stars(self):
-        """
-            Grabbing comments and stars.
+    def __find_comments_stars(self, url, stored=0, fingerprint=None, known=None):
         """
-        self.__scroll_down(n_times=20) # scrolling 20 times
+            Grabbing comments and stars of the loaded product, page by page until COMMENTS_STARS_PER_PRODUCT
+            reviews are read, the newest review stored by the last crawl is reached or there is no next page.
+            Args:
+                url (str): URL of the product.
+                stored (int): Number of reviews stored by an earlier attempt, they are read again but
+                not handed over.
+                fingerprint (str): Fingerprint of the newest review stored by the last crawl of the
+                product, None for a product never crawled.
+                known (set): Fingerprints of every review stored, for a product stored before the
+                watermarks, see _newer_reviews.
+            Returns:
+                comments (list): Comments of the product.
+                stars (list): Stars of the product, one per comment.
+                newest (str): Fingerprint of the newest review, None if there are no reviews.
+        """
+        self.__scroll_down() # scrolling until the reviews are loaded
+        page = 0
+        if self.snapshots is not None:
+            self.snapshots.save(f'{url}#page={page}', 'product', self.driver.page_source)
         if not self.__has_comment_section():
             print('There are no ratings in this page.')
-            self.driver.quit() # closes the driver window.
-            return # do nothing when there is no ratings.
-
-        sections_xpath = "//div[@class='shopee-product-comment-list']/div"
-        sections = self.driver.find_elements(by=By.XPATH, value=sections_xpath) # find sections
-        for section in sections:
-            count_stars = 0
-            if self.__is_comment_existed(section):
-                comment = section.find_element(by=By.CLASS_NAME, value="EXI9SU").text
-                self.comments.append(comment)
-                stars = section.find_element(by=By.CLASS_NAME, value="repeat-purchase-con").find_element(by=By.TAG_NAME, value='div').find_elements(by=By.TAG_NAME, value='svg')
-                for star in stars:
-                    if star.get_attribute('class') == 'shopee-svg-icon icon-rating-solid--active icon-rating-solid':
-                        count_stars += 1
-                self.stars.append(count_stars) # add stars to a list
-
-                if len(self.comments) == len(self.stars) and len(self.comments) > COMMENTS_STARS_PER_PRODUCT:
-                    break
+            return [], [], None # do nothing when there is no ratings.
+
+        comments = []
+        stars = []
+        newest = None
+        read = 0 # reviews read, including the stored ones
+        while read < COMMENTS_STARS_PER_PRODUCT:
+            # every review's text and stars of the page in one round trip
+            with self.metrics.timer('extraction', 'product'):
+                page_comments, page_stars = extract_reviews(self.driver, limit=COMMENTS_STARS_PER_PRODUCT - read)
+            if not page_comments:
+                break
+            if newest is None:
+                newest = review_fingerprint(page_comments[0], page_stars[0])
+            page_comments, page_stars, reached = _newer_reviews(page_comments, page_stars, fingerprint, known)
+            skip = max(0, stored - read)
+            read += len(page_comments)
+            page_comments, page_stars = self.__hand_over(url, page_comments, page_stars, skip)
+            comments.extend(page_comments)
+            stars.extend(page_stars)
+            if reached or read >= COMMENTS_STARS_PER_PRODUCT or not self.__click_next_button():
+                break
+            page += 1
+            if self.snapshots is not None:
+                self.snapshots.save(f'{url}#page={page}', 'product', self.driver.page_source)
         
         # Print to stdout
-        print('comments:', len(self.comments))
-        print('stars:', len(self.stars))
-
-        self.__click_next_button()
-        self.__scroll_down()
-        
+        print('comments:', len(comments))
+        print('stars:', len(stars))
+        return comments, stars, newest
 
-    def __save(self, filename):
+    def __crawl_product(self, url):
         """
-            Putting comments, stars to a dataframe and saving to data directory.
+            Loading a product page with a driver from the pool and grabbing its comments and stars.
             Args:
-                filename (str): Name of a file.
+                url (str): URL of a product.
+            Returns:
+                result (ProductReviews): Comments and stars of the product.
+        """
+        watermark = self.writer.watermark(url) # the reviews stored by the last crawl, None for a new product
+        fingerprint = watermark.fingerprint if watermark is not None else None
+        known = None
+        if watermark is not None and fingerprint is None and watermark.stored:
+            known = self.writer.stored_fingerprints(url) # stored before the watermarks, includes the pages of an attempt that timed out
+            stored = 0
+        else:
+            # pages handed over by an attempt that timed out, on top of the reviews of the last crawl
+            stored = self.writer.stored_reviews(url) - (watermark.stored if watermark is not None else 0)
+        if self.backend is not None:
+            reviews = self.backend.fetch_reviews(url, limit=COMMENTS_STARS_PER_PRODUCT)
+            if reviews is not None:
+                self.metrics.count('pages', 'product')
+                newest = review_fingerprint(reviews[0][0], reviews[1][0]) if reviews[0] else None
+                comments, stars, _ = _newer_reviews(*reviews, fingerprint, known)
+                comments, stars = self.__hand_over(url, comments, stars, skip=stored) # one request, the limit is a parameter of the API
+                return ProductReviews(url, 'done', comments, stars, newest)
+        crashed = False
+        try:
+            # Loading a url
+            succeeded = self.__load_page(url)
+            if not succeeded:
+                self.metrics.count('login_walls')
+                return ProductReviews(url, 'login', [], [], None)
+            comments, stars, newest = self.__find_comments_stars(url, stored=stored, fingerprint=fingerprint, known=known)
+            self.load_stats.record(url, self.__waited, fixed=1) # it used to sleep for 1 second
+            return ProductReviews(url, 'done', comments, stars, newest)
+        except selenium.common.exceptions.TimeoutException:
+            print('Timeout Exception occurs.')
+            self.metrics.count('timeouts', 'product')
+            return ProductReviews(url, 'timeout', [], [], None)
+        except Exception as e:
+            crashed = is_crash(e)
+            raise
+        finally:
+            self.__release_driver(crashed=crashed) # gives the driver window back.
+
+    def __worker(self):
         """
-        path = os.path.join(os.getcwd(), 'data', filename)
-        data = {'comments': self.comments, 'stars': self.stars}
-        df = pd.DataFrame(data)
-        df.to_csv(path, index=False)
+            Getting the worker crawler of the current thread, so every worker drives its own browser session.
+            Returns:
+                worker (CommentStarCrawler): The crawler owned by the current thread.
+        """
+        worker = getattr(self.__local, 'crawler', None)
+        if worker is None:
+            worker = CommentStarCrawler(self.headless_option, driver_pool=self.driver_pool, writer=self.writer, load_stats=self.load_stats,
+                                        backend=self.backend, frontier=self.frontier, snapshots=self.snapshots, on_page=self.__write_page,
+                                        metrics=self.metrics, rate_controller=self.rate_controller)
+            self.__local.crawler = worker
+        return worker
 
-    def __save_log_urls(self, urls, filename):
+    def __crawl_in_worker(self, url):
         """
-            Saving the log file containing failed URLs.
+            Crawling a product URL with the worker crawler of the current thread.
             Args:
-                urls (list): A list of failed URLs.
-                filename (str): Name of a file.
+                url (str): URL of a product.
+            Returns:
+                result (ProductReviews): Comments and stars of the product.
         """
-        path = os.path.join(os.getcwd(), 'logs', filename)
-        with open(path, 'w') as f:
-            f.write(' '.join(urls))
+        return self.__worker().__crawl_product(url)
 
-    def __load_log_urls(self, filename):
+    def __write_page(self, url, comments, stars):
         """
-            Loading the log file containing failed URLs.
+            Adding a page of comments and stars to the database and the CSV file as soon as a worker
+            extracted it.
             Args:
-                filename (str): Name of a file.
-            Returns:
-                urls (list): A list of failed URLs.
+                url (str): URL of the product.
+                comments (list): Comments of the page.
+                stars (list): Stars of the page, one per comment.
         """
-        path = os.path.join(os.getcwd(), 'logs', filename)
-        with open(path, 'r') as f:
-            urls = f.read().split()
-        return urls
-    
-    def __run_logs(self, driver_options):
+        self.metrics.count('items', 'review', len(comments))
+        # Add comment, star pairs to database
+        try:
+            self.writer.add_comments_stars(url, comments, stars, done=False)
+        except Exception as e:
+            print(f"{e} occurred while manipulating with comments and stars database")
+        self.__save(comments, stars)
+
+    def __write_product(self, result):
         """
-            Running the log file.
+            Marking a product done once all its pages were written. Only the thread running
+            get_stars_comments calls it.
             Args:
-                driver_options (Option): Options for setting up the driver.
+                result (ProductReviews): Comments and stars of the product.
         """
-        logs = self.__load_log_urls(filename='log_timeout.txt')
-        new_logs = [] # consists of failed URLs.
-        for url in logs:
-            try:
-                # Loading a url
-                succeeded = self.__load_page(url, driver_options=driver_options)
-                if not succeeded:
-                    self.driver.quit() # closes the driver window.
-                    continue
-            except selenium.common.exceptions.TimeoutException:
-                print('Timeout Exception occurs.')
-                new_logs.append(url)
-                self.driver.quit() # closes the driver window.
-                continue
+        try:
+            self.writer.add_comments_stars(result.url, [], [], fingerprint=result.fingerprint) # its pages were added by __write_page
+            self.frontier.add('review', product_key(result.url), stored=True) # written with the product by the writer
+            print("Added comment, star pairs to database succesfully")
+        except Exception as e:
+            print(f"{e} occurred while manipulating with comments and stars database")
 
-            self.__find_comments_stars() # update self.comments, self.stars
+    def __open_csv(self, filename, append=False):
+        """
+            Creating the CSV file in data directory, comments and stars are appended to it product by product.
+            Args:
+                filename (str): Name of a file.
+                append (bool): True to keep the rows of a previous run.
+        """
+        path = os.path.join(os.getcwd(), 'data', filename)
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.__csv_file = open(path, 'a' if append else 'w', newline='')
+        self.__csv_writer = csv.writer(self.__csv_file)
+        if not exists:
+            self.__csv_writer.writerow(['comments', 'stars'])
 
-            # Add comment, star pairs to database
-            try:
-                row = db.execute("SELECT * FROM products WHERE url=?", url)
-                for comment, star in zip(self.comments, self.stars):
-                    db.execute("INSERT INTO comments_stars (comment, stars, product_id) VALUES (?, ?, ?)", comment, star, row[0]["id"])
-                print("Added logs of comment, star pairs to database succesfully")
-            except Exception as e:
-                print(f"{e} occurred while running logs of comments and stars database")
+    def __save(self, comments, stars):
+        """
+            Appending a page of comments, stars to the CSV file.
+            Args:
+                comments (list): Comments of the page.
+                stars (list): Stars of the page, one per comment.
+        """
+        with self.__csv_lock:
+            self.__csv_writer.writerows(zip(comments, stars))
 
-        self.__save_log_urls(new_logs, filename='log_timeout.txt')
+    def __close_csv(self):
+        """
+            Closing the CSV file.
+        """
+        if self.__csv_file is not None:
+            self.__csv_file.close()
+            self.__csv_file = None
+            self.__csv_writer = None
 
+    def __save_log_urls(self, urls, filename):
+        """
+            Saving the log file containing failed URLs.
+            Args:
+                urls (list): URLs given up on.
+                filename (str): Name of a file.
+        """
+        path = os.path.join(os.getcwd(), 'logs', filename)
+        with open(path, 'w') as f:
+            f.write(' '.join(urls))
 
-    def get_stars_comments(self):
+    def get_stars_comments(self, workers=WORKERS, max_attempts=MAX_ATTEMPTS, resume=False, follow=False, urls=None, incremental=False):
         """
             Getting comments and stars.
+            Args:
+                workers (int): Number of product pages crawled at the same time. Each worker borrows
+                its own driver, so the driver pool should hold at least this many sessions.
+                max_attempts (int): Number of times a product is loaded before giving up on it.
+                resume (bool): True to skip the products done by a previous run and append to its CSV file.
+                follow (bool): True to keep reading url_files/products.csv until ProductCrawler has finished
+                writing it, so both crawlers can run at the same time.
+                urls (iterable): URLs of the products to crawl, read as they come. None to read them from
+                url_files/products.csv.
+                incremental (bool): True to crawl the products already stored again when their listing
+                shows new ratings, only their reviews newer than the stored ones are added. Products
+                done by this run show no new ratings anymore, so it resumes without resume.
         """
-        options = Options()
-        options.headless = self.headless_option # change that to True in production, the chrome driver will run implicitly and be less error-prone
-        options.add_argument("--window-size=1920,1200")
         print('CommentStarCrawler IS GETTING STARS AND COMMENTS')
-
-        df = self.__load_products_list_from_dataframe(filename='products_per_category.csv')
-        self.log_urls = []
-        for urls in df.loc[:, 'products_list']:
-            for url in urls:
-                try:
-                    # Loading a url
-                    succeeded = self.__load_page(url, driver_options=options)
-                    if not succeeded:
-                        self.driver.quit()
-                        continue
-                except selenium.common.exceptions.TimeoutException:
-                    print('Timeout Exception occurs.')
-                    self.log_urls.append(url)
-                    self.driver.quit()
-                    continue
-
-                self.__find_comments_stars() # update self.comments, self.stars
-
-                # Add comment, star pairs to database
-                try:
-                    row = db.execute("SELECT * FROM products WHERE url=?", url)
-                    for comment, star in zip(self.comments, self.stars):
-                        db.execute("INSERT INTO comments_stars (comment, stars, product_id) VALUES (?, ?, ?)", comment, star, row[0]["id"])
-                    print("Added comment, star pairs to database succesfully")
-                except Exception as e:
-                    print(f"{e} occurred while manipulating with comments and stars database")
-
-            # Handling timeout exception
-            self.__save_log_urls(self.log_urls, filename='log_timeout.txt')
-
-            while True:
-                self.log_urls = self.__load_log_urls(filename='log_timeout.txt')
-                if self.log_urls:
-                    print('Running log file.')
-                    self.__run_logs(driver_options=options)
+        executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        scheduler = RetryScheduler(max_attempts=max_attempts)
+        self.__open_csv(filename='comments_stars.csv', append=resume)
+        try:
+            # items whose reviews are already stored, by this run or a previous one, are skipped
+            if urls is None:
+                urls = (row.url for row in read_handoff(follow=follow))
+            if incremental:
+                urls = (url for url in urls if not self.frontier.seen('review', product_key(url)) or self.writer.reviews_changed(url))
+            else:
+                urls = (url for url in urls if not self.frontier.seen('review', product_key(url)))
+            if resume and not incremental: # a product done by a previous run may show new ratings
+                states = self.writer.states('product')
+                urls = (url for url in urls if states.get(url) != DONE)
+                print(f'Resuming, {sum(status == DONE for status in states.values())} products already done.')
+            urls = _in_flight(self.writer, 'product', urls)
+
+            # Handling timeout exception: products timing out are retried with backoff while the
+            # following products are being crawled
+            for _, result in run_with_retries(self.__crawl_in_worker, urls, scheduler, failed=lambda result: result.status == 'timeout',
+                                              executor=executor, window=2 * workers):
+                if result.status == 'done':
+                    self.__write_product(result)
                 else:
-                    break
-            
-            # break # For example, running with 1 category
+                    self.writer.set_state('product', result.url, FAILED) # needs to be logged in
+
+            # Products given up on, kept for a later run
+            for url, _ in scheduler.dead_letters:
+                self.writer.set_state('product', url, FAILED)
+            self.__save_log_urls([url for url, _ in scheduler.dead_letters], filename='log_timeout.txt')
+            scheduler.report()
 
-        # Saving data
-        self.__save(filename='comments_stars.csv')
-        print('CommentStarCrawler, DONE!')
-            
\ No newline at end of file
+            print('CommentStarCrawler, DONE!')
+        except Exception as e:
+            print(f'Exception "{e}" occurs while getting stars and comments.')
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True)
+            self.__close_csv()
+            self.writer.flush()
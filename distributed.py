@@ -0,0 +1,235 @@
+"""
+    Crawling with several workers, on one machine or several, sharing a queue of category and product
+    tasks (work_queue.py). The coordinator seeds the queue with the categories, every worker leases tasks,
+    crawls them in a directory of its own and writes the results to its own SQLite shard, and
+    merge_shards() adds the shards to data.db without duplicates.
+"""
+import glob
+import json
+import os
+import sqlite3
+import time
+from itertools import groupby
+
+from crawlers import PRODUCT_WORKERS, WORKERS
+from parsers import product_key, review_fingerprint
+from retry import MAX_ATTEMPTS
+from storage import DONE
+from work_queue import VISIBILITY_TIMEOUT
+
+
+# Hyperparameters
+WORKERS_DIR = 'workers' # a directory per worker, holding its shard (data.db), url_files, data and logs
+POLL_INTERVAL = 5 # seconds between two checks of the queue while the other workers hold the last tasks
+
+
+def worker_directory(worker_id, root=WORKERS_DIR):
+    """
+        Creating the directory of a worker.
+        Args:
+            worker_id (str): Id of the worker, unique across machines.
+            root (str): Directory of the workers.
+        Returns:
+            directory (str): Directory of the worker, the crawlers write their files under it.
+    """
+    directory = os.path.join(root, worker_id)
+    for subdirectory in ('url_files', 'data', 'logs'):
+        os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+    return directory
+
+
+def seed_categories(queue, filename='categories_urls.json'):
+    """
+        Adding a task for every category found by CategoryCrawler.
+        Args:
+            queue (WorkQueue): The work queue.
+            filename (str): Name of the file of categories in url_files.
+        Returns:
+            added (int): Number of new tasks.
+    """
+    with open(os.path.join(os.getcwd(), 'url_files', filename)) as f:
+        categories = json.load(f)
+    added = queue.put('category', [(name, {'name': name, 'url': url}) for name, url in categories.items()])
+    queue.mark_seeded() # the workers stop once the queue is empty from now on
+    print(f'Coordinator: {added} of {len(categories)} categories added to the work queue.')
+    return added
+
+
+def wait_for_workers(queue, interval=POLL_INTERVAL):
+    """
+        Waiting until every task is done or given up on, printing the progress.
+        Args:
+            queue (WorkQueue): The work queue.
+            interval (float): Seconds between two checks.
+    """
+    while queue.remaining():
+        queue.report()
+        time.sleep(interval)
+    queue.report()
+
+
+class CrawlWorker():
+    """
+        Leasing tasks from the work queue and crawling them with ProductCrawler and CommentStarCrawler,
+        which write to the shard of the worker. Product tasks come first, so the queue doesn't grow while
+        categories are still waiting. A task is completed once its results are committed to the shard,
+        products found in a category are put in the queue for any worker to crawl.
+    """
+    def __init__(self, queue, worker_id, product_crawler, comment_crawler, visibility_timeout=VISIBILITY_TIMEOUT) -> None:
+        """
+            Initializing CrawlWorker.
+            Args:
+                queue (WorkQueue): The work queue.
+                worker_id (str): Id of the worker, unique across machines.
+                product_crawler (ProductCrawler): Crawls the category tasks.
+                comment_crawler (CommentStarCrawler): Crawls the product tasks, sharing the writer (the shard)
+                of product_crawler.
+                visibility_timeout (float): Seconds a leased task is hidden from the other workers, longer
+                than crawling a lease of tasks.
+        """
+        self.queue = queue
+        self.worker_id = worker_id
+        self.product_crawler = product_crawler
+        self.comment_crawler = comment_crawler
+        self.writer = product_crawler.writer
+        self.visibility_timeout = visibility_timeout
+        self.__category_urls = {} # category name -> URL, of the category tasks leased
+        self.tasks = 0 # tasks completed
+
+    def __finish(self, tasks, stage):
+        """
+            Completing the tasks whose results are committed to the shard, giving the others back.
+            Args:
+                tasks (list): The leased tasks.
+                stage (str): 'category' or 'product', the stage of their crawl state.
+        """
+        states = self.writer.states(stage) # flushes first
+        done = [task for task in tasks if states.get(task.key if stage == 'category' else task.payload['url']) == DONE]
+        failed = [task for task in tasks if task not in done]
+        self.queue.complete(done)
+        self.queue.fail(failed)
+        self.tasks += len(done)
+
+    def __queue_products(self, category_name, urls):
+        """
+            Putting the products of a category in the work queue, every product listed: the ones already
+            in the shard may have no reviews yet, the queue ignores the ones it already holds.
+            Args:
+                category_name (str): Name of the category.
+                urls (list): URLs of its products.
+        """
+        category = {'category_name': category_name, 'category_url': self.__category_urls[category_name]}
+        added = self.queue.put('product', [(product_key(url), dict(category, url=url)) for url in urls])
+        print(f'{self.worker_id}: {added} products of "{category_name}" added to the work queue.')
+
+    def __crawl_categories(self, tasks, product_workers, max_attempts):
+        """
+            Crawling category tasks. Categories already done in the shard (a lease that ran out after the
+            crawl) are not crawled again, their products are put in the queue again.
+        """
+        categories = [(task.payload['name'], task.payload['url']) for task in tasks]
+        for category_name, url in categories:
+            self.__category_urls[category_name] = url
+            self.writer.add_category(category_name, url)
+        self.product_crawler.get_products(max_attempts=max_attempts, resume=True, workers=product_workers, categories=categories,
+                                          on_products=self.__queue_products)
+        self.__finish(tasks, 'category')
+
+    def __crawl_products(self, tasks, workers, max_attempts):
+        """
+            Crawling product tasks. Their categories and products are added to the shard first, they may
+            have been found by another worker.
+        """
+        for task in tasks:
+            if self.writer.category_id(task.payload['category_name']) is None:
+                self.writer.add_category(task.payload['category_name'], task.payload['category_url'])
+            if self.writer.product_id(task.payload['url']) is None:
+                self.writer.add_products(task.payload['category_name'], [task.payload['url']], done=False)
+        self.comment_crawler.get_stars_comments(workers=workers, max_attempts=max_attempts, resume=True,
+                                                urls=[task.payload['url'] for task in tasks])
+        self.__finish(tasks, 'product')
+
+    def run(self, product_workers=PRODUCT_WORKERS, workers=WORKERS, max_attempts=MAX_ATTEMPTS):
+        """
+            Crawling tasks until every task of the queue is done or given up on. A worker started before
+            the coordinator waits for it to seed the queue.
+            Args:
+                product_workers (int): Number of categories leased and crawled at the same time.
+                workers (int): Number of products crawled at the same time, twice as many are leased.
+                max_attempts (int): Number of times a page is loaded before giving the task back.
+        """
+        print(f'{self.worker_id} IS LEASING TASKS')
+        while True:
+            tasks = self.queue.lease('product', self.worker_id, limit=2 * workers, timeout=self.visibility_timeout)
+            if tasks:
+                self.__crawl_products(tasks, workers, max_attempts)
+                continue
+            tasks = self.queue.lease('category', self.worker_id, limit=product_workers, timeout=self.visibility_timeout)
+            if tasks:
+                self.__crawl_categories(tasks, product_workers, max_attempts)
+                continue
+            if self.queue.seeded() and not self.queue.remaining():
+                break
+            # the categories aren't in the queue yet, or the last tasks are leased by other workers and come
+            # back if a lease runs out
+            time.sleep(POLL_INTERVAL)
+        print(f'{self.worker_id}, DONE! {self.tasks} tasks completed.')
+
+
+def find_shards(root=WORKERS_DIR):
+    """
+        Listing the shards of the workers of this machine.
+        Args:
+            root (str): Directory of the workers.
+        Returns:
+            paths (list): Paths of the shards.
+    """
+    return sorted(glob.glob(os.path.join(root, '*', 'data.db')))
+
+
+def merge_shards(paths, writer, frontier):
+    """
+        Adding the categories, products and reviews of worker shards to the database. Categories are
+        updated, products already in the database are skipped, and reviews are only added to products
+        without reviews, so a product crawled by two workers (a lease that ran out) is stored once. Only the
+        reviews of products done in a shard are merged, shards can be merged again later.
+        Args:
+            paths (list): Paths of the shards.
+            writer (CrawlWriter): Storage of the merged results.
+            frontier (Frontier): Seen-set of items of the database.
+        Returns:
+            counts (dict): Number of categories, products and products with reviews added.
+    """
+    counts = {'categories': 0, 'products': 0, 'reviews': 0}
+    for path in paths:
+        shard = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True)
+        try:
+            for name, url in shard.execute("SELECT name, url FROM categories ORDER BY id"):
+                counts['categories'] += writer.category_id(name) is None
+                writer.add_category(name, url)
+            states = dict(shard.execute("SELECT item, status FROM crawl_state WHERE stage = 'category'"))
+            rows = shard.execute("SELECT categories.name, products.url FROM products JOIN categories ON categories.id = products.category_id "
+                                 "ORDER BY categories.name, products.id")
+            for category_name, group in groupby(rows, key=lambda row: row[0]):
+                urls = [url for _, url in group if frontier.add('product', product_key(url))]
+                writer.add_products(category_name, urls, done=states.get(category_name) == DONE) # not done when the shard only crawled its products
+                counts['products'] += len(urls)
+            writer.flush() # products are in the database before their reviews
+            rows = shard.execute("SELECT products.url, comments_stars.comment, comments_stars.stars FROM comments_stars "
+                                 "JOIN products ON products.id = comments_stars.product_id "
+                                 "JOIN crawl_state ON crawl_state.stage = 'product' AND crawl_state.item = products.url AND crawl_state.status = ? "
+                                 "ORDER BY products.id, comments_stars.id", (DONE, ))
+            for url, group in groupby(rows, key=lambda row: row[0]):
+                if not frontier.add('review', product_key(url), stored=True): # written by the writer with the reviews
+                    continue # merged from another shard
+                group = list(group)
+                writer.add_comments_stars(url, [comment for _, comment, _ in group], [stars for _, _, stars in group],
+                                          fingerprint=review_fingerprint(*group[0][1:])) # inserted newest first
+                counts['reviews'] += 1
+            writer.flush()
+            frontier.flush()
+        finally:
+            shard.close()
+        print(f'Merged {path}.')
+    print('Merged {} shards: {categories} categories, {products} products, {reviews} products with reviews added.'.format(len(paths), **counts))
+    return counts
@@ -0,0 +1,205 @@
+import threading
+import time
+
+import selenium.common.exceptions # WebDriverException and TimeoutException, without loading the webdriver
+from lazy_imports import lazy_import
+webdriver = lazy_import('selenium.webdriver') # used to open chromedriver, imported by the first session
+
+from browser_profile import BrowserProfile # blocks resources the crawlers never read
+from metrics import Metrics # time spent starting Chrome
+
+
+# Hyperparameters
+POOL_SIZE = 1 # number of warm Chrome sessions kept open
+MAX_PAGES_PER_DRIVER = 50 # a session is recycled after loading this many pages
+DRIVER_PATH = './chromedriver' # for using local chromedriver
+
+
+class DriverPool():
+    """
+        Keeping a fixed number of warm Chrome sessions that the crawlers borrow and give back,
+        instead of starting a new browser for every URL.
+    """
+    def __init__(self, size=POOL_SIZE, headless_option=True, max_pages_per_driver=MAX_PAGES_PER_DRIVER,
+                 driver_path=DRIVER_PATH, profile=None, metrics=None) -> None:
+        """
+            Initializing DriverPool. Sessions are started lazily, call warm() to start them up front.
+            Args:
+                size (int): Maximum number of Chrome sessions alive at the same time.
+                headless_option (bool): True if you want to implicitly run chromedriver, otherwise the
+                chromedriver's GUI is displayed.
+                max_pages_per_driver (int): Number of pages a session loads before it is recycled.
+                driver_path (str): Path to the local chromedriver.
+                profile (BrowserProfile): Options and resource blocking of every session, the default
+                lean profile if None.
+                metrics (Metrics): Timings of the crawl, a private one is created if None.
+        """
+        self.size = size
+        self.headless_option = headless_option
+        self.max_pages_per_driver = max_pages_per_driver
+        self.driver_path = driver_path
+        self.profile = profile or BrowserProfile()
+        self.metrics = metrics or Metrics()
+        self.__idle = [] # idle drivers, the most recently used one (the last) is reused first
+        self.__condition = threading.Condition() # guards idle and created, wakes a borrower when a driver or a slot is freed
+        self.__created = 0 # number of alive drivers (idle + borrowed)
+        self.__pages = {} # id(driver) -> pages loaded by the current session
+        self.pages_per_driver = [] # pages loaded by every retired session
+        self.started = 0 # number of sessions started
+        self.recycled = 0 # number of sessions recycled after reaching max_pages_per_driver
+        self.crashed = 0 # number of sessions recycled after a crash
+        self.start_time = 0.0 # seconds spent starting Chrome
+
+    def __start_driver(self):
+        """
+            Starting a new Chrome session.
+            Returns:
+                driver (WebDriver): A new driver instance.
+        """
+        start = time.time()
+        driver = webdriver.Chrome(options=self.profile.options(self.headless_option), executable_path=self.driver_path) # initialize a driver controlling Chrome
+        # driver = webdriver.Chrome(options=self.profile.options(self.headless_option), service=Service(ChromeDriverManager().install()))
+        try:
+            self.profile.apply(driver)
+        except Exception:
+            driver.quit()
+            raise
+        self.start_time += time.time() - start
+        self.metrics.observe('driver_start', time.time() - start)
+        self.started += 1
+        self.__pages[id(driver)] = 0
+        return driver
+
+    def __retire(self, driver):
+        """
+            Quitting a driver and keeping its number of pages for the report.
+            Args:
+                driver (WebDriver): The driver to be closed.
+        """
+        self.pages_per_driver.append(self.__pages.pop(id(driver), 0))
+        try:
+            driver.quit() # closes the driver window
+        except Exception as e:
+            print(f'Exception "{e}" occurs while quitting a driver.')
+
+    def __reset(self, driver):
+        """
+            Clearing cookies and storage so the next borrower starts from a clean session.
+            Args:
+                driver (WebDriver): The driver to be reset.
+            Returns:
+                True if the session could be reset, False otherwise.
+        """
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            driver.get('about:blank') # leaves the page, frees its memory
+            return True
+        except selenium.common.exceptions.WebDriverException:
+            return False
+
+    def warm(self):
+        """
+            Starting all sessions of the pool up front.
+        """
+        drivers = [self.acquire() for _ in range(self.size)]
+        with self.__condition:
+            self.__idle.extend(drivers) # freshly started sessions don't need a reset
+            self.__condition.notify_all()
+
+    def acquire(self):
+        """
+            Borrowing a driver, blocks until one is given back or a slot is freed (a session crashed or
+            was recycled) when all sessions are in use.
+            Returns:
+                driver (WebDriver): A warm driver instance.
+        """
+        with self.__condition:
+            while not self.__idle and self.__created >= self.size:
+                self.__condition.wait() # woken by release() and __discard()
+            if self.__idle:
+                return self.__idle.pop()
+            self.__created += 1
+        try:
+            return self.__start_driver()
+        except Exception:
+            with self.__condition:
+                self.__created -= 1
+                self.__condition.notify() # the slot is free again
+            raise
+
+    def release(self, driver, crashed=False):
+        """
+            Giving a driver back to the pool. The session is recycled when it crashed or when it
+            has loaded max_pages_per_driver pages.
+            Args:
+                driver (WebDriver): The borrowed driver.
+                crashed (bool): True if the driver raised an unrecoverable error.
+        """
+        self.__pages[id(driver)] = self.__pages.get(id(driver), 0) + 1
+        if crashed or not self.__reset(driver):
+            self.crashed += 1
+            self.__discard(driver)
+        elif self.__pages[id(driver)] >= self.max_pages_per_driver:
+            self.recycled += 1
+            self.__discard(driver)
+        else:
+            with self.__condition:
+                self.__idle.append(driver)
+                self.__condition.notify()
+
+    def __discard(self, driver):
+        """
+            Quitting a driver and freeing its slot in the pool.
+            Args:
+                driver (WebDriver): The driver to be closed.
+        """
+        self.__retire(driver)
+        with self.__condition:
+            self.__created -= 1
+            self.__condition.notify() # a waiting borrower can start a new session
+
+    def close(self):
+        """
+            Quitting all idle drivers.
+        """
+        with self.__condition:
+            drivers, self.__idle = self.__idle, []
+        for driver in drivers:
+            self.__discard(driver)
+
+    def stats(self):
+        """
+            Collecting statistics of the pool.
+            Returns:
+                stats (dict): Sessions started, recycled and crashed, pages per driver.
+        """
+        pages = self.pages_per_driver + list(self.__pages.values())
+        return {
+            'started': self.started,
+            'recycled': self.recycled,
+            'crashed': self.crashed,
+            'pages': sum(pages),
+            'pages_per_driver': sum(pages) / len(pages) if pages else 0,
+            'start_time': self.start_time,
+        }
+
+    def report(self):
+        """
+            Printing statistics of the pool to stdout.
+        """
+        stats = self.stats()
+        print('DriverPool: {} sessions started, {} recycled, {} crashed, {} pages, {:.1f} pages per driver, {:.1f} seconds starting Chrome'.format(
+            stats['started'], stats['recycled'], stats['crashed'], stats['pages'], stats['pages_per_driver'], stats['start_time']))
+
+
+def is_crash(exception):
+    """
+        Checking whether an exception means the driver session is broken.
+        Args:
+            exception (Exception): The exception raised while using a driver.
+        Returns:
+            True if the session should be recycled, False otherwise (e.g. a page load timeout).
+    """
+    return isinstance(exception, selenium.common.exceptions.WebDriverException) \
+        and not isinstance(exception, selenium.common.exceptions.TimeoutException)
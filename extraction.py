@@ -0,0 +1,120 @@
+import json # decodes the payload returned by the injected scripts
+
+from lazy_imports import lazy_import
+By = lazy_import('selenium.webdriver.common.by', 'By') # used by the element-by-element path
+
+
+# XPaths shared by the injected scripts and the element-by-element path
+PRODUCTS_XPATH = "//div[@class='row shopee-search-item-result__items']/div/a"
+SECTIONS_XPATH = "//div[@class='shopee-product-comment-list']/div"
+COMMENT_CLASS = 'EXI9SU'
+STARS_CLASS = 'repeat-purchase-con'
+ACTIVE_STAR_CLASS = 'shopee-svg-icon icon-rating-solid--active icon-rating-solid'
+
+# Runs in the page, returns the text and stars of every review as one JSON string.
+# arguments: sections XPath, comment class, stars class, active star class, limit (null for all)
+REVIEWS_SCRIPT = """
+const [sectionsXpath, commentClass, starsClass, activeStarClass, limit] = arguments;
+const sections = document.evaluate(sectionsXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const reviews = [];
+for (let i = 0; i < sections.snapshotLength; i++) {
+    if (limit !== null && reviews.length >= limit) break;
+    const section = sections.snapshotItem(i);
+    const comment = section.getElementsByClassName(commentClass)[0];
+    const starsContainer = section.getElementsByClassName(starsClass)[0];
+    const starsDiv = starsContainer && starsContainer.getElementsByTagName('div')[0];
+    if (!comment || !starsDiv) continue; // only take reviews having both a comment and stars
+    let stars = 0;
+    for (const svg of starsDiv.getElementsByTagName('svg')) {
+        if (svg.getAttribute('class') === activeStarClass) stars++;
+    }
+    reviews.push([comment.innerText, stars]);
+}
+return JSON.stringify(reviews);
+"""
+
+# Runs in the page, returns the href of every product link as one JSON string.
+# arguments: products XPath, limit (null for all)
+PRODUCTS_SCRIPT = """
+const [productsXpath, limit] = arguments;
+const links = document.evaluate(productsXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const urls = [];
+for (let i = 0; i < links.snapshotLength && (limit === null || urls.length < limit); i++) {
+    urls.push(links.snapshotItem(i).href);
+}
+return JSON.stringify(urls);
+"""
+
+
+def extract_reviews(driver, limit=None):
+    """
+        Grabbing comments and stars of the loaded product page in a single WebDriver round trip.
+        Args:
+            driver (WebDriver): Driver with a product page loaded.
+            limit (int): Maximum number of reviews, None for all of them.
+        Returns:
+            comments (list): Comments of the product.
+            stars (list): Stars of the product, one per comment.
+    """
+    payload = driver.execute_script(REVIEWS_SCRIPT, SECTIONS_XPATH, COMMENT_CLASS, STARS_CLASS, ACTIVE_STAR_CLASS, limit)
+    reviews = json.loads(payload)
+    return [comment for comment, _ in reviews], [stars for _, stars in reviews]
+
+
+def extract_product_urls(driver, limit=None):
+    """
+        Grabbing URLs of products of the loaded search page in a single WebDriver round trip.
+        Args:
+            driver (WebDriver): Driver with a category (search result) page loaded.
+            limit (int): Maximum number of URLs, None for all of them.
+        Returns:
+            urls (list): URLs of products.
+    """
+    return json.loads(driver.execute_script(PRODUCTS_SCRIPT, PRODUCTS_XPATH, limit))
+
+
+def extract_reviews_by_elements(driver, limit=None):
+    """
+        Grabbing comments and stars element by element, one WebDriver round trip per element and
+        attribute. Kept as the reference for the benchmark.
+        Args:
+            driver (WebDriver): Driver with a product page loaded.
+            limit (int): Maximum number of reviews, None for all of them.
+        Returns:
+            comments (list): Comments of the product.
+            stars (list): Stars of the product, one per comment.
+    """
+    comments = []
+    stars = []
+    sections = driver.find_elements(by=By.XPATH, value=SECTIONS_XPATH) # find sections
+    for section in sections:
+        if limit is not None and len(comments) >= limit:
+            break
+        if not section.find_elements(by=By.CLASS_NAME, value=COMMENT_CLASS):
+            continue
+        comment = section.find_element(by=By.CLASS_NAME, value=COMMENT_CLASS).text
+        svgs = section.find_element(by=By.CLASS_NAME, value=STARS_CLASS).find_element(by=By.TAG_NAME, value='div').find_elements(by=By.TAG_NAME, value='svg')
+        count_stars = 0
+        for star in svgs:
+            if star.get_attribute('class') == ACTIVE_STAR_CLASS:
+                count_stars += 1
+        comments.append(comment)
+        stars.append(count_stars)
+    return comments, stars
+
+
+def extract_product_urls_by_elements(driver, limit=None):
+    """
+        Grabbing URLs of products element by element. Kept as the reference for the benchmark.
+        Args:
+            driver (WebDriver): Driver with a category (search result) page loaded.
+            limit (int): Maximum number of URLs, None for all of them.
+        Returns:
+            urls (list): URLs of products.
+    """
+    urls = []
+    for product in driver.find_elements(by=By.XPATH, value=PRODUCTS_XPATH):
+        if limit is not None and len(urls) >= limit:
+            break
+        urls.append(product.get_attribute('href'))
+    return urls
@@ -0,0 +1,117 @@
+"""
+    Local stand-in for Shopee serving recorded fixtures, so the HTTP backend can be run offline.
+
+    Usage: python -m fixtures.server --port 8000
+    then:  python main.py --product --backend http --base-url http://127.0.0.1:8000/
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+        Answering the JSON endpoints used by HttpBackend from the recorded files:
+            /api/v4/pages/get_category_tree -> category_tree.json
+            /api/v4/search/search_items?match_id=X&newest=N&limit=L -> search_items/X.json, items[N:N+L]
+            /api/v2/item/get_ratings?itemid=X&offset=N&limit=L -> ratings/X.json, ratings[N:N+L]
+        Any other path is answered with pages/<path>.html if it exists.
+    """
+    protocol_version = 'HTTP/1.1' # keep-alive, like the real site
+    recorded_dir = RECORDED_DIR
+
+    def __load(self, *parts):
+        """
+            Loading a recorded JSON file.
+            Args:
+                parts (str): Path of the file inside the recorded directory.
+            Returns:
+                payload (dict): The recorded payload, None if there is no such file.
+        """
+        path = os.path.join(self.recorded_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def __send(self, status, body, content_type):
+        """
+            Sending a response, gzip-compressed when the client accepts it.
+            Args:
+                status (int): Status code.
+                body (bytes): Body of the response.
+                content_type (str): Content type of the body.
+        """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        offset = int(query.get('newest', query.get('offset', 0)))
+        limit = int(query.get('limit', 100))
+
+        payload = None
+        if parts.path == '/api/v4/pages/get_category_tree':
+            payload = self.__load('category_tree.json')
+        elif parts.path == '/api/v4/search/search_items':
+            payload = self.__load('search_items', f"{query.get('match_id')}.json")
+            if payload is not None:
+                payload['items'] = payload['items'][offset:offset + limit]
+        elif parts.path == '/api/v2/item/get_ratings':
+            payload = self.__load('ratings', f"{query.get('itemid')}.json")
+            if payload is not None:
+                payload['data']['ratings'] = payload['data']['ratings'][offset:offset + limit]
+        else:
+            page = os.path.join(self.recorded_dir, 'pages', unquote(parts.path).strip('/') + '.html')
+            if os.path.exists(page):
+                with open(page, 'rb') as f:
+                    return self.__send(200, f.read(), 'text/html; charset=utf-8')
+
+        if payload is None:
+            return self.__send(404, b'{"error": 404}', 'application/json')
+        self.__send(200, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def log_message(self, format, *args):
+        pass # keep the crawler output readable
+
+
+def start_server(port=0, recorded_dir=RECORDED_DIR):
+    """
+        Starting the fixture server in a background thread.
+        Args:
+            port (int): Port to listen on, 0 for any free port.
+            recorded_dir (str): Directory of the recorded fixtures.
+        Returns:
+            server (ThreadingHTTPServer): The running server, its base URL is http://127.0.0.1:<server.server_port>/
+    """
+    handler = type('Handler', (FixtureHandler, ), {'recorded_dir': recorded_dir})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--recorded-dir', default=RECORDED_DIR)
+    args = parser.parse_args()
+    server = start_server(args.port, args.recorded_dir)
+    print('Serving fixtures on http://127.0.0.1:{}/'.format(server.server_port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,198 @@
+"""
+    Canonical product keys and the seen-set that keeps the crawlers from inserting or loading the same
+    item twice, across categories and runs.
+"""
+import hashlib # hashes of the Bloom filter
+import math
+import sqlite3
+import threading
+
+from migrations import migrate
+from parsers import canonical_product_url, product_key # the crawlers import them from here
+from storage import DATABASE_PATH
+
+
+# Hyperparameters
+CAPACITY = 1000000 # keys per stage the Bloom filter is sized for
+ERROR_RATE = 0.01 # false positive rate of the Bloom filter at capacity, false positives are checked on disk
+BATCH_SIZE = 500 # new keys buffered before they are written to the index
+
+
+class BloomFilter():
+    """
+        Fixed-size set of keys answering "definitely not seen" or "maybe seen".
+    """
+    def __init__(self, capacity=CAPACITY, error_rate=ERROR_RATE) -> None:
+        """
+            Initializing BloomFilter.
+            Args:
+                capacity (int): Number of keys the filter is sized for.
+                error_rate (float): False positive rate at capacity.
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2)) # bits
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.__bits = bytearray((self.size + 7) // 8)
+
+    def __positions(self, key):
+        """
+            Computing the bits of a key with double hashing.
+            Args:
+                key (str): The key.
+            Returns:
+                positions (iterator): hash_count bit positions.
+        """
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        """
+            Adding a key.
+            Args:
+                key (str): The key.
+        """
+        for position in self.__positions(key):
+            self.__bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.__bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+
+class Frontier():
+    """
+        Seen-set of product keys per stage: 'product' for items inserted by ProductCrawler, 'review' for
+        items whose reviews were stored by CommentStarCrawler. A Bloom filter per stage answers most
+        lookups in memory, the frontier table of the database is the exact index behind it. The 'review'
+        keys are written to it by CrawlWriter, in the transaction marking the product done.
+        Thread-safe, the product and comment stages of a pipelined crawl share it. The index is opened and
+        the filters loaded on the first lookup.
+    """
+    def __init__(self, path=DATABASE_PATH, capacity=CAPACITY, error_rate=ERROR_RATE, batch_size=BATCH_SIZE) -> None:
+        """
+            Initializing Frontier, the index isn't opened yet.
+            Args:
+                path (str): Path to the SQLite database.
+                capacity (int): Keys per stage the Bloom filters are sized for.
+                error_rate (float): False positive rate of the Bloom filters.
+                batch_size (int): New keys buffered before they are written to the index.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.batch_size = batch_size
+        self.path = path
+        self.__connection = None
+        self.__filters = {} # stage -> BloomFilter
+        self.__pending = set() # (stage, key) not written to the index yet
+        self.__stored = set() # (stage, key) written to the index by the CrawlWriter, maybe not yet
+        self.__lock = threading.RLock() # add() flushes while holding it
+        self.duplicates = 0 # keys added twice
+        self.index_lookups = 0 # lookups the Bloom filters couldn't answer
+
+    def __open(self):
+        """
+            Opening the index and loading the Bloom filters from it, the first time it is used.
+            Returns:
+                connection (sqlite3.Connection): Connection to the database.
+        """
+        with self.__lock:
+            if self.__connection is None:
+                connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False) # transactions are opened explicitly
+                connection.execute("PRAGMA journal_mode=WAL")
+                migrate(connection) # the frontier table, seeded from the products and reviews already stored
+                for stage, key in connection.execute("SELECT stage, key FROM frontier"):
+                    self.__filter(stage).add(key)
+                self.__connection = connection
+            return self.__connection
+
+    @property
+    def connection(self):
+        """
+            Connection to the database, opened on first use.
+        """
+        return self.__connection or self.__open()
+
+    def __filter(self, stage):
+        """
+            Getting the Bloom filter of a stage.
+            Args:
+                stage (str): 'product' or 'review'.
+            Returns:
+                bloom (BloomFilter): The filter of the stage.
+        """
+        if stage not in self.__filters:
+            self.__filters[stage] = BloomFilter(self.capacity, self.error_rate)
+        return self.__filters[stage]
+
+    def seen(self, stage, key):
+        """
+            Checking whether a key was added.
+            Args:
+                stage (str): 'product' or 'review'.
+                key (str): Key of the item, see product_key.
+            Returns:
+                True if the key was added by this run or a previous one.
+        """
+        with self.__lock:
+            self.__open()
+            if key not in self.__filter(stage):
+                return False # definitely new, no disk access
+            if (stage, key) in self.__pending or (stage, key) in self.__stored:
+                return True
+            self.index_lookups += 1
+            return self.connection.execute("SELECT 1 FROM frontier WHERE stage = ? AND key = ?", (stage, key)).fetchone() is not None
+
+    def add(self, stage, key, stored=False):
+        """
+            Adding a key unless it was already added.
+            Args:
+                stage (str): 'product' or 'review'.
+                key (str): Key of the item, see product_key.
+                stored (bool): True if the CrawlWriter writes the key to the index, in the transaction
+                of the item (CrawlWriter.add_comments_stars for 'review'). It is only kept in memory
+                here, written on its own a crash could leave it committed without the item.
+            Returns:
+                True if the key is new, False if it was seen before.
+        """
+        with self.__lock:
+            if self.seen(stage, key):
+                self.duplicates += 1
+                return False
+            self.__filter(stage).add(key)
+            if stored:
+                self.__stored.add((stage, key))
+                return True
+            self.__pending.add((stage, key))
+            if len(self.__pending) >= self.batch_size:
+                self.flush()
+            return True
+
+    def flush(self):
+        """
+            Writing the new keys to the index in one transaction.
+        """
+        with self.__lock:
+            if not self.__pending:
+                return
+            self.connection.execute("BEGIN")
+            try:
+                self.connection.executemany("INSERT OR IGNORE INTO frontier (stage, key) VALUES (?, ?)", self.__pending)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.__pending = set()
+
+    def report(self):
+        """
+            Printing the number of duplicates skipped to stdout.
+        """
+        print('Frontier: {} duplicate items skipped, {} lookups on disk'.format(self.duplicates, self.index_lookups))
+
+    def close(self):
+        """
+            Flushing the new keys and closing the connection, if the index was opened.
+        """
+        self.flush()
+        if self.__connection is not None:
+            self.__connection.close()
@@ -0,0 +1,109 @@
+"""
+    Line-delimited hand-off of product URLs from ProductCrawler to CommentStarCrawler. The file has one
+    row per (category, product) and is written category by category, so CommentStarCrawler can read it
+    as a stream, even while ProductCrawler is still writing it.
+"""
+import csv # one row per line, appended and read without loading the whole file
+import os
+import time
+from collections import namedtuple
+
+from frontier import canonical_product_url
+from parsers import item_ids
+
+
+# Hyperparameters
+HANDOFF_PATH = os.path.join('url_files', 'products.csv')
+POLL_INTERVAL = 1 # seconds between two reads of a file that is still being written
+
+COLUMNS = ['category_name', 'shop_id', 'item_id', 'url']
+# A row of the hand-off file, shop_id and item_id are None when the URL has no ids
+ProductRow = namedtuple('ProductRow', COLUMNS)
+
+
+def done_marker(path):
+    """
+        Getting the path of the file created once the hand-off file is complete.
+        Args:
+            path (str): Path of the hand-off file.
+        Returns:
+            path (str): Path of the marker.
+    """
+    return path + '.done'
+
+
+class HandoffWriter():
+    """
+        Writing the hand-off file. Rows of a category are flushed to disk together, and the done marker
+        is created when the writer is closed after a complete run.
+    """
+    def __init__(self, path=HANDOFF_PATH) -> None:
+        """
+            Initializing HandoffWriter, the file is truncated.
+            Args:
+                path (str): Path of the hand-off file.
+        """
+        self.path = path
+        if os.path.exists(done_marker(path)):
+            os.remove(done_marker(path)) # readers have to wait for the new rows
+        self.__file = open(path, 'w', newline='', encoding='utf-8')
+        self.__writer = csv.writer(self.__file)
+        self.__writer.writerow(COLUMNS)
+        self.__file.flush()
+        self.rows = 0
+
+    def write(self, category_name, urls):
+        """
+            Appending the products of a category.
+            Args:
+                category_name (str): Name of the category.
+                urls (list): URLs of products.
+        """
+        for url in urls:
+            ids = item_ids(url) or (None, None)
+            self.__writer.writerow([category_name, ids[0], ids[1], canonical_product_url(url)])
+        self.__file.flush() # a reader never sees half of a category
+        self.rows += len(urls)
+
+    def close(self, done=True):
+        """
+            Closing the file.
+            Args:
+                done (bool): True to mark the file as complete.
+        """
+        self.__file.close()
+        if done:
+            open(done_marker(self.path), 'w').close()
+
+
+def read_handoff(path=HANDOFF_PATH, follow=False, poll_interval=POLL_INTERVAL):
+    """
+        Reading the hand-off file row by row.
+        Args:
+            path (str): Path of the hand-off file.
+            follow (bool): True to wait for new rows until the writer marks the file as complete.
+            poll_interval (float): Seconds between two reads when following the file.
+        Returns:
+            rows (iterator): A ProductRow for every product.
+    """
+    while follow and not os.path.exists(path):
+        time.sleep(poll_interval) # ProductCrawler hasn't started yet
+    with open(path, newline='', encoding='utf-8') as f:
+        header = None
+        partial = ''
+        while True:
+            # the marker is created after the last row is written, so checking it before reading is enough
+            finished = not follow or os.path.exists(done_marker(path))
+            line = f.readline()
+            if line.endswith('\n'):
+                line, partial = partial + line, ''
+                if header is None:
+                    header = next(csv.reader([line]))
+                    continue
+                category_name, shop_id, item_id, url = next(csv.reader([line]))
+                yield ProductRow(category_name, int(shop_id) if shop_id else None, int(item_id) if item_id else None, url)
+                continue
+            partial += line # the writer is in the middle of a line
+            if finished:
+                return
+            time.sleep(poll_interval)
@@ -0,0 +1,225 @@
+"""
+    Lightweight HTTP fetch backend: a requests.Session with a keep-alive connection pool per host,
+    shared by the crawler threads, and a backend that gets categories, product URLs and comment/star
+    pairs from Shopee's JSON endpoints (or the HTML of a page) without starting Chrome.
+"""
+import json
+import threading
+from urllib.parse import urlencode, urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_control import RateController # paces the requests per host, like the page loads of Chrome
+from parsers import (BASE_URL, category_id, item_ids, parse_category_tree, parse_search_items, parse_review_counts, parse_ratings,
+                     parse_product_urls_html, parse_reviews_html)
+
+
+# Hyperparameters
+MAX_CONNECTIONS_PER_HOST = 8 # keep-alive connections opened to one host at most
+REQUEST_TIMEOUT = 15 # seconds
+MAX_REDIRECTS = 5 # redirects followed by one request at most
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
+    'Accept': 'application/json, text/html;q=0.9, */*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept-Language': 'vi-VN,vi;q=0.9',
+    'X-API-Source': 'pc',
+}
+
+
+class HttpError(Exception):
+    """
+        Raised when a request fails or is redirected too many times.
+    """
+
+
+class HttpBackend():
+    """
+        Getting crawl records over plain HTTP. Every method returns None when the data can't be fetched,
+        so the caller can fall back to Selenium. The crawler threads share the session and its connection
+        pool, a thread waits for a free connection when max_connections_per_host are in use.
+    """
+    def __init__(self, base_url=BASE_URL, max_connections_per_host=MAX_CONNECTIONS_PER_HOST, timeout=REQUEST_TIMEOUT, rate_controller=None) -> None:
+        """
+            Initializing HttpBackend.
+            Args:
+                base_url (str): Home page URL, the JSON endpoints are resolved against it.
+                max_connections_per_host (int): Keep-alive connections opened to one host at most.
+                timeout (float): Seconds for one request.
+                rate_controller (RateController): Paces the requests per host, share the crawlers' one so
+                both backends count against the same limits. A private one is created if None.
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.rate_controller = rate_controller or RateController()
+        self.__adapter = HTTPAdapter(pool_maxsize=max_connections_per_host, pool_block=True)
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.mount('http://', self.__adapter)
+        self.session.mount('https://', self.__adapter)
+        self.__lock = threading.Lock() # guards the counters, updated by every crawler thread
+        self.requests = 0 # number of requests sent, redirects included
+        self.redirects = 0 # number of redirects followed
+        self.fallbacks = 0 # number of lookups left to Selenium
+
+    def __get(self, url, headers=None):
+        """
+            Sending a GET request from any thread. Redirects are followed here rather than by requests,
+            so every hop is counted and a redirect loop ends after MAX_REDIRECTS. Every hop takes a slot
+            of the rate controller, timeouts and 429/5xx answers cut the limits of the host.
+            Args:
+                url (str): The URL.
+                headers (dict): Extra headers.
+            Returns:
+                response (requests.Response): The response of the last hop, its url is where it was found.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            with self.__lock:
+                self.requests += 1
+            with self.rate_controller.slot(url, report=False):
+                try:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout, allow_redirects=False)
+                except requests.Timeout as e:
+                    self.rate_controller.failure(url, 'timeout')
+                    raise HttpError(f'GET {url} failed: {e!r}') from e
+                except requests.RequestException as e:
+                    raise HttpError(f'GET {url} failed: {e!r}') from e
+            if response.status_code == 429 or response.status_code >= 500: # the site is telling us to slow down
+                self.rate_controller.failure(url, f'status {response.status_code}')
+            else:
+                self.rate_controller.success(url)
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers['location'])
+            response.close() # gives the connection back to the pool
+            with self.__lock:
+                self.redirects += 1
+        raise HttpError(f'GET {url} failed: more than {MAX_REDIRECTS} redirects')
+
+    def __get_json(self, path, params, referer):
+        """
+            Calling a JSON endpoint of the site.
+            Args:
+                path (str): Path of the endpoint.
+                params (dict): Query parameters.
+                referer (str): Page the request comes from.
+            Returns:
+                payload (dict): The decoded payload, None if the request failed.
+        """
+        url = urljoin(self.base_url, path) + ('?' + urlencode(params) if params else '')
+        try:
+            response = self.__get(url, headers={'Referer': referer})
+            if response.status_code != 200:
+                print(f'GET {url} returned status {response.status_code}.')
+                return None
+            payload = json.loads(response.content)
+        except (HttpError, ValueError) as e:
+            print(f'Exception "{e}" occurs while fetching {url}.')
+            return None
+        if payload.get('error'):
+            print(f'GET {url} returned error {payload.get("error")}.')
+            return None
+        return payload
+
+    def __get_html(self, url):
+        """
+            Getting the HTML of a page.
+            Args:
+                url (str): URL of the page.
+            Returns:
+                html (str): The page, None if the request failed.
+        """
+        try:
+            response = self.__get(url)
+        except HttpError as e:
+            print(f'Exception "{e}" occurs while fetching {url}.')
+            return None
+        if response.status_code != 200 or 'html' not in response.headers.get('content-type', ''):
+            return None
+        return response.content.decode('utf-8', errors='replace')
+
+    def fetch_categories(self):
+        """
+            Getting the categories of the home page.
+            Returns:
+                categories (list): (name, URL) pairs, None if they can't be fetched.
+        """
+        payload = self.__get_json('api/v4/pages/get_category_tree', {}, self.base_url)
+        categories = parse_category_tree(payload, self.base_url) if payload else []
+        if not categories:
+            self.fallbacks += 1
+            return None
+        return categories
+
+    def fetch_product_urls(self, url, limit, review_counts=None):
+        """
+            Getting URLs of products of a category.
+            Args:
+                url (str): URL of the category.
+                limit (int): Number of products.
+                review_counts (dict): Filled with product key -> number of ratings shown by the search
+                API, None if unused. The HTML of the page doesn't show them.
+            Returns:
+                urls (list): URLs of products, None if they can't be fetched.
+        """
+        urls = []
+        catid = category_id(url)
+        if catid is not None:
+            while len(urls) < limit:
+                params = {'by': 'relevancy', 'limit': min(60, limit - len(urls)), 'match_id': catid, 'newest': len(urls),
+                          'order': 'desc', 'page_type': 'search', 'scenario': 'PAGE_OTHERS', 'version': 2}
+                payload = self.__get_json('api/v4/search/search_items', params, url)
+                found = parse_search_items(payload, self.base_url) if payload else []
+                if not found:
+                    break
+                if review_counts is not None:
+                    review_counts.update(parse_review_counts(payload, self.base_url))
+                urls.extend(found[:limit - len(urls)])
+        if not urls:
+            html = self.__get_html(url)
+            urls = parse_product_urls_html(html, url, limit=limit) if html else []
+        if not urls:
+            self.fallbacks += 1
+            return None
+        return urls
+
+    def fetch_reviews(self, url, limit):
+        """
+            Getting comments and stars of a product.
+            Args:
+                url (str): URL of the product.
+                limit (int): Maximum number of comment/star pairs.
+            Returns:
+                reviews (tuple): (comments, stars), None if they can't be fetched.
+        """
+        ids = item_ids(url)
+        if ids is not None:
+            shopid, itemid = ids
+            params = {'filter': 1, 'flag': 1, 'itemid': itemid, 'limit': limit, 'offset': 0, 'shopid': shopid, 'type': 0}
+            payload = self.__get_json('api/v2/item/get_ratings', params, url)
+            if payload is not None:
+                comments, stars = parse_ratings(payload)
+                return comments[:limit], stars[:limit]
+        html = self.__get_html(url)
+        if html is not None:
+            comments, stars = parse_reviews_html(html, limit=limit)
+            if comments:
+                return comments, stars
+        self.fallbacks += 1
+        return None
+
+    def report(self):
+        """
+            Printing statistics of the backend to stdout.
+        """
+        pools = self.__adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        print('HttpBackend: {} requests ({} redirects) over {} connections, {} lookups left to Selenium'.format(
+            self.requests, self.redirects, connections, self.fallbacks))
+
+    def close(self):
+        """
+            Closing the connections.
+        """
+        self.session.close()
@@ -0,0 +1,61 @@
+"""
+    Deferred imports of the heavy dependencies (selenium.webdriver, bs4, prometheus_client, cs50), so a
+    tool that only needs a parser or one stage of the crawl doesn't pay for the others when it starts.
+    The module is imported the first time the name is used. python -m benchmarks.bench_startup measures the difference.
+"""
+import importlib
+import threading
+
+
+class LazyImport():
+    """
+        Stand-in for a module, or for a name of a module, imported on first attribute access or call.
+        Attribute access (By.XPATH, webdriver.Chrome) and calls (WebDriverWait(driver, 10)) are forwarded,
+        isinstance() and subclassing need the real object, see resolve().
+    """
+    __lock = threading.Lock() # crawler workers may use a name for the first time at the same time
+
+    def __init__(self, module, name=None) -> None:
+        """
+            Initializing LazyImport, nothing is imported yet.
+            Args:
+                module (str): Name of the module, e.g. 'selenium.webdriver.common.by'.
+                name (str): Name to take from the module, e.g. 'By', None for the module itself.
+        """
+        self.__module = module
+        self.__name = name
+        self.__target = None
+
+    def resolve(self):
+        """
+            Importing the module.
+            Returns:
+                target: The module, or the name taken from it.
+        """
+        if self.__target is None:
+            with LazyImport.__lock:
+                if self.__target is None:
+                    module = importlib.import_module(self.__module)
+                    self.__target = module if self.__name is None else getattr(module, self.__name)
+        return self.__target
+
+    def __getattr__(self, attribute):
+        return getattr(self.resolve(), attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<lazy {self.__module}{"." + self.__name if self.__name else ""}>'
+
+
+def lazy_import(module, name=None):
+    """
+        Deferring an import.
+        Args:
+            module (str): Name of the module.
+            name (str): Name to take from the module, None for the module itself.
+        Returns:
+            lazy (LazyImport): Imports it on first use.
+    """
+    return LazyImport(module, name)
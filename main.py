@@ -1,30 +1,130 @@
-from crawlers import CategoryCrawler, ProductCrawler, CommentStarCrawler
+from crawlers import CategoryCrawler, ProductCrawler, CommentStarCrawler, WORKERS, PRODUCT_WORKERS, CATEGORY_TTL
+from driver_pool import DriverPool, POOL_SIZE, MAX_PAGES_PER_DRIVER
+from browser_profile import BrowserProfile, PAGE_LOAD_STRATEGY
+from storage import CrawlWriter, BATCH_SIZE, FLUSH_INTERVAL
+from waits import LoadStats
+from parsers import BASE_URL
+from lazy_imports import lazy_import
+HttpBackend = lazy_import('http_engine', 'HttpBackend') # requests is only imported by --backend http
+from retry import MAX_ATTEMPTS
+from frontier import Frontier
+from snapshots import SnapshotStore, SNAPSHOT_DIR, TTL, MAX_BYTES
+from offline import extract_snapshots, PROCESSES
+from metrics import Metrics, SUMMARY_PATH
+from rate_control import RateController, MAX_CONCURRENCY, INITIAL_RATE, MAX_RATE
+from pipeline import Pipeline, CATEGORY_QUEUE_SIZE, PRODUCT_QUEUE_SIZE
+from work_queue import open_queue, QUEUE_URL, VISIBILITY_TIMEOUT
+from distributed import CrawlWorker, seed_categories, wait_for_workers, worker_directory, find_shards, merge_shards, WORKERS_DIR
+import os
+import socket
 import time
 import argparse
 
 
 
 def main(args):
-    if args.category:
-        start = time.time()
-        shopee_home_page = 'https://shopee.vn/'
-        category = CategoryCrawler(home_page=shopee_home_page, headless_option=True)
-        category.get_categories()
-        # print(CategoryCrawler.categories_urls_dict)
-        end = time.time()
-        print("Finish in {} minutes".format((end - start) / 60))
-    elif args.product:
-        start = time.time()
-        product = ProductCrawler(headless_option=True)
-        product.get_products()
-        end = time.time()
-        print("Finish in {} minutes".format((end - start) / 60))
-    elif args.comment:
-        start = time.time()
-        comment_star = CommentStarCrawler(headless_option=True)
-        comment_star.get_stars_comments()
-        end = time.time()
-        print("Finish in {} minutes".format((end - start) / 60))
+    queue = open_queue(args.queue, max_attempts=args.max_attempts) if args.coordinator or args.worker else None
+    if args.worker:
+        os.chdir(worker_directory(args.worker_id, args.worker_dir)) # the shard (data.db) and the files of the crawlers
+    metrics = Metrics() # shared by the pool, the writer and the crawlers
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    # every worker needs its own browser session, the stages of a pipeline run at the same time
+    sessions = 1 + args.product_workers + args.workers if args.pipeline else max(args.product_workers, args.workers)
+    profile = BrowserProfile(block=not args.no_blocking, page_load_strategy=args.page_load_strategy)
+    driver_pool = DriverPool(size=max(args.drivers, sessions), headless_option=True, max_pages_per_driver=args.max_pages_per_driver, profile=profile,
+                             metrics=metrics)
+    writer = CrawlWriter(batch_size=args.batch_size, flush_interval=args.flush_interval, metrics=metrics)
+    rate_controller = RateController(max_concurrency=args.max_concurrency, initial_rate=args.rate, max_rate=args.max_rate, metrics=metrics) # shared by every worker
+    load_stats = LoadStats()
+    frontier = Frontier() # items already inserted or loaded, kept across runs
+    backend = HttpBackend(base_url=args.base_url, rate_controller=rate_controller) if args.backend == 'http' else None # Selenium is the fallback
+    snapshots = SnapshotStore(args.snapshot_dir, ttl=args.snapshot_ttl, max_bytes=args.snapshot_max_mb * 1024 ** 2) if args.snapshots or args.extract else None
+    try:
+        if args.category:
+            start = time.time()
+            shopee_home_page = args.base_url
+            category = CategoryCrawler(home_page=shopee_home_page, headless_option=True, driver_pool=driver_pool, writer=writer, load_stats=load_stats, backend=backend,
+                                       snapshots=snapshots, metrics=metrics, rate_controller=rate_controller)
+            category.get_categories(max_age=args.category_ttl if args.incremental else None)
+            # print(CategoryCrawler.categories_urls_dict)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.product:
+            start = time.time()
+            product = ProductCrawler(headless_option=True, driver_pool=driver_pool, writer=writer, load_stats=load_stats, backend=backend, frontier=frontier,
+                                     snapshots=snapshots, metrics=metrics, rate_controller=rate_controller)
+            product.get_products(max_attempts=args.max_attempts, resume=args.resume, workers=args.product_workers, incremental=args.incremental)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.comment:
+            start = time.time()
+            comment_star = CommentStarCrawler(headless_option=True, driver_pool=driver_pool, writer=writer, load_stats=load_stats, backend=backend, frontier=frontier,
+                                              snapshots=snapshots, metrics=metrics, rate_controller=rate_controller)
+            comment_star.get_stars_comments(workers=args.workers, max_attempts=args.max_attempts, resume=args.resume, follow=args.follow,
+                                            incremental=args.incremental)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.pipeline:
+            start = time.time()
+            shared = dict(headless_option=True, driver_pool=driver_pool, writer=writer, load_stats=load_stats, backend=backend, snapshots=snapshots, metrics=metrics,
+                          rate_controller=rate_controller)
+            pipeline = Pipeline(CategoryCrawler(home_page=args.base_url, **shared), ProductCrawler(frontier=frontier, **shared),
+                                CommentStarCrawler(frontier=frontier, **shared), category_queue_size=args.category_queue_size,
+                                product_queue_size=args.product_queue_size)
+            pipeline.run(product_workers=args.product_workers, workers=args.workers, max_attempts=args.max_attempts, resume=args.resume,
+                         incremental=args.incremental, category_max_age=args.category_ttl if args.incremental else None)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.coordinator:
+            start = time.time()
+            seed_categories(queue)
+            wait_for_workers(queue)
+            merge_shards(find_shards(args.worker_dir), writer, frontier)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.worker:
+            start = time.time()
+            shared = dict(headless_option=True, driver_pool=driver_pool, writer=writer, load_stats=load_stats, backend=backend, frontier=frontier,
+                          snapshots=snapshots, metrics=metrics, rate_controller=rate_controller)
+            worker = CrawlWorker(queue, args.worker_id, ProductCrawler(**shared), CommentStarCrawler(**shared), visibility_timeout=args.visibility_timeout)
+            worker.run(product_workers=args.product_workers, workers=args.workers, max_attempts=args.max_attempts)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.merge is not None:
+            start = time.time()
+            merge_shards(args.merge or find_shards(args.worker_dir), writer, frontier)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+        elif args.extract:
+            start = time.time()
+            extract_snapshots(snapshots, writer, frontier, processes=args.processes)
+            end = time.time()
+            print("Finish in {} minutes".format((end - start) / 60))
+    finally:
+        driver_pool.report()
+        driver_pool.close()
+        writer.close()
+        print('CrawlWriter: {} rows written in {} transactions'.format(writer.rows, writer.flushes))
+        load_stats.report()
+        frontier.report()
+        frontier.close()
+        rate_controller.report()
+        if backend is not None:
+            backend.report()
+            backend.close()
+        if snapshots is not None:
+            snapshots.report()
+            snapshots.close()
+        if args.load_stats:
+            load_stats.save(args.load_stats)
+        metrics.report()
+        metrics.save(args.metrics_summary)
+        if args.metrics_file:
+            metrics.write(args.metrics_file)
+        if queue is not None:
+            queue.report()
+            queue.close()
 
 
 if __name__ == "__main__":
@@ -32,5 +132,43 @@ if __name__ == "__main__":
     parser.add_argument('--category', action="store_true")
     parser.add_argument('--product', action="store_true")
     parser.add_argument('--comment', action="store_true")
+    parser.add_argument('--pipeline', action="store_true", help='run the category, product and comment crawlers at the same time, connected by bounded queues')
+    parser.add_argument('--coordinator', action="store_true", help='put the categories of url_files/categories_urls.json in the work queue, wait for the workers and merge their shards')
+    parser.add_argument('--worker', action="store_true", help='crawl the tasks of the work queue into a shard of its own')
+    parser.add_argument('--merge', nargs='*', metavar='SHARD', help='merge worker shards into data.db, all the shards under --worker-dir by default')
+    parser.add_argument('--queue', default=QUEUE_URL, help="work queue shared by the coordinator and the workers, e.g. 'sqlite:////mnt/crawl/queue.db'")
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}-{os.getpid()}', help='id of the worker, unique across machines, reuse it to keep the shard')
+    parser.add_argument('--worker-dir', default=WORKERS_DIR, help='directory of the workers, one subdirectory with a shard per worker')
+    parser.add_argument('--visibility-timeout', type=float, default=VISIBILITY_TIMEOUT, help='seconds before a task leased by a worker can be leased again')
+    parser.add_argument('--extract', action="store_true", help='extract categories, products and reviews again from the page snapshots, without crawling')
+    parser.add_argument('--drivers', type=int, default=POOL_SIZE, help='number of warm Chrome sessions')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='number of product pages crawled in parallel with --comment or --pipeline')
+    parser.add_argument('--product-workers', type=int, default=PRODUCT_WORKERS, help='number of category pages crawled in parallel with --product or --pipeline')
+    parser.add_argument('--category-queue-size', type=int, default=CATEGORY_QUEUE_SIZE, help='with --pipeline, categories waiting for the product stage at most')
+    parser.add_argument('--product-queue-size', type=int, default=PRODUCT_QUEUE_SIZE, help='with --pipeline, product URLs waiting for the comment stage at most')
+    parser.add_argument('--max-pages-per-driver', type=int, default=MAX_PAGES_PER_DRIVER, help='recycle a Chrome session after this many pages')
+    parser.add_argument('--no-blocking', action="store_true", help='let Chrome load images, fonts, media and tracking scripts')
+    parser.add_argument('--page-load-strategy', choices=['normal', 'eager', 'none'], default=PAGE_LOAD_STRATEGY, help="'eager' returns from a page load at DOMContentLoaded")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='rows written to data.db per transaction')
+    parser.add_argument('--flush-interval', type=float, default=FLUSH_INTERVAL, help='seconds before buffered rows are written')
+    parser.add_argument('--resume', action="store_true", help='skip the categories or products done by a previous --product, --comment or --pipeline run')
+    parser.add_argument('--incremental', action="store_true", help='refresh: reuse the categories saved less than --category-ttl ago and crawl the reviews of the stored products only when their listing shows new ratings')
+    parser.add_argument('--category-ttl', type=float, default=CATEGORY_TTL, help='with --incremental, seconds the saved categories are reused')
+    parser.add_argument('--follow', action="store_true", help='with --comment, crawl products while a --product run is still writing them')
+    parser.add_argument('--max-attempts', type=int, default=MAX_ATTEMPTS, help='give up on a page timing out this many times')
+    parser.add_argument('--max-concurrency', type=int, default=MAX_CONCURRENCY, help='pages loading at the same time per host at most, lowered on timeouts and login walls')
+    parser.add_argument('--rate', type=float, default=INITIAL_RATE, help='page loads per second per host at the start, adapted to timeouts and login walls')
+    parser.add_argument('--max-rate', type=float, default=MAX_RATE, help='page loads per second per host at most')
+    parser.add_argument('--backend', choices=['selenium', 'http'], default='selenium', help='fetch pages with Chrome or over plain HTTP (Selenium as fallback)')
+    parser.add_argument('--base-url', default=BASE_URL, help='home page of the site, e.g. the local fixture server')
+    parser.add_argument('--snapshots', action="store_true", help='keep the HTML of the pages loaded with Chrome for --extract')
+    parser.add_argument('--snapshot-dir', default=SNAPSHOT_DIR, help='directory of the page snapshots')
+    parser.add_argument('--snapshot-ttl', type=float, default=TTL, help='seconds a snapshot is kept')
+    parser.add_argument('--snapshot-max-mb', type=float, default=MAX_BYTES / 1024 ** 2, help='compressed size of the snapshots kept on disk')
+    parser.add_argument('--processes', type=int, default=PROCESSES, help='parsing processes of --extract')
+    parser.add_argument('--load-stats', help='save per-page waiting times to this JSON file')
+    parser.add_argument('--metrics-port', type=int, help='serve Prometheus metrics on this port during the run')
+    parser.add_argument('--metrics-file', help='write Prometheus metrics to this file at the end of the run')
+    parser.add_argument('--metrics-summary', default=SUMMARY_PATH, help='JSON summary of the timings and counts of the run')
     args = parser.parse_args()
     main(args)
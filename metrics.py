@@ -0,0 +1,229 @@
+"""
+    Timings and counts of the crawl stages, to see where the crawl time goes. They are served over HTTP
+    or written in the Prometheus text format through a prometheus_client registry, and summarized to a
+    JSON file at the end of a run.
+"""
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from lazy_imports import lazy_import
+prometheus_client = lazy_import('prometheus_client') # imported when the metrics are served or written
+prometheus_core = lazy_import('prometheus_client.core')
+
+
+# Hyperparameters
+NAMESPACE = 'shopee_crawler'
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60) # seconds
+SUMMARY_PATH = 'logs/metrics.json'
+
+# name -> (description, label names)
+HISTOGRAMS = {
+    'driver_start': ('Seconds to start a Chrome session', ()),
+    'page_load': ('Seconds to load a page', ('stage', )),
+    'wait': ('Seconds spent scrolling and waiting for elements or network idle', ('stage', )),
+    'extraction': ('Seconds to extract the results of a page', ('stage', )),
+    'db_write': ('Seconds to write a batch of rows to the database', ()),
+}
+COUNTERS = {
+    'pages': ('Pages loaded', ('stage', )),
+    'items': ('Categories, products and reviews found', ('kind', )),
+    'timeouts': ('Pages timing out', ('stage', )),
+    'login_walls': ('Product pages asking to log in', ()),
+}
+GAUGES = {
+    'concurrency_limit': ('Page loads allowed at the same time per host', ('host', )),
+    'rate_limit': ('Page loads per second allowed per host', ('host', )),
+}
+
+
+class Metrics():
+    """
+        Histograms, counters and gauges of a run, shared by the crawlers, the driver pool, the writer and the
+        rate controller. They are kept in plain dicts (count, sum, max and buckets per metric and label) and
+        exported by a collector of a prometheus_client registry, created the first time they are served or
+        written, so a run that doesn't export them never imports prometheus_client.
+    """
+    def __init__(self) -> None:
+        """
+            Initializing Metrics, the registry is created on first use.
+        """
+        self.__registry = None
+        self.__lock = threading.Lock() # workers record at the same time
+        self.__timings = {} # (name, label value) -> [count, sum, max]
+        self.__buckets = {} # (name, label value) -> observations per bucket of BUCKETS, the last one is +Inf
+        self.__counts = {} # (name, label value) -> count
+        self.__first = {} # (name, label value) -> seconds from the start to the first count
+        self.__values = {} # (name, label value) -> current value of a gauge
+        self.started = time.time()
+
+    def observe(self, name, seconds, label=None):
+        """
+            Recording a duration.
+            Args:
+                name (str): Name of the histogram, see HISTOGRAMS.
+                seconds (float): The duration.
+                label (str): Value of the label of the histogram (the stage), None if it has none.
+        """
+        if name not in HISTOGRAMS:
+            raise KeyError(f'Unknown histogram "{name}"')
+        with self.__lock:
+            timing = self.__timings.setdefault((name, label), [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            self.__buckets.setdefault((name, label), [0] * (len(BUCKETS) + 1))[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def timer(self, name, label=None):
+        """
+            Recording the duration of a block, also when it raises.
+            Args:
+                name (str): Name of the histogram, see HISTOGRAMS.
+                label (str): Value of the label of the histogram, None if it has none.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, label)
+
+    def count(self, name, label=None, amount=1):
+        """
+            Increasing a counter.
+            Args:
+                name (str): Name of the counter, see COUNTERS.
+                label (str): Value of the label of the counter, None if it has none.
+                amount (int): Increase.
+        """
+        if name not in COUNTERS:
+            raise KeyError(f'Unknown counter "{name}"')
+        if amount <= 0:
+            return
+        with self.__lock:
+            self.__counts[(name, label)] = self.__counts.get((name, label), 0) + amount
+            self.__first.setdefault((name, label), time.time() - self.started)
+
+    def set(self, name, value, label=None):
+        """
+            Setting a gauge.
+            Args:
+                name (str): Name of the gauge, see GAUGES.
+                value (float): Current value.
+                label (str): Value of the label of the gauge, None if it has none.
+        """
+        if name not in GAUGES:
+            raise KeyError(f'Unknown gauge "{name}"')
+        with self.__lock:
+            self.__values[(name, label)] = value
+
+    @property
+    def registry(self):
+        """
+            prometheus_client registry exporting the metrics, created on first use.
+        """
+        if self.__registry is None:
+            registry = prometheus_client.CollectorRegistry()
+            registry.register(self)
+            self.__registry = registry
+        return self.__registry
+
+    def collect(self):
+        """
+            Exporting the metrics to the registry, called on every scrape or write.
+            Returns:
+                families (list): Metric families of prometheus_client.
+        """
+        with self.__lock:
+            timings = dict((key, (list(self.__buckets[key]), timing[1])) for key, timing in self.__timings.items())
+            counts = dict(self.__counts)
+            values = dict(self.__values)
+        families = []
+        for name, (description, labels) in HISTOGRAMS.items():
+            family = prometheus_core.HistogramMetricFamily(f'{NAMESPACE}_{name}_seconds', description, labels=labels)
+            for (metric, label), (buckets, total) in timings.items():
+                if metric == name:
+                    cumulative = [sum(buckets[:index + 1]) for index in range(len(buckets))]
+                    bounds = [str(float(bound)) for bound in BUCKETS] + ['+Inf']
+                    family.add_metric([label] if labels else [], list(zip(bounds, cumulative)), total)
+            families.append(family)
+        for name, (description, labels) in COUNTERS.items():
+            family = prometheus_core.CounterMetricFamily(f'{NAMESPACE}_{name}', description, labels=labels)
+            for (metric, label), count in counts.items():
+                if metric == name:
+                    family.add_metric([label] if labels else [], count)
+            families.append(family)
+        for name, (description, labels) in GAUGES.items():
+            family = prometheus_core.GaugeMetricFamily(f'{NAMESPACE}_{name}', description, labels=labels)
+            for (metric, label), value in values.items():
+                if metric == name:
+                    family.add_metric([label] if labels else [], value)
+            families.append(family)
+        return families
+
+    def serve(self, port):
+        """
+            Serving the metrics in the Prometheus text format while the run goes on.
+            Args:
+                port (int): Port of the HTTP endpoint (/metrics).
+        """
+        prometheus_client.start_http_server(port, registry=self.registry)
+        print(f'Metrics: serving on http://127.0.0.1:{port}/metrics')
+
+    def write(self, path):
+        """
+            Writing the metrics to a file in the Prometheus text format (node_exporter textfile collector).
+            Args:
+                path (str): Path of the file.
+        """
+        prometheus_client.write_to_textfile(path, self.registry)
+
+    def summary(self):
+        """
+            Summarizing the run.
+            Returns:
+                summary (dict): Seconds elapsed, count, sum, mean and max of every timing, value of every
+                counter, seconds to the first count of every counter (e.g. the first review), last value of
+                every gauge, and the share of the elapsed time spent in each timing.
+        """
+        elapsed = time.time() - self.started
+        timings = {}
+        counters = {}
+        first = {}
+        gauges = {}
+        with self.__lock:
+            for (name, label), (count, total, longest) in sorted(self.__timings.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                timings.setdefault(name, {})[label or 'all'] = {'count': count, 'sum': total, 'mean': total / count, 'max': longest}
+            for (name, label), count in sorted(self.__counts.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                counters.setdefault(name, {})[label or 'all'] = count
+                first.setdefault(name, {})[label or 'all'] = self.__first[(name, label)]
+            for (name, label), value in sorted(self.__values.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                gauges.setdefault(name, {})[label or 'all'] = value
+        share = dict((name, sum(timing['sum'] for timing in labels.values()) / elapsed if elapsed else 0) for name, labels in timings.items())
+        return {'elapsed': elapsed, 'timings': timings, 'counters': counters, 'first': first, 'gauges': gauges, 'share': share}
+
+    def save(self, path=SUMMARY_PATH):
+        """
+            Saving the summary to a JSON file.
+            Args:
+                path (str): Path of the file.
+        """
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.summary(), indent=2))
+
+    def report(self):
+        """
+            Printing where the time went to stdout.
+        """
+        summary = self.summary()
+        print('Metrics: {:.1f} seconds'.format(summary['elapsed']))
+        for name, labels in summary['timings'].items():
+            for label, timing in labels.items():
+                print('    {:<14}{:<10}{:>8} x {:>8.3f} s = {:>8.1f} s ({:.0%})'.format(
+                    name, label, timing['count'], timing['mean'], timing['sum'], timing['sum'] / summary['elapsed'] if summary['elapsed'] else 0))
+        for name, labels in summary['counters'].items():
+            print('    {:<14}{}'.format(name, ', '.join(f'{label}: {count}' for label, count in labels.items())))
+        for name, labels in summary['gauges'].items():
+            print('    {:<18}{}'.format(name, ', '.join(f'{label}: {value:g}' for label, value in labels.items())))
@@ -0,0 +1,179 @@
+"""
+    Versioned schema of data.db. The version is kept in PRAGMA user_version and every migration newer
+    than it is applied in its own transaction, so CrawlWriter, Frontier and the web app can all call
+    migrate at startup.
+"""
+from parsers import product_key # canonical key of a product URL
+from search import index_rows # rows of the full-text index
+
+
+def _create_tables(connection):
+    """
+        Version 1, the tables of the original crawl (data.db shipped with version 0 already has them).
+    """
+    connection.execute("CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, name TEXT NOT NULL, url TEXT NOT NULL)")
+    connection.execute("CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, url TEXT NOT NULL, category_id INTEGER NOT NULL, "
+                       "FOREIGN KEY (category_id) REFERENCES categories(id))")
+    connection.execute("CREATE TABLE IF NOT EXISTS comments_stars (id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, comment TEXT NOT NULL, stars NUMERIC NOT NULL, "
+                       "product_id INTEGER NOT NULL, FOREIGN KEY (product_id) REFERENCES products(id))")
+
+
+def _create_crawl_state(connection):
+    """
+        Version 2, status of every category and product for resumable runs.
+    """
+    connection.execute("CREATE TABLE IF NOT EXISTS crawl_state (stage TEXT NOT NULL, item TEXT NOT NULL, status TEXT NOT NULL, "
+                       "updated REAL NOT NULL, PRIMARY KEY (stage, item))")
+
+
+def _create_frontier(connection):
+    """
+        Version 3, seen-set of product keys, seeded with the products and reviews already stored.
+    """
+    exists = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'frontier'").fetchone()
+    connection.execute("CREATE TABLE IF NOT EXISTS frontier (stage TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (stage, key))")
+    if exists:
+        return
+    products = [url for url, in connection.execute("SELECT url FROM products")]
+    reviewed = [url for url, in connection.execute("SELECT DISTINCT products.url FROM comments_stars JOIN products ON products.id = comments_stars.product_id")]
+    connection.executemany("INSERT OR IGNORE INTO frontier (stage, key) VALUES ('product', ?)", ((product_key(url), ) for url in products))
+    connection.executemany("INSERT OR IGNORE INTO frontier (stage, key) VALUES ('review', ?)", ((product_key(url), ) for url in reviewed))
+
+
+def _add_keys_and_indexes(connection):
+    """
+        Version 4, unique category names and product keys, indexes for the lookups of the crawlers and
+        the web app. Rows inserted twice by earlier runs are merged into the first one.
+    """
+    # categories: one row per name, products of the duplicates are moved to the first row
+    first_ids = {}
+    duplicates = []
+    for category_id, name in connection.execute("SELECT id, name FROM categories ORDER BY id").fetchall():
+        if name in first_ids:
+            duplicates.append((first_ids[name], category_id))
+        else:
+            first_ids[name] = category_id
+    connection.executemany("UPDATE products SET category_id = ? WHERE category_id = ?", duplicates)
+    connection.executemany("DELETE FROM categories WHERE id = ?", ((category_id, ) for _, category_id in duplicates))
+
+    # products: one row per item, comments of the duplicates are moved to the first row
+    connection.execute("ALTER TABLE products ADD COLUMN item_key TEXT")
+    first_ids = {}
+    keys = []
+    duplicates = []
+    for product_id, url in connection.execute("SELECT id, url FROM products ORDER BY id").fetchall():
+        key = product_key(url)
+        if key in first_ids:
+            duplicates.append((first_ids[key], product_id))
+        else:
+            first_ids[key] = product_id
+            keys.append((key, product_id))
+    connection.executemany("UPDATE products SET item_key = ? WHERE id = ?", keys)
+    connection.executemany("UPDATE comments_stars SET product_id = ? WHERE product_id = ?", duplicates)
+    connection.executemany("DELETE FROM products WHERE id = ?", ((product_id, ) for _, product_id in duplicates))
+
+    connection.execute("CREATE UNIQUE INDEX categories_name ON categories (name)")
+    connection.execute("CREATE UNIQUE INDEX products_item_key ON products (item_key)")
+    connection.execute("CREATE INDEX products_url ON products (url, id)") # URL -> id without reading the table
+    connection.execute("CREATE INDEX products_category ON products (category_id, id, url)") # products of a category
+    connection.execute("CREATE INDEX comments_stars_product ON comments_stars (product_id, stars)") # reviews and ratings of a product
+    connection.execute("CREATE INDEX crawl_state_status ON crawl_state (stage, status)")
+
+
+def _create_rating_aggregates(connection):
+    """
+        Version 5, number of reviews per star value, sum of stars and last crawl time of every product
+        and category, kept up to date by CrawlWriter. Filled from the reviews already stored.
+    """
+    connection.execute("CREATE TABLE rating_aggregates (kind TEXT NOT NULL, item_id INTEGER NOT NULL, "
+                       "stars_1 INTEGER NOT NULL DEFAULT 0, stars_2 INTEGER NOT NULL DEFAULT 0, stars_3 INTEGER NOT NULL DEFAULT 0, "
+                       "stars_4 INTEGER NOT NULL DEFAULT 0, stars_5 INTEGER NOT NULL DEFAULT 0, reviews INTEGER NOT NULL DEFAULT 0, "
+                       "stars_sum INTEGER NOT NULL DEFAULT 0, last_crawled REAL, PRIMARY KEY (kind, item_id))")
+    for kind, item_column in (('product', 'comments_stars.product_id'), ('category', 'products.category_id')):
+        connection.execute(
+            "INSERT INTO rating_aggregates (kind, item_id, stars_1, stars_2, stars_3, stars_4, stars_5, reviews, stars_sum, last_crawled) "
+            f"SELECT '{kind}', {item_column}, SUM(stars = 1), SUM(stars = 2), SUM(stars = 3), SUM(stars = 4), SUM(stars = 5), COUNT(*), SUM(stars), NULL "
+            f"FROM comments_stars JOIN products ON products.id = comments_stars.product_id GROUP BY {item_column}")
+
+
+def _create_comments_fts(connection):
+    """
+        Version 6, full-text index of the comments, as written and folded, filled from the comments
+        already stored. CrawlWriter adds the new comments.
+    """
+    connection.execute("CREATE VIRTUAL TABLE comments_fts USING fts5(comment, folded, tokenize = 'unicode61 remove_diacritics 0')")
+    connection.executemany("INSERT INTO comments_fts (rowid, comment, folded) VALUES (?, ?, ?)",
+                           index_rows(connection.execute("SELECT id, comment FROM comments_stars").fetchall()))
+
+
+def _create_review_watermarks(connection):
+    """
+        Version 7, what an incremental crawl knows of the reviews of every product: the number of ratings
+        shown in the last listing (listed) and at the last crawl of its reviews (review_count), the
+        fingerprint of the newest review and the number of reviews stored at that crawl. Seeded with the
+        number of reviews of the products whose reviews are stored and not left half done. Their
+        fingerprints are left out: the original crawl stored reviews of earlier products under later ones,
+        so the first row of a product isn't always its own newest review. Their next crawl compares every
+        review with the stored ones instead. Their counts are unknown until the next listing.
+    """
+    connection.execute("CREATE TABLE review_watermarks (item_key TEXT PRIMARY KEY NOT NULL, listed INTEGER, review_count INTEGER, "
+                       "fingerprint TEXT, stored INTEGER NOT NULL DEFAULT 0, updated REAL)")
+    connection.execute("INSERT OR IGNORE INTO review_watermarks (item_key, stored) "
+                       "SELECT products.item_key, rating_aggregates.reviews FROM products "
+                       "JOIN rating_aggregates ON rating_aggregates.kind = 'product' AND rating_aggregates.item_id = products.id "
+                       "WHERE rating_aggregates.reviews > 0 "
+                       "AND NOT EXISTS (SELECT 1 FROM crawl_state WHERE stage = 'product' AND item = products.url AND status != 'done')")
+
+
+# (version, description, migration), applied in order
+MIGRATIONS = [
+    (1, 'tables of the original crawl', _create_tables),
+    (2, 'crawl state', _create_crawl_state),
+    (3, 'frontier', _create_frontier),
+    (4, 'unique keys and indexes', _add_keys_and_indexes),
+    (5, 'rating aggregates', _create_rating_aggregates),
+    (6, 'full-text index of the comments', _create_comments_fts),
+    (7, 'review watermarks', _create_review_watermarks),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(connection):
+    """
+        Reading the schema version of a database.
+        Args:
+            connection (sqlite3.Connection): Connection to the database.
+        Returns:
+            version (int): Version of the last migration applied, 0 for the original data.db.
+    """
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection, target=LATEST_VERSION):
+    """
+        Applying the migrations newer than the version of a database.
+        Args:
+            connection (sqlite3.Connection): Connection to the database, in autocommit mode
+            (isolation_level=None).
+            target (int): Version to migrate to.
+        Returns:
+            version (int): Version of the database after migrating.
+    """
+    if schema_version(connection) >= target:
+        return schema_version(connection) # nothing to do, the common case at startup
+    for version, description, migration in MIGRATIONS:
+        if version > target:
+            break
+        connection.execute("BEGIN IMMEDIATE") # another process may be migrating at the same time
+        try:
+            if schema_version(connection) >= version:
+                connection.execute("ROLLBACK")
+                continue
+            migration(connection)
+            connection.execute(f"PRAGMA user_version = {version}")
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        print(f'Migrated the database to version {version}: {description}')
+    return schema_version(connection)
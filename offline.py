@@ -0,0 +1,94 @@
+"""
+    Extracting categories, products and reviews again from the page snapshots instead of crawling, e.g.
+    after fixing a selector. The parsers of parsers.py run over the stored HTML in a pool of processes,
+    the results are written by the CrawlWriter of the calling process.
+"""
+import os
+
+from lazy_imports import lazy_import
+ProcessPoolExecutor = lazy_import('concurrent.futures', 'ProcessPoolExecutor') # multiprocessing is only imported by --extract
+
+from crawlers import PRODUCTS_PER_CATEGORY, COMMENTS_STARS_PER_PRODUCT
+from parsers import parse_categories_html, parse_product_urls_html, parse_reviews_html, canonical_product_url, product_key
+from snapshots import read_object
+
+
+# Hyperparameters
+PROCESSES = os.cpu_count() or 1 # parsing is CPU-bound, one process per core
+CHUNK_SIZE = 16 # snapshots sent to a process at once
+
+
+def extract_snapshot(task):
+    """
+        Parsing one snapshot, runs in a worker process.
+        Args:
+            task (tuple): (kind, url, meta, path) of the snapshot.
+        Returns:
+            result (list): (name, URL) pairs of a home page, URLs of products of a category page,
+            (comments, stars) of a product page.
+    """
+    kind, url, meta, path = task
+    html = read_object(path)
+    if kind == 'home':
+        return parse_categories_html(html, meta['names'])
+    if kind == 'category':
+        return parse_product_urls_html(html, url.split('#')[0])
+    return parse_reviews_html(html, limit=COMMENTS_STARS_PER_PRODUCT)
+
+
+def _has_reviews(writer, product_id):
+    """
+        Checking whether reviews of a product are stored, so extracting again doesn't add them twice.
+    """
+    row = writer.connection.execute("SELECT reviews FROM rating_aggregates WHERE kind = 'product' AND item_id = ?", (product_id, )).fetchone()
+    return row is not None and row[0] > 0
+
+
+def extract_snapshots(store, writer, frontier, processes=PROCESSES):
+    """
+        Extracting the latest snapshot of every page, home pages first, then category pages, then
+        product pages, so products are inserted before their reviews. Categories are updated, products
+        already inserted are skipped and reviews are only added to products without any (an extraction
+        that found nothing).
+        Args:
+            store (SnapshotStore): The snapshots.
+            writer (CrawlWriter): Storage for the results.
+            frontier (Frontier): Seen-set of items.
+            processes (int): Number of parsing processes.
+        Returns:
+            counts (dict): Kind -> number of snapshots whose results were written.
+    """
+    counts = {'home': 0, 'category': 0, 'product': 0}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for kind in ('home', 'category', 'product'):
+            snapshots = store.latest(kind)
+            if kind == 'product':
+                snapshots = [snapshot for snapshot in snapshots if writer.product_id(snapshot[0].split('#')[0]) is not None
+                             and not _has_reviews(writer, writer.product_id(snapshot[0].split('#')[0]))]
+            tasks = [(kind, url, meta, store.object_path(digest)) for url, kind, _, digest, meta in snapshots]
+            products = {} # category name -> URLs of products, from all its pages
+            reviews = {} # product URL -> (comments, stars), from all its pages
+            for (_, url, meta, _), result in zip(tasks, executor.map(extract_snapshot, tasks, chunksize=CHUNK_SIZE)):
+                if kind == 'home':
+                    for category_name, category_url in result:
+                        writer.add_category(category_name, category_url)
+                elif kind == 'category':
+                    products.setdefault(meta['category_name'], []).extend(result)
+                else:
+                    comments, stars = reviews.setdefault(url.split('#')[0], ([], []))
+                    comments.extend(result[0])
+                    stars.extend(result[1])
+                counts[kind] += 1
+            for url, (comments, stars) in reviews.items():
+                writer.add_comments_stars(url, comments[:COMMENTS_STARS_PER_PRODUCT], stars[:COMMENTS_STARS_PER_PRODUCT])
+                frontier.add('review', product_key(url), stored=True)
+            for category_name, urls in products.items():
+                if writer.category_id(category_name) is None:
+                    print(f'Category "{category_name}" is not in the database, its products are skipped.')
+                    continue
+                urls = [url for url in map(canonical_product_url, urls[:PRODUCTS_PER_CATEGORY]) if frontier.add('product', product_key(url))]
+                writer.add_products(category_name, urls)
+            writer.flush() # the next kind reads what this one wrote
+            frontier.flush()
+            print(f'Extracted {counts[kind]} {kind} snapshots.')
+    return counts
@@ -0,0 +1,254 @@
+"""
+    Parsers turning Shopee HTML pages and JSON API payloads into the records produced by the crawlers:
+    (category name, category URL) pairs, product URLs and comment/star pairs.
+"""
+import hashlib # fingerprints of reviews
+import re # finds category and item ids in URLs
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+
+from lazy_imports import lazy_import
+BeautifulSoup = lazy_import('bs4', 'BeautifulSoup') # parses HTML without a browser, imported by the first page parsed
+
+from extraction import ACTIVE_STAR_CLASS, COMMENT_CLASS, STARS_CLASS
+
+
+# CSS equivalents of the XPaths used by the Selenium crawlers
+CATEGORIES_SELECTOR = "div.home-category-list ul.image-carousel__item-list > li > div > a"
+PRODUCTS_SELECTOR = "div[class='row shopee-search-item-result__items'] > div > a"
+SECTIONS_SELECTOR = "div[class='shopee-product-comment-list'] > div"
+
+CATEGORY_ID_PATTERN = re.compile(r'-cat\.(\d+)') # .../Thoi-Trang-Nam-cat.11035567
+ITEM_ID_PATTERN = re.compile(r'-i\.(\d+)\.(\d+)') # .../Ao-thun-i.<shop id>.<item id>?...
+
+BASE_URL = 'https://shopee.vn/' # home page of the site, the URLs of the categories and products are relative to it
+
+
+def category_id(url):
+    """
+        Finding the category id in a category URL.
+        Args:
+            url (str): URL of a category.
+        Returns:
+            category_id (int): Id of the category, None if the URL has no id.
+    """
+    match = CATEGORY_ID_PATTERN.search(url)
+    return int(match.group(1)) if match else None
+
+
+def item_ids(url):
+    """
+        Finding the shop id and item id in a product URL.
+        Args:
+            url (str): URL of a product.
+        Returns:
+            ids (tuple): (shop id, item id), None if the URL has no ids.
+    """
+    match = ITEM_ID_PATTERN.search(url)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def canonical_product_url(url):
+    """
+        Dropping the query and fragment of a product URL, they only hold per-session tracking
+        parameters (sp_atk, xptdk).
+        Args:
+            url (str): URL of a product.
+        Returns:
+            url (str): URL of the product without query and fragment.
+    """
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, '', ''))
+
+
+def product_key(url):
+    """
+        Reducing a product URL to the key of its item, the same item found under different names or
+        tracking parameters has the same key.
+        Args:
+            url (str): URL of a product.
+        Returns:
+            key (str): 'i.<shop id>.<item id>', the canonical URL if the URL has no ids.
+    """
+    ids = item_ids(url)
+    if ids is None:
+        return canonical_product_url(url)
+    return 'i.{}.{}'.format(*ids)
+
+
+def review_fingerprint(comment, stars):
+    """
+        Identifying a review by its text and stars, the newest review stored of a product tells an
+        incremental crawl where the reviews it already has begin.
+        Args:
+            comment (str): Comment of the review.
+            stars (int): Stars of the review.
+        Returns:
+            fingerprint (str): Hex digest of the review.
+    """
+    return hashlib.sha1(f'{int(stars)}|{comment.strip()}'.encode('utf-8')).hexdigest()
+
+
+def _slug(name):
+    """
+        Turning a name into the path of a Shopee URL.
+        Args:
+            name (str): Name of a category or product.
+        Returns:
+            slug (str): Percent-encoded name, words joined with '-'.
+    """
+    words = re.sub(r'[\s/?#&%]+', ' ', name).split()
+    return quote('-'.join(words))
+
+
+def category_url(base_url, name, catid):
+    """
+        Building the URL of a category like the ones on the home page.
+        Args:
+            base_url (str): Home page URL.
+            name (str): Name of the category.
+            catid (int): Id of the category.
+        Returns:
+            url (str): URL of the category.
+    """
+    return urljoin(base_url, f'{_slug(name)}-cat.{catid}')
+
+
+def product_url(base_url, name, shopid, itemid):
+    """
+        Building the URL of a product like the ones on a search page.
+        Args:
+            base_url (str): Home page URL.
+            name (str): Name of the product.
+            shopid (int): Id of the shop.
+            itemid (int): Id of the item.
+        Returns:
+            url (str): URL of the product.
+    """
+    return urljoin(base_url, f'{_slug(name)}-i.{shopid}.{itemid}')
+
+
+def parse_category_tree(payload, base_url):
+    """
+        Parsing the category tree API payload.
+        Args:
+            payload (dict): JSON payload of /api/v4/pages/get_category_tree.
+            base_url (str): Home page URL.
+        Returns:
+            categories (list): (name, URL) pairs of the top-level categories.
+    """
+    categories = []
+    for category in (payload.get('data') or {}).get('category_list') or []:
+        name = category.get('display_name') or category.get('name')
+        if name and category.get('catid'):
+            categories.append((name, category_url(base_url, name, category['catid'])))
+    return categories
+
+
+def parse_search_items(payload, base_url):
+    """
+        Parsing the search API payload.
+        Args:
+            payload (dict): JSON payload of /api/v4/search/search_items.
+            base_url (str): Home page URL.
+        Returns:
+            urls (list): URLs of the products.
+    """
+    urls = []
+    for item in payload.get('items') or []:
+        basic = item.get('item_basic') or item
+        if basic.get('shopid') and basic.get('itemid'):
+            urls.append(product_url(base_url, basic.get('name', ''), basic['shopid'], basic['itemid']))
+    return urls
+
+
+def parse_review_counts(payload, base_url):
+    """
+        Parsing the number of ratings shown for every product of the search API payload.
+        Args:
+            payload (dict): JSON payload of /api/v4/search/search_items.
+            base_url (str): Home page URL.
+        Returns:
+            counts (dict): Product key -> number of ratings, for the items showing it.
+    """
+    counts = {}
+    for item in payload.get('items') or []:
+        basic = item.get('item_basic') or item
+        count = basic.get('cmt_count', ((basic.get('item_rating') or {}).get('rating_count') or [None])[0])
+        if basic.get('shopid') and basic.get('itemid') and count is not None:
+            counts[product_key(product_url(base_url, basic.get('name', ''), basic['shopid'], basic['itemid']))] = int(count)
+    return counts
+
+
+def parse_ratings(payload):
+    """
+        Parsing the ratings API payload. Only ratings having both a comment and stars are kept.
+        Args:
+            payload (dict): JSON payload of /api/v2/item/get_ratings.
+        Returns:
+            comments (list): Comments of the product.
+            stars (list): Stars of the product, one per comment.
+    """
+    comments = []
+    stars = []
+    for rating in (payload.get('data') or {}).get('ratings') or []:
+        comment = (rating.get('comment') or '').strip()
+        if comment and rating.get('rating_star') is not None:
+            comments.append(comment)
+            stars.append(int(rating['rating_star']))
+    return comments, stars
+
+
+def parse_categories_html(html, names):
+    """
+        Parsing the categories of the home page, names are matched with links in order like
+        CategoryCrawler does.
+        Args:
+            html (str): HTML of the home page.
+            names (list): Names of the categories.
+        Returns:
+            categories (list): (name, URL) pairs.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    links = [a.get('href') for a in soup.select(CATEGORIES_SELECTOR) if a.get('href')]
+    return list(zip(names, links))
+
+
+def parse_product_urls_html(html, base_url, limit=None):
+    """
+        Parsing the product links of a category (search result) page.
+        Args:
+            html (str): HTML of the page.
+            base_url (str): URL of the page, relative links are resolved against it.
+            limit (int): Maximum number of URLs, None for all of them.
+        Returns:
+            urls (list): URLs of products.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    urls = [urljoin(base_url, a['href']) for a in soup.select(PRODUCTS_SELECTOR) if a.get('href')]
+    return urls if limit is None else urls[:limit]
+
+
+def parse_reviews_html(html, limit=None):
+    """
+        Parsing the comment section of a product page, like the injected script in extraction.py.
+        Args:
+            html (str): HTML of the product page.
+            limit (int): Maximum number of reviews, None for all of them.
+        Returns:
+            comments (list): Comments of the product.
+            stars (list): Stars of the product, one per comment.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    comments = []
+    stars = []
+    for section in soup.select(SECTIONS_SELECTOR):
+        if limit is not None and len(comments) >= limit:
+            break
+        comment = section.find(class_=COMMENT_CLASS)
+        stars_container = section.find(class_=STARS_CLASS)
+        stars_div = stars_container.find('div') if stars_container else None
+        if comment is None or stars_div is None:
+            continue # only take reviews having both a comment and stars
+        comments.append(comment.get_text())
+        stars.append(sum(1 for svg in stars_div.find_all('svg') if ' '.join(svg.get('class', [])) == ACTIVE_STAR_CLASS))
+    return comments, stars
@@ -0,0 +1,202 @@
+"""
+    Running CategoryCrawler, ProductCrawler and CommentStarCrawler at the same time, connected by bounded
+    in-memory queues: the products of a category are crawled for reviews as soon as they are in the
+    database. A stage whose output queue is full waits for the next stage, so memory stays bounded
+    whatever the speed of each stage.
+"""
+import queue
+import threading
+
+from crawlers import CategoryCrawler, PRODUCT_WORKERS, WORKERS
+from retry import MAX_ATTEMPTS
+
+
+# Hyperparameters
+CATEGORY_QUEUE_SIZE = 8 # categories found but not taken by the product stage yet
+PRODUCT_QUEUE_SIZE = 100 # product URLs found but not taken by the comment stage yet
+POLL_INTERVAL = 0.5 # seconds between two checks for a stopped pipeline while waiting on a full queue
+
+
+class PipelineStopped(Exception):
+    """
+        Raised in a stage waiting on a full queue when the next stage has stopped reading it.
+    """
+
+
+class StageQueue():
+    """
+        Bounded queue between two stages. put() blocks while the queue is full, and gives up once the next
+        stage has stopped, so a stage doesn't wait forever for a stage that has failed. Iterating over the
+        queue yields the items until the previous stage closes it.
+    """
+    END = object() # put after the last item
+
+    def __init__(self, maxsize) -> None:
+        """
+            Initializing StageQueue.
+            Args:
+                maxsize (int): Items waiting at most.
+        """
+        self.__queue = queue.Queue(maxsize=maxsize)
+        self.__stopped = threading.Event() # the next stage doesn't read anymore
+        self.items = 0 # items put
+        self.peak = 0 # most items waiting at the same time
+
+    def __put(self, item):
+        """
+            Putting an item, waiting while the queue is full.
+            Args:
+                item: The item, or END.
+        """
+        while True:
+            if self.__stopped.is_set():
+                raise PipelineStopped('the next stage of the pipeline has stopped')
+            try:
+                self.__queue.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue # backpressure, the next stage is behind
+
+    def put(self, item):
+        """
+            Handing an item to the next stage.
+            Args:
+                item: The item.
+        """
+        self.__put(item)
+        self.items += 1
+        self.peak = max(self.peak, self.__queue.qsize())
+
+    def close(self):
+        """
+            Telling the next stage that no more items are coming.
+        """
+        try:
+            self.__put(StageQueue.END)
+        except PipelineStopped:
+            pass # nobody is reading anymore
+
+    def stop(self):
+        """
+            Telling the previous stage that no more items are read.
+        """
+        self.__stopped.set()
+
+    def __iter__(self):
+        while True:
+            item = self.__queue.get()
+            if item is StageQueue.END:
+                return
+            yield item
+
+
+class Pipeline():
+    """
+        Crawling categories, products and reviews in one run. The category stage loads the home page once,
+        the product stage crawls categories with its own workers, the comment stage crawls products with
+        its own workers. The crawlers share the driver pool, the writer, the frontier and the metrics.
+    """
+    def __init__(self, category_crawler, product_crawler, comment_crawler, category_queue_size=CATEGORY_QUEUE_SIZE,
+                 product_queue_size=PRODUCT_QUEUE_SIZE) -> None:
+        """
+            Initializing Pipeline.
+            Args:
+                category_crawler (CategoryCrawler): The category stage.
+                product_crawler (ProductCrawler): The product stage.
+                comment_crawler (CommentStarCrawler): The comment stage.
+                category_queue_size (int): Categories waiting for the product stage at most.
+                product_queue_size (int): Product URLs waiting for the comment stage at most.
+        """
+        self.category_crawler = category_crawler
+        self.product_crawler = product_crawler
+        self.comment_crawler = comment_crawler
+        self.categories = StageQueue(category_queue_size)
+        self.products = StageQueue(product_queue_size)
+        self.__errors = [] # (stage, exception) of the failed stages
+
+    def __run_stage(self, name, run, input=None, output=None):
+        """
+            Running a stage. When it ends, the stage feeding it is stopped and its output queue is closed,
+            so a failing stage stops the stages before it while the stages after it finish the items
+            already queued.
+            Args:
+                name (str): Name of the stage.
+                run (function): Runs the stage.
+                input (StageQueue): Queue read by the stage, None for the first stage.
+                output (StageQueue): Queue read by the next stage, None for the last stage.
+        """
+        try:
+            run()
+        except PipelineStopped:
+            print(f'Pipeline: {name} stage stopped.')
+        except BaseException as e:
+            self.__errors.append((name, e))
+        finally:
+            if input is not None:
+                input.stop()
+            if output is not None:
+                output.close()
+
+    def __crawl_categories(self, max_age=None):
+        """
+            Getting the categories and handing them to the product stage.
+            Args:
+                max_age (float): Seconds the categories saved by an earlier run are reused, None to
+                always get them.
+        """
+        self.category_crawler.get_categories(max_age=max_age)
+        for category in CategoryCrawler.categories_urls_dict.items():
+            self.categories.put(category)
+
+    def __hand_over_products(self, category_name, urls):
+        """
+            Handing the products of a category to the comment stage.
+            Args:
+                category_name (str): Name of the category.
+                urls (list): URLs of its products.
+        """
+        for url in urls:
+            self.products.put(url)
+
+    def run(self, product_workers=PRODUCT_WORKERS, workers=WORKERS, max_attempts=MAX_ATTEMPTS, resume=False, incremental=False,
+            category_max_age=None):
+        """
+            Running the three stages until the last product is crawled.
+            Args:
+                product_workers (int): Number of categories crawled at the same time.
+                workers (int): Number of products crawled at the same time.
+                max_attempts (int): Number of times a page is loaded before giving up on it.
+                resume (bool): True to skip the categories and products done by a previous run.
+                incremental (bool): True to also crawl the stored products whose listing shows new ratings,
+                see ProductCrawler.get_products.
+                category_max_age (float): Seconds the categories saved by an earlier run are reused, None
+                to always get them.
+        """
+        stages = [
+            threading.Thread(target=self.__run_stage, daemon=True, args=('category', lambda: self.__crawl_categories(category_max_age),
+                                                                         None, self.categories)),
+            threading.Thread(target=self.__run_stage, daemon=True, args=('product', lambda: self.product_crawler.get_products(
+                max_attempts=max_attempts, resume=resume, workers=product_workers, categories=self.categories,
+                on_products=self.__hand_over_products, incremental=incremental), self.categories, self.products)),
+        ]
+        for stage in stages:
+            stage.start()
+        # the comment stage runs in the calling thread, so an interrupt stops the stages before it
+        self.__run_stage('comment', lambda: self.comment_crawler.get_stars_comments(
+            workers=workers, max_attempts=max_attempts, resume=resume, urls=self.products, incremental=incremental), self.products)
+        for stage in stages:
+            stage.join()
+        self.report()
+        if self.__errors:
+            name, error = self.__errors[0]
+            print(f'Pipeline: the {name} stage failed.')
+            raise error
+
+    def report(self):
+        """
+            Printing the items handed over, the queue peaks and the time to the first results to stdout.
+        """
+        first = self.comment_crawler.metrics.summary()['first'].get('items', {})
+        print('Pipeline: {} categories (peak {} queued), {} products (peak {} queued), first product after {}, first review after {}'.format(
+            self.categories.items, self.categories.peak, self.products.items, self.products.peak,
+            *('{:.1f} s'.format(first[kind]) if kind in first else 'never' for kind in ('product', 'review'))))
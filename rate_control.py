@@ -0,0 +1,193 @@
+"""
+    Pacing of the page loads per host. Every host has a concurrency limit (pages loading at the same
+    time) and a rate limit (a token bucket of page loads per second), both adapted with AIMD: a timeout,
+    a login wall or a 429/5xx answer cuts them by DECREASE, successes raise them step by step, so the
+    crawl settles at the speed the site tolerates.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import TimeoutException # raised by a page load that took too long
+
+from metrics import Metrics
+
+
+# Hyperparameters
+MAX_CONCURRENCY = 8 # page loads in flight per host at most
+INITIAL_RATE = 5.0 # page loads per second per host at the start
+MIN_RATE = 0.2 # page loads per second per host at least
+MAX_RATE = 50.0 # page loads per second per host at most
+RATE_STEP = 0.5 # page loads per second added after a second worth of successes
+DECREASE = 0.5 # factor applied to both limits on a timeout or a login wall
+COOLDOWN = 5 # seconds after a decrease during which other failures don't cut again, they come from the same burst
+
+
+class HostLimit():
+    """
+        Limits and usage of one host.
+    """
+    def __init__(self, concurrency, rate) -> None:
+        self.concurrency = concurrency # float, int(concurrency) pages may load at the same time
+        self.rate = rate # page loads per second
+        self.tokens = 1.0 # the first page loads right away
+        self.refilled = time.monotonic()
+        self.in_flight = 0
+        self.decreased = float('-inf') # time of the last decrease
+        self.successes = 0
+        self.failures = 0
+
+    def refill(self, now):
+        """
+            Adding the tokens earned since the last refill, at most a second worth of them.
+        """
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+
+class RateController():
+    """
+        Per-host AIMD concurrency and rate limits, shared by the crawlers, their workers and the HTTP
+        backend. A page load or a request takes a slot and reports timeouts, login walls and throttled
+        answers.
+    """
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, initial_rate=INITIAL_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, metrics=None) -> None:
+        """
+            Initializing RateController.
+            Args:
+                max_concurrency (int): Page loads in flight per host at most, also the starting limit.
+                initial_rate (float): Page loads per second per host at the start.
+                min_rate (float): Page loads per second per host at least.
+                max_rate (float): Page loads per second per host at most.
+                metrics (Metrics): Gauges of the current limits, a private one is created if None.
+        """
+        self.max_concurrency = max_concurrency
+        self.initial_rate = min(max(initial_rate, min_rate), max_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.metrics = metrics or Metrics()
+        self.__hosts = {} # host -> HostLimit
+        self.__condition = threading.Condition() # released slots and raised limits wake the waiting workers
+        self.waited = 0.0 # seconds spent waiting for a slot
+
+    def __host(self, url):
+        """
+            Getting the limits of the host of a URL. Called with the lock held.
+        """
+        host = urlsplit(url).netloc
+        if host not in self.__hosts:
+            self.__hosts[host] = HostLimit(self.max_concurrency, self.initial_rate)
+            self.__publish(host, self.__hosts[host])
+        return host, self.__hosts[host]
+
+    def __publish(self, host, limit):
+        self.metrics.set('concurrency_limit', int(limit.concurrency), host)
+        self.metrics.set('rate_limit', limit.rate, host)
+
+    def acquire(self, url):
+        """
+            Waiting until the host of a URL has a free slot and a token.
+            Args:
+                url (str): URL of the page to load.
+        """
+        start = time.monotonic()
+        with self.__condition:
+            _, limit = self.__host(url)
+            while True:
+                now = time.monotonic()
+                limit.refill(now)
+                if limit.in_flight < int(limit.concurrency) and limit.tokens >= 1:
+                    limit.tokens -= 1
+                    limit.in_flight += 1
+                    break
+                # woken by a release, otherwise when the next token is earned
+                self.__condition.wait(None if limit.in_flight >= int(limit.concurrency) else (1 - limit.tokens) / limit.rate)
+            self.waited += time.monotonic() - start
+
+    def release(self, url):
+        """
+            Freeing the slot taken by acquire.
+            Args:
+                url (str): URL of the page loaded.
+        """
+        with self.__condition:
+            _, limit = self.__host(url)
+            limit.in_flight -= 1
+            self.__condition.notify_all()
+
+    def success(self, url):
+        """
+            Raising the limits of a host after a page loaded: one more slot after as many successes as
+            slots, RATE_STEP more page loads per second after a second worth of successes.
+            Args:
+                url (str): URL of the page loaded.
+        """
+        with self.__condition:
+            host, limit = self.__host(url)
+            limit.successes += 1
+            limit.concurrency = min(self.max_concurrency, limit.concurrency + 1 / limit.concurrency)
+            limit.rate = min(self.max_rate, limit.rate + RATE_STEP / limit.rate)
+            self.__publish(host, limit)
+            self.__condition.notify_all()
+
+    def failure(self, url, reason):
+        """
+            Cutting the limits of a host after a timeout, a login wall or a throttled answer, once per COOLDOWN.
+            Args:
+                url (str): URL of the page.
+                reason (str): 'timeout', 'login' or 'status <code>'.
+        """
+        with self.__condition:
+            host, limit = self.__host(url)
+            limit.failures += 1
+            now = time.monotonic()
+            if now - limit.decreased < COOLDOWN:
+                return
+            limit.decreased = now
+            limit.concurrency = max(1.0, limit.concurrency * DECREASE)
+            limit.rate = max(self.min_rate, limit.rate * DECREASE)
+            limit.tokens = min(limit.tokens, 0.0) # the next page waits for a token at the new rate
+            self.__publish(host, limit)
+            print(f'RateController: {reason} on {host}, down to {int(limit.concurrency)} pages at a time and {limit.rate:.2f} pages per second.')
+
+    @contextmanager
+    def slot(self, url, report=True):
+        """
+            Loading a page within the limits of its host. A TimeoutException raised by the block cuts the
+            limits, a block that returns raises them unless report is False.
+            Args:
+                url (str): URL of the page.
+                report (bool): False when the caller checks the page first (login wall, status code) and
+                reports it with success() or failure() itself.
+        """
+        self.acquire(url)
+        try:
+            yield
+        except TimeoutException:
+            self.failure(url, 'timeout')
+            raise
+        else:
+            if report:
+                self.success(url)
+        finally:
+            self.release(url)
+
+    def limits(self):
+        """
+            Getting the current limits.
+            Returns:
+                limits (dict): Host -> concurrency, rate, in_flight, successes and failures.
+        """
+        with self.__condition:
+            return dict((host, {'concurrency': int(limit.concurrency), 'rate': limit.rate, 'in_flight': limit.in_flight,
+                                'successes': limit.successes, 'failures': limit.failures}) for host, limit in self.__hosts.items())
+
+    def report(self):
+        """
+            Printing the limits of every host and the time spent waiting for them to stdout.
+        """
+        for host, limit in self.limits().items():
+            print('RateController: {}, {} pages at a time, {:.2f} pages per second, {} successes, {} failures'.format(
+                host, limit['concurrency'], limit['rate'], limit['successes'], limit['failures']))
+        print('RateController: {:.1f} seconds waited for a slot'.format(self.waited))
@@ -0,0 +1,142 @@
+import heapq # pending retries ordered by next-attempt time
+import itertools
+import random # jitter of the backoff
+import time
+from collections import deque
+
+
+# Hyperparameters
+MAX_ATTEMPTS = 5 # an item failing this many times goes to the dead letters
+BASE_DELAY = 2 # seconds before the first retry, doubled after every failure
+MAX_DELAY = 60 # seconds, upper bound of the backoff
+JITTER = 0.5 # the delay is randomly scaled by 1 +/- JITTER so retries don't fire together
+
+
+class RetryScheduler():
+    """
+        Scheduling failed items (URLs or (category name, URL) pairs) for another attempt with exponential
+        backoff and jitter. Items are kept in a heap keyed on the time of their next attempt, and items
+        failing max_attempts times are moved to a dead-letter list instead of being retried forever.
+        Only the thread driving the crawl uses it.
+    """
+    def __init__(self, max_attempts=MAX_ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY, jitter=JITTER) -> None:
+        """
+            Initializing RetryScheduler.
+            Args:
+                max_attempts (int): Number of failed attempts after which an item is dead-lettered.
+                base_delay (float): Seconds before the first retry.
+                max_delay (float): Upper bound of the delay in seconds.
+                jitter (float): Fraction of the delay added or removed at random.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.__heap = [] # (next attempt time, sequence number, item)
+        self.__sequence = itertools.count() # keeps items scheduled at the same time in FIFO order
+        self.__attempts = {} # item -> failed attempts
+        self.dead_letters = [] # (item, attempts) given up on
+        self.retries = 0 # number of retries handed out
+
+    def __len__(self):
+        return len(self.__heap)
+
+    def delay(self, attempts):
+        """
+            Computing the backoff before the next attempt.
+            Args:
+                attempts (int): Failed attempts so far.
+            Returns:
+                delay (float): Seconds to wait.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def schedule(self, item):
+        """
+            Recording a failed attempt of an item, scheduling it again or dead-lettering it.
+            Args:
+                item: The failed item, it must be hashable.
+            Returns:
+                True if the item will be retried, False if it was dead-lettered.
+        """
+        attempts = self.__attempts.get(item, 0) + 1
+        self.__attempts[item] = attempts
+        if attempts >= self.max_attempts:
+            print(f'Giving up on {item} after {attempts} attempts.')
+            self.dead_letters.append((item, attempts))
+            return False
+        heapq.heappush(self.__heap, (time.monotonic() + self.delay(attempts), next(self.__sequence), item))
+        return True
+
+    def pop_due(self):
+        """
+            Taking every item whose next attempt is due.
+            Returns:
+                items (list): Items to be retried now, the earliest first.
+        """
+        now = time.monotonic()
+        items = []
+        while self.__heap and self.__heap[0][0] <= now:
+            items.append(heapq.heappop(self.__heap)[2])
+        self.retries += len(items)
+        return items
+
+    def next_delay(self):
+        """
+            Computing the time until the next retry is due.
+            Returns:
+                delay (float): Seconds to wait, None if nothing is scheduled.
+        """
+        if not self.__heap:
+            return None
+        return max(0, self.__heap[0][0] - time.monotonic())
+
+    def report(self):
+        """
+            Printing the number of retries and dead letters to stdout.
+        """
+        print('RetryScheduler: {} retries, {} items given up on'.format(self.retries, len(self.dead_letters)))
+
+
+def run_with_retries(crawl, items, scheduler, failed, executor=None, window=1):
+    """
+        Crawling items and retrying the failed ones. Due retries are started before fresh items, so they
+        overlap with the fresh work instead of waiting for a separate pass at the end. Results are yielded
+        in the order the items were started.
+        Args:
+            crawl (callable): Crawls one item and returns its result.
+            items (iterable): Fresh items.
+            scheduler (RetryScheduler): Scheduler of the failed items.
+            failed (callable): Returns True if a result has to be retried.
+            executor (ThreadPoolExecutor): Pool of workers, None to crawl in the current thread.
+            window (int): Maximum number of items started but not yielded yet.
+        Returns:
+            results (iterator): (item, result) for every item that didn't fail. Failed attempts are
+            scheduled again and not yielded.
+    """
+    items = iter(items)
+    running = deque() # (item, future), the future is None when crawling in the current thread
+    exhausted = False
+    while True:
+        for item in scheduler.pop_due(): # retries first, they have already waited their backoff
+            running.append((item, executor.submit(crawl, item) if executor is not None else None))
+        while not exhausted and len(running) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            running.append((item, executor.submit(crawl, item) if executor is not None else None))
+
+        if running:
+            item, future = running.popleft()
+            result = future.result() if future is not None else crawl(item)
+            if failed(result):
+                scheduler.schedule(item)
+            else:
+                yield item, result
+        elif len(scheduler):
+            time.sleep(scheduler.next_delay()) # nothing else to do until the next retry is due
+        else:
+            return
@@ -0,0 +1,49 @@
+"""
+    Full-text search over the scraped comments. The comments_fts table (SQLite FTS5) holds every
+    comment twice: as written, to match accents exactly, and folded (no diacritics, 'đ' written 'd',
+    lowercase), so "san pham dep" finds "Sản phẩm đẹp".
+"""
+import re
+import unicodedata
+
+
+WORD_PATTERN = re.compile(r'\w+') # words of a query, FTS5 operators and quotes are dropped
+
+
+def fold(text):
+    """
+        Removing Vietnamese diacritics from a text.
+        Args:
+            text (str): The text.
+        Returns:
+            text (str): Lowercase text without diacritics, 'đ' is replaced with 'd'.
+    """
+    text = text.lower().replace('đ', 'd') # đ is a letter of its own, it has no decomposition
+    return ''.join(c for c in unicodedata.normalize('NFD', text) if not unicodedata.combining(c))
+
+
+def index_rows(rows):
+    """
+        Building the rows of comments_fts.
+        Args:
+            rows (iterable): (id, comment) of comments_stars.
+        Returns:
+            rows (iterator): (rowid, comment, folded comment).
+    """
+    return ((comment_id, comment, fold(comment)) for comment_id, comment in rows)
+
+
+def match_query(query, accents=False):
+    """
+        Turning a search query into an FTS5 MATCH expression. Every word has to be found, in any order.
+        Args:
+            query (str): Words typed by the user.
+            accents (bool): True to match the accents of the words exactly, False to ignore them.
+        Returns:
+            expression (str): The MATCH expression, None if the query has no word.
+    """
+    words = WORD_PATTERN.findall(query if accents else fold(query))
+    if not words:
+        return None
+    column = 'comment' if accents else 'folded'
+    return '{} : ({})'.format(column, ' '.join(f'"{word}"' for word in words))
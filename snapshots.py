@@ -0,0 +1,190 @@
+"""
+    Content-addressed store of the HTML of crawled pages, so extraction can be re-run offline when a
+    class name changes instead of crawling again. Pages are gzip-compressed and stored once per content
+    (sha256), an SQLite index maps canonical URLs and fetch times to them. Snapshots older than the TTL
+    are dropped and the least recently used contents are evicted above the size cap.
+"""
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from parsers import canonical_product_url
+
+
+# Hyperparameters
+SNAPSHOT_DIR = 'snapshots'
+TTL = 7 * 24 * 3600 # seconds a snapshot is kept
+MAX_BYTES = 1024 ** 3 # compressed bytes kept on disk
+EVICTION_RATIO = 0.9 # eviction goes down to this fraction of MAX_BYTES, so it doesn't run on every save
+
+
+class SnapshotStore():
+    """
+        Saving and loading page snapshots. Crawler workers share one store.
+    """
+    def __init__(self, root=SNAPSHOT_DIR, ttl=TTL, max_bytes=MAX_BYTES) -> None:
+        """
+            Initializing SnapshotStore, expired snapshots are dropped.
+            Args:
+                root (str): Directory of the store.
+                ttl (float): Seconds a snapshot is kept, None to keep snapshots until they are evicted.
+                max_bytes (int): Compressed bytes kept on disk.
+        """
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(root, 'index.db'), isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS snapshots (id INTEGER PRIMARY KEY, url TEXT NOT NULL, kind TEXT NOT NULL, "
+                                "fetched REAL NOT NULL, digest TEXT NOT NULL REFERENCES objects(digest), meta TEXT)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url, fetched)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS snapshots_digest ON snapshots (digest)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS objects_last_access ON objects (last_access)")
+        self.__lock = threading.Lock()
+        self.size = self.connection.execute("SELECT IFNULL(SUM(size), 0) FROM objects").fetchone()[0] # compressed bytes on disk
+        self.saved = 0 # snapshots saved
+        self.evicted = 0 # contents removed from disk
+        self.evict()
+
+    def object_path(self, digest):
+        """
+            Getting the path of a stored content.
+            Args:
+                digest (str): sha256 of the content.
+            Returns:
+                path (str): Path of the compressed file.
+        """
+        return os.path.join(self.root, 'objects', digest[:2], digest + '.html.gz')
+
+    def save(self, url, kind, html, meta=None):
+        """
+            Saving the HTML of a page.
+            Args:
+                url (str): URL of the page, product URLs are stored without tracking parameters. Pages
+                shown in place by a next button are told apart by a '#page=<n>' fragment.
+                kind (str): 'home', 'category' or 'product'.
+                html (str): HTML of the page.
+                meta (dict): What the offline extraction needs besides the HTML, e.g. the category name.
+            Returns:
+                digest (str): sha256 of the content.
+        """
+        if kind == 'product':
+            url, _, page = url.partition('#')
+            url = canonical_product_url(url) + ('#' + page if page else '')
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        now = time.time()
+        with self.__lock:
+            exists = self.connection.execute("SELECT 1 FROM objects WHERE digest = ?", (digest, )).fetchone()
+            if not exists:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                compressed = gzip.compress(data)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(path + '.tmp', path) # a reader never sees half of a file
+                self.size += len(compressed)
+            self.connection.execute("BEGIN")
+            self.connection.execute("INSERT INTO objects (digest, size, last_access) VALUES (?, ?, ?) ON CONFLICT (digest) DO UPDATE SET last_access = excluded.last_access",
+                                    (digest, 0 if exists else len(compressed), now))
+            self.connection.execute("INSERT INTO snapshots (url, kind, fetched, digest, meta) VALUES (?, ?, ?, ?, ?)",
+                                    (url, kind, now, digest, json.dumps(meta or {}, ensure_ascii=False)))
+            self.connection.execute("COMMIT")
+            self.saved += 1
+        if self.size > self.max_bytes:
+            self.evict()
+        return digest
+
+    def load(self, digest):
+        """
+            Loading a stored content, marking it as recently used.
+            Args:
+                digest (str): sha256 of the content.
+            Returns:
+                html (str): HTML of the page.
+        """
+        with self.__lock:
+            self.connection.execute("UPDATE objects SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        return read_object(self.object_path(digest))
+
+    def latest(self, kind=None):
+        """
+            Listing the latest snapshot of every URL.
+            Args:
+                kind (str): 'home', 'category' or 'product', None for all of them.
+            Returns:
+                snapshots (list): (url, kind, fetched, digest, meta) tuples, meta is a dict.
+        """
+        # the newest row of every (url, kind), ties on fetched go to the last one saved
+        query = ("SELECT url, kind, fetched, digest, meta FROM (SELECT id, url, kind, fetched, digest, meta, "
+                 "ROW_NUMBER() OVER (PARTITION BY url, kind ORDER BY fetched DESC, id DESC) AS rank FROM snapshots"
+                 + (" WHERE kind = ?" if kind else "") + ") WHERE rank = 1 ORDER BY id")
+        with self.__lock:
+            rows = self.connection.execute(query, (kind, ) if kind else ()).fetchall()
+        return [(url, kind, fetched, digest, json.loads(meta)) for url, kind, fetched, digest, meta in rows]
+
+    def __remove_objects(self, digests):
+        """
+            Deleting contents and their snapshots. Called with the lock held.
+            Args:
+                digests (list): sha256 of the contents.
+        """
+        for digest in digests:
+            size = self.connection.execute("SELECT size FROM objects WHERE digest = ?", (digest, )).fetchone()
+            self.connection.execute("DELETE FROM snapshots WHERE digest = ?", (digest, ))
+            self.connection.execute("DELETE FROM objects WHERE digest = ?", (digest, ))
+            try:
+                os.remove(self.object_path(digest))
+            except FileNotFoundError:
+                pass
+            self.size -= size[0] if size else 0
+            self.evicted += 1
+
+    def evict(self):
+        """
+            Dropping expired snapshots, then the least recently used contents until the store is below
+            EVICTION_RATIO of max_bytes.
+        """
+        with self.__lock:
+            self.connection.execute("BEGIN")
+            if self.ttl is not None:
+                self.connection.execute("DELETE FROM snapshots WHERE fetched < ?", (time.time() - self.ttl, ))
+            unused = [digest for digest, in self.connection.execute(
+                "SELECT digest FROM objects WHERE NOT EXISTS (SELECT 1 FROM snapshots WHERE snapshots.digest = objects.digest)")]
+            self.__remove_objects(unused)
+            while self.size > self.max_bytes * EVICTION_RATIO:
+                oldest = [digest for digest, in self.connection.execute("SELECT digest FROM objects ORDER BY last_access LIMIT 100")]
+                if not oldest:
+                    break
+                self.__remove_objects(oldest)
+            self.connection.execute("COMMIT")
+
+    def report(self):
+        """
+            Printing the size of the store to stdout.
+        """
+        print('SnapshotStore: {} snapshots saved, {} contents evicted, {:.1f} MB on disk'.format(self.saved, self.evicted, self.size / 1024 ** 2))
+
+    def close(self):
+        """
+            Closing the index.
+        """
+        self.connection.close()
+
+
+def read_object(path):
+    """
+        Reading a compressed content, usable in other processes without opening the index.
+        Args:
+            path (str): Path of the compressed file, see SnapshotStore.object_path.
+        Returns:
+            html (str): HTML of the page.
+    """
+    with gzip.open(path, 'rb') as f:
+        return f.read().decode('utf-8')
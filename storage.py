@@ -0,0 +1,438 @@
+import sqlite3 # executemany and explicit transactions, which cs50.SQL doesn't expose
+import threading
+import time
+from collections import namedtuple
+
+from migrations import migrate # creates and upgrades the schema
+from metrics import Metrics # time spent writing batches
+from parsers import product_key, review_fingerprint # products are identified by their item, not by the URL string
+from search import index_rows # keeps the full-text index of the comments in sync
+
+
+# Hyperparameters
+DATABASE_PATH = 'data.db'
+BATCH_SIZE = 500 # rows buffered before they are written in one transaction
+FLUSH_INTERVAL = 5 # seconds, buffered rows older than this are written on the next insert
+
+# Status of a category (stage 'category', keyed by name) or a product (stage 'product', keyed by URL)
+PENDING = 'pending'
+IN_FLIGHT = 'in-flight'
+DONE = 'done'
+FAILED = 'failed'
+
+# What the last crawl of a product knows of its reviews, see migration 7: listed is the number of ratings
+# shown by the last listing, review_count the one shown when its reviews were last crawled (None when the
+# listing doesn't show it), fingerprint identifies the newest review and stored is the number of reviews
+# stored by then.
+Watermark = namedtuple('Watermark', ['listed', 'review_count', 'fingerprint', 'stored'])
+
+
+class CrawlWriter():
+    """
+        Write-behind storage for crawl results. Rows are buffered in memory and flushed with executemany
+        inside one transaction per batch. Category-name to id and product-url to id mappings are kept in
+        memory so the crawlers never query the database for them. Products are keyed by item
+        (i.<shop id>.<item id>), so a product added again under another URL keeps its first row.
+        The crawl state of every category and product is kept in the crawl_state table and written in the
+        same transactions, so a product is only marked done once its comments are committed. So are the
+        rating aggregates of the products and categories of the comments, their full-text index, the
+        review watermarks of the products, which tell an incremental crawl the products with new reviews,
+        and the 'review' keys of the Frontier, so a product is never skipped for reviews that weren't committed.
+        Its methods can be called from several threads, CommentStarCrawler workers add their pages of
+        reviews directly. The database is opened (and migrated) on first use, so a run that stops before
+        writing anything doesn't pay for it.
+    """
+    def __init__(self, path=DATABASE_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, metrics=None) -> None:
+        """
+            Initializing CrawlWriter, the database isn't opened yet.
+            Args:
+                path (str): Path to the SQLite database.
+                batch_size (int): Number of buffered rows that triggers a flush.
+                flush_interval (float): Seconds after which buffered rows are flushed on the next insert.
+                metrics (Metrics): Timings of the crawl, a private one is created if None.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics or Metrics()
+        self.__connection = None
+        self.__lock = threading.RLock() # the add methods may flush while holding it
+        self.__categories = {} # category name -> id
+        self.__products = {} # product key -> id
+        self.__pending_categories = [] # (name, url)
+        self.__pending_products = [] # (url, category_id, product key)
+        self.__pending_comments = [] # (comment, stars, product_id)
+        self.__pending_states = {} # (stage, item) -> status, the latest status wins
+        self.__pending_crawled = set() # ids of the products whose comments are buffered, even if there are none
+        self.__pending_listed = {} # product key -> number of ratings shown in the listing
+        self.__pending_watermarks = {} # product key -> (product id, fingerprint of the newest review) of the products done
+        self.__stored_reviews = {} # product key -> reviews stored while the product isn't done yet
+        self.__last_flush = time.monotonic()
+        self.flushes = 0 # number of transactions committed
+        self.rows = 0 # number of rows written
+
+    def __open(self):
+        """
+            Opening and migrating the database, and loading the category ids, the first time it is used.
+            Product ids are looked up one by one by product_id().
+            Returns:
+                connection (sqlite3.Connection): Connection to the database.
+        """
+        with self.__lock:
+            if self.__connection is None:
+                connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False) # transactions are opened explicitly
+                connection.execute("PRAGMA journal_mode=WAL") # readers (the web app) don't block the writer
+                connection.execute("PRAGMA synchronous=NORMAL") # fsync at checkpoints only, safe with WAL
+                migrate(connection)
+                # names are unique since schema version 4
+                self.__categories.update((name, category_id) for category_id, name in connection.execute("SELECT id, name FROM categories"))
+                self.__connection = connection
+            return self.__connection
+
+    @property
+    def connection(self):
+        """
+            Connection to the database, opened on first use.
+        """
+        return self.__connection or self.__open()
+
+    def __pending(self):
+        """
+            Counting buffered rows.
+            Returns:
+                count (int): Number of rows waiting to be written.
+        """
+        return (len(self.__pending_categories) + len(self.__pending_products) + len(self.__pending_comments) + len(self.__pending_states)
+                + len(self.__pending_listed) + len(self.__pending_watermarks))
+
+    def __maybe_flush(self):
+        """
+            Flushing when the batch is full or the oldest buffered rows are older than flush_interval.
+        """
+        if self.__pending() >= self.batch_size or time.monotonic() - self.__last_flush >= self.flush_interval:
+            self.flush()
+
+    def __insert(self, table, columns, rows, mapping, key, conflict):
+        """
+            Inserting rows into a table and adding the new ids to an in-memory mapping.
+            Args:
+                table (str): Name of the table, 'categories' or 'products'.
+                columns (tuple): Names of the inserted columns.
+                rows (list): Rows to be inserted.
+                mapping (dict): Key -> id mapping to be updated.
+                key (str): Unique column used as the mapping key.
+                conflict (str): ON CONFLICT clause for rows whose key already exists.
+        """
+        last_id = self.connection.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table}").fetchone()[0]
+        placeholders = ', '.join('?' * len(columns))
+        self.connection.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) ON CONFLICT ({key}) {conflict}", rows)
+        for row_id, value in self.connection.execute(f"SELECT id, {key} FROM {table} WHERE id > ? ORDER BY id", (last_id, )):
+            mapping[value] = row_id
+
+    def __write_states(self):
+        """
+            Writing buffered crawl states. A pending status never overwrites an existing one, so adding
+            products again doesn't reset products already done.
+        """
+        now = time.time()
+        pending = [(stage, item, now) for (stage, item), status in self.__pending_states.items() if status == PENDING]
+        others = [(stage, item, status, now) for (stage, item), status in self.__pending_states.items() if status != PENDING]
+        self.connection.executemany(f"INSERT OR IGNORE INTO crawl_state (stage, item, status, updated) VALUES (?, ?, '{PENDING}', ?)", pending)
+        self.connection.executemany("INSERT INTO crawl_state (stage, item, status, updated) VALUES (?, ?, ?, ?) "
+                                    "ON CONFLICT (stage, item) DO UPDATE SET status = excluded.status, updated = excluded.updated", others)
+
+    def __update_aggregates(self):
+        """
+            Adding the buffered comments to the rating aggregates of their products and categories, in
+            the transaction inserting them.
+        """
+        deltas = {('product', product_id): [0] * 7 for product_id in self.__pending_crawled} # (kind, id) -> [stars_1, ..., stars_5, reviews, stars_sum]
+        for _, stars, product_id in self.__pending_comments:
+            delta = deltas.setdefault(('product', product_id), [0] * 7)
+            if 1 <= stars <= 5:
+                delta[stars - 1] += 1
+            delta[5] += 1
+            delta[6] += stars
+        product_ids = [item_id for _, item_id in deltas]
+        for start in range(0, len(product_ids), 500): # stays below the limit of SQL variables
+            chunk = product_ids[start:start + 500]
+            for product_id, category_id in self.connection.execute(f"SELECT id, category_id FROM products WHERE id IN ({', '.join('?' * len(chunk))})", chunk):
+                category = deltas.setdefault(('category', category_id), [0] * 7)
+                for i, value in enumerate(deltas[('product', product_id)]):
+                    category[i] += value
+        now = time.time()
+        self.connection.executemany(
+            "INSERT INTO rating_aggregates (kind, item_id, stars_1, stars_2, stars_3, stars_4, stars_5, reviews, stars_sum, last_crawled) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (kind, item_id) DO UPDATE SET "
+            "stars_1 = stars_1 + excluded.stars_1, stars_2 = stars_2 + excluded.stars_2, stars_3 = stars_3 + excluded.stars_3, "
+            "stars_4 = stars_4 + excluded.stars_4, stars_5 = stars_5 + excluded.stars_5, reviews = reviews + excluded.reviews, "
+            "stars_sum = stars_sum + excluded.stars_sum, last_crawled = excluded.last_crawled",
+            [(kind, item_id, *delta, now) for (kind, item_id), delta in deltas.items()])
+
+    def __write_watermarks(self):
+        """
+            Writing the buffered listing counts, then the watermarks of the products done, after their
+            rating aggregates: the count shown by the listing becomes the count of their last crawl.
+        """
+        now = time.time()
+        self.connection.executemany("INSERT INTO review_watermarks (item_key, listed, updated) VALUES (?, ?, ?) "
+                                    "ON CONFLICT (item_key) DO UPDATE SET listed = excluded.listed, updated = excluded.updated",
+                                    [(key, count, now) for key, count in self.__pending_listed.items()])
+        self.connection.executemany(
+            "INSERT INTO review_watermarks (item_key, fingerprint, stored, updated) "
+            "VALUES (?, ?, IFNULL((SELECT reviews FROM rating_aggregates WHERE kind = 'product' AND item_id = ?), 0), ?) "
+            "ON CONFLICT (item_key) DO UPDATE SET review_count = listed, fingerprint = IFNULL(excluded.fingerprint, fingerprint), "
+            "stored = excluded.stored, updated = excluded.updated",
+            [(key, fingerprint, product_id, now) for key, (product_id, fingerprint) in self.__pending_watermarks.items()])
+
+    def flush(self):
+        """
+            Writing all buffered rows in one transaction.
+        """
+        with self.__lock:
+            if not self.__pending():
+                self.__last_flush = time.monotonic()
+                return
+            start = time.perf_counter()
+            self.connection.execute("BEGIN")
+            try:
+                if self.__pending_categories:
+                    self.__insert('categories', ('name', 'url'), self.__pending_categories, self.__categories,
+                                  key='name', conflict='DO UPDATE SET url = excluded.url') # the URL of a category may change
+                if self.__pending_products:
+                    self.__insert('products', ('url', 'category_id', 'item_key'), self.__pending_products, self.__products,
+                                  key='item_key', conflict='DO NOTHING') # an item keeps its first category
+                if self.__pending_comments:
+                    last_id = self.connection.execute("SELECT IFNULL(MAX(id), 0) FROM comments_stars").fetchone()[0]
+                    self.connection.executemany("INSERT INTO comments_stars (comment, stars, product_id) VALUES (?, ?, ?)", self.__pending_comments)
+                    self.connection.executemany("INSERT INTO comments_fts (rowid, comment, folded) VALUES (?, ?, ?)",
+                                                index_rows(self.connection.execute("SELECT id, comment FROM comments_stars WHERE id > ?", (last_id, )).fetchall()))
+                if self.__pending_crawled:
+                    self.__update_aggregates()
+                if self.__pending_states:
+                    self.__write_states()
+                if self.__pending_listed or self.__pending_watermarks:
+                    self.__write_watermarks()
+                if self.__pending_watermarks:
+                    self.connection.executemany("INSERT OR IGNORE INTO frontier (stage, key) VALUES ('review', ?)",
+                                                ((key, ) for key in self.__pending_watermarks)) # the products done, see Frontier.add
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.metrics.observe('db_write', time.perf_counter() - start)
+            self.rows += self.__pending()
+            self.flushes += 1
+            self.__pending_categories = []
+            self.__pending_products = []
+            self.__pending_comments = []
+            self.__pending_states = {}
+            self.__pending_crawled = set()
+            self.__pending_listed = {}
+            self.__pending_watermarks = {}
+            self.__last_flush = time.monotonic()
+
+    def category_id(self, name):
+        """
+            Looking up the id of a category, flushing first if the category is still buffered.
+            Args:
+                name (str): Name of the category.
+            Returns:
+                category_id (int): Id of the category, None if it doesn't exist.
+        """
+        with self.__lock:
+            self.__open() # loads the ids of the categories already in the database
+            if name not in self.__categories and any(name == pending[0] for pending in self.__pending_categories):
+                self.flush()
+            return self.__categories.get(name)
+
+    def product_id(self, url):
+        """
+            Looking up the id of a product, flushing first if the product is still buffered. Products
+            inserted by another process (ProductCrawler running next to CommentStarCrawler) are looked
+            up in the database.
+            Args:
+                url (str): URL of the product.
+            Returns:
+                product_id (int): Id of the product, None if it doesn't exist.
+        """
+        key = product_key(url)
+        with self.__lock:
+            if key not in self.__products and any(key == pending[2] for pending in self.__pending_products):
+                self.flush()
+            if key not in self.__products:
+                row = self.connection.execute("SELECT id FROM products WHERE item_key = ?", (key, )).fetchone()
+                if row is not None:
+                    self.__products[key] = row[0]
+            return self.__products.get(key)
+
+    def category_products(self, name):
+        """
+            Looking up the URLs of products of a category, flushing first.
+            Args:
+                name (str): Name of the category.
+            Returns:
+                urls (list): URLs of products, in the order they were added.
+        """
+        self.flush()
+        return [url for url, in self.connection.execute("SELECT url FROM products WHERE category_id = ? ORDER BY id", (self.category_id(name), ))]
+
+    def set_state(self, stage, item, status):
+        """
+            Buffering the crawl state of a category or a product.
+            Args:
+                stage (str): 'category' or 'product'.
+                item (str): Name of the category or URL of the product.
+                status (str): PENDING, IN_FLIGHT, DONE or FAILED.
+        """
+        with self.__lock:
+            if status != PENDING or (stage, item) not in self.__pending_states:
+                self.__pending_states[(stage, item)] = status
+            self.__maybe_flush()
+
+    def states(self, stage):
+        """
+            Loading the crawl states of a stage, flushing first.
+            Args:
+                stage (str): 'category' or 'product'.
+            Returns:
+                states (dict): Name or URL -> status.
+        """
+        self.flush()
+        return dict(self.connection.execute("SELECT item, status FROM crawl_state WHERE stage = ?", (stage, )))
+
+    def add_category(self, name, url):
+        """
+            Buffering a category.
+            Args:
+                name (str): Name of the category.
+                url (str): URL of the category.
+        """
+        with self.__lock:
+            self.__pending_categories.append((name, url))
+            self.__pending_states.setdefault(('category', name), PENDING)
+            self.__maybe_flush()
+
+    def add_products(self, category_name, urls, done=True):
+        """
+            Buffering URLs of products of a category, the category is marked done.
+            Args:
+                category_name (str): Name of the category.
+                urls (list): URLs of products.
+                done (bool): False to add products without marking their category done, e.g. products
+                whose category was crawled by another worker.
+        """
+        with self.__lock:
+            category_id = self.category_id(category_name)
+            if category_id is None:
+                raise KeyError(f'Category "{category_name}" is not in the database')
+            self.__pending_products.extend((url, category_id, product_key(url)) for url in urls)
+            for url in urls:
+                self.__pending_states.setdefault(('product', url), PENDING)
+            if done:
+                self.__pending_states[('category', category_name)] = DONE # committed together with the products
+            self.__maybe_flush()
+
+    def add_comments_stars(self, url, comments, stars, done=True, fingerprint=None):
+        """
+            Buffering comment, star pairs of a product, the product is marked done.
+            Args:
+                url (str): URL of the product.
+                comments (list): Comments of the product.
+                stars (list): Stars of the product, one per comment.
+                done (bool): False for a page of reviews, the product is marked done by the call after
+                its last page.
+                fingerprint (str): Fingerprint of the newest review of the product, kept in its watermark
+                when it is marked done. None to keep the one of its last crawl.
+        """
+        with self.__lock:
+            product_id = self.product_id(url)
+            if product_id is None:
+                raise KeyError(f'Product "{url}" is not in the database')
+            self.__pending_comments.extend((comment, star, product_id) for comment, star in zip(comments, stars))
+            self.__pending_crawled.add(product_id)
+            if done:
+                self.__stored_reviews.pop(product_key(url), None)
+                self.__pending_states[('product', url)] = DONE # committed together with the comments
+                self.__pending_watermarks[product_key(url)] = (product_id, fingerprint)
+            else:
+                self.__stored_reviews[product_key(url)] = self.stored_reviews(url) + len(comments)
+            self.__maybe_flush()
+
+    def stored_reviews(self, url):
+        """
+            Counting the reviews of a product stored before it is marked done, by an attempt that timed
+            out after a few pages or by a run that stopped, so crawling it again doesn't add them twice.
+            Args:
+                url (str): URL of the product.
+            Returns:
+                count (int): Number of reviews stored or buffered.
+        """
+        key = product_key(url)
+        with self.__lock:
+            if key not in self.__stored_reviews:
+                row = self.connection.execute("SELECT reviews FROM rating_aggregates WHERE kind = 'product' AND item_id = ?",
+                                              (self.product_id(url), )).fetchone()
+                self.__stored_reviews[key] = row[0] if row else 0
+            return self.__stored_reviews[key]
+
+    def set_listed_reviews(self, counts):
+        """
+            Buffering the number of ratings the listing of a category shows for its products.
+            Args:
+                counts (dict): Product key -> number of ratings.
+        """
+        with self.__lock:
+            self.__pending_listed.update(counts)
+            self.__maybe_flush()
+
+    def watermark(self, url):
+        """
+            Looking up the review watermark of a product, flushing first if it is still buffered.
+            Args:
+                url (str): URL of the product.
+            Returns:
+                watermark (Watermark): The watermark, None if the product was never listed with a count
+                nor crawled.
+        """
+        key = product_key(url)
+        with self.__lock:
+            if key in self.__pending_listed or key in self.__pending_watermarks:
+                self.flush()
+            row = self.connection.execute("SELECT listed, review_count, fingerprint, stored FROM review_watermarks WHERE item_key = ?",
+                                          (key, )).fetchone()
+            return Watermark(*row) if row else None
+
+    def stored_fingerprints(self, url):
+        """
+            Fingerprinting the reviews stored for a product, flushing first so the pages of an attempt
+            that timed out are included.
+            Args:
+                url (str): URL of the product.
+            Returns:
+                fingerprints (set): Fingerprints of its reviews, see review_fingerprint.
+        """
+        with self.__lock:
+            self.flush()
+            return set(review_fingerprint(comment, stars) for comment, stars in self.connection.execute(
+                "SELECT comment, stars FROM comments_stars WHERE product_id = ?", (self.product_id(url), )))
+
+    def reviews_changed(self, url):
+        """
+            Checking whether the listing shows ratings the last crawl of a product didn't, products whose
+            count isn't shown by the listing are always checked.
+            Args:
+                url (str): URL of the product.
+            Returns:
+                True if its reviews have to be crawled again.
+        """
+        watermark = self.watermark(url)
+        return watermark is None or watermark.listed is None or watermark.listed != watermark.review_count
+
+    def close(self):
+        """
+            Flushing buffered rows and closing the connection, if the database was opened.
+        """
+        self.flush()
+        if self.__connection is not None:
+            self.__connection.close()
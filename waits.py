@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+
+
+# Hyperparameters
+SCROLL_STEP = 1000 # pixels scrolled at a time, like pressing PAGE DOWN once
+STEP_TIMEOUT = 1.5 # seconds to wait for new nodes after one scroll
+NETWORK_IDLE = 0.3 # seconds without a new request for the network to be idle
+
+# Scrolls once and resolves as soon as the number of nodes matching an XPath grows, or after a timeout.
+# arguments: XPath, target count, scroll step, timeout in milliseconds, callback
+SCROLL_SCRIPT = """
+const [xpath, target, step, timeout, done] = arguments;
+const count = () => document.evaluate('count(' + xpath + ')', document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+const atBottom = () => window.innerHeight + window.scrollY >= document.documentElement.scrollHeight - 2;
+const before = count();
+if (before >= target) { done([before, atBottom()]); return; }
+let finished = false;
+const finish = () => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(timer);
+    done([count(), atBottom()]);
+};
+const observer = new MutationObserver(() => { if (count() > before) finish(); });
+observer.observe(document.documentElement, {childList: true, subtree: true});
+const timer = setTimeout(finish, timeout);
+window.scrollBy(0, step);
+"""
+
+# Resolves when no resource has been requested for idle milliseconds, or after a timeout.
+# arguments: idle in milliseconds, timeout in milliseconds, callback
+NETWORK_IDLE_SCRIPT = """
+const [idle, timeout, done] = arguments;
+let finished = false;
+let idleTimer = null;
+const finish = (isIdle) => {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(idleTimer);
+    clearTimeout(timer);
+    done(isIdle);
+};
+const restart = () => { clearTimeout(idleTimer); idleTimer = setTimeout(() => finish(true), idle); };
+const observer = new PerformanceObserver(restart);
+observer.observe({entryTypes: ['resource']});
+const timer = setTimeout(() => finish(false), timeout);
+restart();
+"""
+
+
+def _run_async(driver, script, timeout, *args):
+    """
+        Running an asynchronous script, making sure the script timeout of the driver is long enough.
+        Args:
+            driver (WebDriver): The driver.
+            script (str): The script, its last argument is the callback.
+            timeout (float): Seconds the script may take.
+            args: Arguments of the script.
+        Returns:
+            value: Value passed to the callback.
+    """
+    driver.set_script_timeout(timeout + 5)
+    return driver.execute_async_script(script, *args)
+
+
+def wait_for_network_idle(driver, timeout, idle=NETWORK_IDLE):
+    """
+        Waiting until the page stops requesting resources.
+        Args:
+            driver (WebDriver): The driver.
+            timeout (float): Deadline in seconds.
+            idle (float): Seconds without a new request.
+        Returns:
+            True if the network became idle before the deadline, False otherwise.
+    """
+    return _run_async(driver, NETWORK_IDLE_SCRIPT, timeout, int(idle * 1000), int(timeout * 1000))
+
+
+def scroll_until(driver, xpath, target, timeout, step=SCROLL_STEP, step_timeout=STEP_TIMEOUT):
+    """
+        Scrolling down only until an XPath matches target nodes. Every scroll waits for new nodes to be
+        added instead of sleeping, and scrolling stops at the bottom of the page once no more nodes load.
+        Args:
+            driver (WebDriver): The driver.
+            xpath (str): XPath of the nodes, e.g. product anchors or review sections.
+            target (int): Number of nodes needed.
+            timeout (float): Deadline in seconds for the whole scroll.
+            step (int): Pixels scrolled at a time.
+            step_timeout (float): Seconds to wait for new nodes after one scroll.
+        Returns:
+            count (int): Number of matching nodes when scrolling stopped.
+    """
+    deadline = time.time() + timeout
+    count = -1
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return max(count, 0)
+        previous = count
+        count, at_bottom = _run_async(driver, SCROLL_SCRIPT, step_timeout, xpath, target, step,
+                                       int(min(step_timeout, remaining) * 1000))
+        count = int(count)
+        if count >= target or (at_bottom and count == previous):
+            return count
+
+
+class LoadStats():
+    """
+        Per-page timing of the adaptive waits, compared with the fixed sleeps they replaced.
+    """
+    def __init__(self) -> None:
+        """
+            Initializing LoadStats.
+        """
+        self.__lock = threading.Lock() # pages are recorded by several workers
+        self.pages = [] # (url, waited seconds, fixed seconds)
+
+    def record(self, url, waited, fixed):
+        """
+            Recording the waiting time of a page.
+            Args:
+                url (str): URL of the page.
+                waited (float): Seconds spent in adaptive waits and scrolls.
+                fixed (float): Seconds the fixed sleeps would have taken.
+        """
+        with self.__lock:
+            self.pages.append((url, waited, fixed))
+
+    def summary(self):
+        """
+            Summarizing the recorded pages.
+            Returns:
+                summary (dict): Pages, seconds waited, seconds of fixed sleeps and seconds saved.
+        """
+        with self.__lock:
+            waited = sum(page[1] for page in self.pages)
+            fixed = sum(page[2] for page in self.pages)
+            return {'pages': len(self.pages), 'waited': waited, 'fixed': fixed, 'saved': fixed - waited}
+
+    def report(self):
+        """
+            Printing the summary to stdout.
+        """
+        summary = self.summary()
+        per_page = summary['saved'] / summary['pages'] if summary['pages'] else 0
+        print('LoadStats: {} pages, {:.1f} seconds waited instead of {:.1f} seconds of fixed sleeps, {:.1f} seconds saved ({:.2f} per page)'.format(
+            summary['pages'], summary['waited'], summary['fixed'], summary['saved'], per_page))
+
+    def save(self, path):
+        """
+            Saving the per-page timings to a JSON file.
+            Args:
+                path (str): Path of the file.
+        """
+        with self.__lock:
+            pages = [{'url': url, 'waited': waited, 'fixed': fixed, 'saved': fixed - waited} for url, waited, fixed in self.pages]
+        with open(path, 'w') as f:
+            f.write(json.dumps(pages))
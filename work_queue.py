@@ -0,0 +1,214 @@
+"""
+    Shared queue of crawl tasks for workers running on one machine or several. A worker leases tasks for a
+    visibility timeout: a task that isn't completed before its lease runs out (the worker died or hangs)
+    is leased again by another worker, and a task failing too many times is given up on. The backend is
+    chosen by the URL of the queue, see QUEUE_BACKENDS.
+"""
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from retry import MAX_ATTEMPTS
+from storage import PENDING, IN_FLIGHT, DONE, FAILED # a leased task is in-flight
+
+
+# Hyperparameters
+QUEUE_URL = 'sqlite:///work_queue.db'
+VISIBILITY_TIMEOUT = 600 # seconds a leased task is hidden from the other workers
+BUSY_TIMEOUT = 30 # seconds a worker waits for another one holding the SQLite write lock
+
+# A leased task, kind is 'category' or 'product', key is unique per kind and payload is a dict.
+Task = namedtuple('Task', ['id', 'kind', 'key', 'payload', 'attempts'])
+
+
+class WorkQueue():
+    """
+        Interface of the queue backends. Tasks are unique per (kind, key), so a task put twice, e.g. the
+        same product found by two workers, is only crawled once.
+    """
+    def put(self, kind, tasks):
+        """
+            Adding tasks, the ones already in the queue are ignored.
+            Args:
+                kind (str): 'category' or 'product'.
+                tasks (list): (key, payload) of the tasks.
+            Returns:
+                added (int): Number of new tasks.
+        """
+        raise NotImplementedError
+
+    def lease(self, kind, worker, limit=1, timeout=VISIBILITY_TIMEOUT):
+        """
+            Leasing pending tasks and tasks whose lease ran out.
+            Args:
+                kind (str): 'category' or 'product'.
+                worker (str): Id of the worker.
+                limit (int): Tasks leased at most.
+                timeout (float): Seconds before the tasks are visible to the other workers again.
+            Returns:
+                tasks (list): The leased tasks, empty when there is nothing to do right now.
+        """
+        raise NotImplementedError
+
+    def complete(self, tasks):
+        """
+            Marking leased tasks done.
+            Args:
+                tasks (list): The tasks.
+        """
+        raise NotImplementedError
+
+    def fail(self, tasks):
+        """
+            Giving leased tasks back for another worker, the ones leased max_attempts times are given up on.
+            Args:
+                tasks (list): The tasks.
+        """
+        raise NotImplementedError
+
+    def mark_seeded(self):
+        """
+            Recording that the coordinator has put every category in the queue, an empty queue then means
+            the crawl is over.
+        """
+        raise NotImplementedError
+
+    def seeded(self):
+        """
+            Checking whether the coordinator has seeded the queue.
+            Returns:
+                True once mark_seeded() was called, False while the workers have to wait for the categories.
+        """
+        raise NotImplementedError
+
+    def counts(self):
+        """
+            Counting the tasks.
+            Returns:
+                counts (dict): Kind -> status -> number of tasks.
+        """
+        raise NotImplementedError
+
+    def remaining(self):
+        """
+            Counting the tasks that are pending or leased.
+            Returns:
+                count (int): Number of tasks not done nor given up on.
+        """
+        return sum(statuses.get(PENDING, 0) + statuses.get(IN_FLIGHT, 0) for statuses in self.counts().values())
+
+    def report(self):
+        """
+            Printing the number of tasks per kind and status to stdout.
+        """
+        for kind, statuses in sorted(self.counts().items()):
+            print('WorkQueue: {} tasks, {}'.format(kind, ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))))
+
+    def close(self):
+        """
+            Closing the backend.
+        """
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+        Queue kept in an SQLite file, shared by the workers of one machine, or of several machines through
+        a file system with working locks. A lease is taken in an immediate transaction, so two workers
+        never lease the same task at the same time.
+    """
+    def __init__(self, path, max_attempts=MAX_ATTEMPTS) -> None:
+        """
+            Initializing SQLiteWorkQueue, the file is created if needed.
+            Args:
+                path (str): Path of the SQLite file.
+                max_attempts (int): Number of times a task is leased before giving up on it.
+        """
+        self.path = os.path.abspath(path) # workers change their working directory
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(self.path, isolation_level=None, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, kind TEXT NOT NULL, key TEXT NOT NULL, payload TEXT NOT NULL, "
+                                "status TEXT NOT NULL, worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL, "
+                                "UNIQUE (kind, key))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS tasks_lease ON tasks (kind, status, lease_until)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS flags (name TEXT PRIMARY KEY, updated REAL NOT NULL)") # 'seeded'
+
+    def put(self, kind, tasks):
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.connection.total_changes
+            self.connection.executemany("INSERT OR IGNORE INTO tasks (kind, key, payload, status, updated) VALUES (?, ?, ?, ?, ?)",
+                                        [(kind, key, json.dumps(payload, ensure_ascii=False), PENDING, now) for key, payload in tasks])
+            added = self.connection.total_changes - before
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return added
+
+    def lease(self, kind, worker, limit=1, timeout=VISIBILITY_TIMEOUT):
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE") # the write lock is taken before reading, no other worker can lease in between
+        try:
+            # leases that ran out on their last attempt are given up on
+            self.connection.execute("UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL, updated = ? "
+                                    "WHERE kind = ? AND status = ? AND lease_until < ? AND attempts >= ?", (FAILED, now, kind, IN_FLIGHT, now, self.max_attempts))
+            rows = self.connection.execute("SELECT id, kind, key, payload, attempts FROM tasks WHERE kind = ? "
+                                           "AND (status = ? OR (status = ? AND lease_until < ?)) ORDER BY id LIMIT ?",
+                                           (kind, PENDING, IN_FLIGHT, now, limit)).fetchall()
+            self.connection.executemany("UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                                        [(IN_FLIGHT, worker, now + timeout, now, row[0]) for row in rows])
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return [Task(task_id, kind, key, json.loads(payload), attempts + 1) for task_id, kind, key, payload, attempts in rows]
+
+    def complete(self, tasks):
+        self.connection.executemany("UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL, updated = ? WHERE id = ?",
+                                    [(DONE, time.time(), task.id) for task in tasks])
+
+    def fail(self, tasks):
+        self.connection.executemany("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, lease_until = NULL, "
+                                    "updated = ? WHERE id = ? AND status = ?",
+                                    [(self.max_attempts, FAILED, PENDING, time.time(), task.id, IN_FLIGHT) for task in tasks])
+
+    def mark_seeded(self):
+        self.connection.execute("INSERT OR REPLACE INTO flags (name, updated) VALUES ('seeded', ?)", (time.time(), ))
+
+    def seeded(self):
+        return self.connection.execute("SELECT 1 FROM flags WHERE name = 'seeded'").fetchone() is not None
+
+    def counts(self):
+        counts = {}
+        for kind, status, count in self.connection.execute("SELECT kind, status, COUNT(*) FROM tasks GROUP BY kind, status"):
+            counts.setdefault(kind, {})[status] = count
+        return counts
+
+    def close(self):
+        self.connection.close()
+
+
+# scheme of the queue URL -> backend, called with the rest of the URL. Other backends (e.g. a Redis or
+# SQS queue for workers on machines without a shared file system) are registered here.
+QUEUE_BACKENDS = {
+    'sqlite': lambda location, max_attempts: SQLiteWorkQueue(location, max_attempts=max_attempts),
+}
+
+
+def open_queue(url=QUEUE_URL, max_attempts=MAX_ATTEMPTS):
+    """
+        Opening a work queue.
+        Args:
+            url (str): '<backend>:///<location>', e.g. 'sqlite:///work_queue.db' or 'sqlite:////srv/crawl/queue.db'.
+            max_attempts (int): Number of times a task is leased before giving up on it.
+        Returns:
+            queue (WorkQueue): The queue.
+    """
+    scheme, separator, location = url.partition(':///')
+    if not separator or scheme not in QUEUE_BACKENDS:
+        raise ValueError(f'Unknown work queue "{url}", expected one of: ' + ', '.join(f'{scheme}:///...' for scheme in QUEUE_BACKENDS))
+    return QUEUE_BACKENDS[scheme](location, max_attempts)